@@ -0,0 +1,134 @@
+"""Throughput and latency of the read endpoints under concurrency: the DRF views
+behind WSGI (one thread per in-flight request, like a threaded gunicorn worker),
+the DRF views behind ASGI, and the async views behind ASGI.
+
+    python -m benchmarks.async_load --concurrency 1 32 256 --requests 2000
+
+Requests are driven in process, straight into Django's WSGI and ASGI handlers,
+so the numbers compare the request paths rather than any particular server.
+"""
+
+import asyncio
+import io
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import benchmark_database, print_table, seed, setup_django, size_arguments
+
+PATHS = [
+    ("/api/v1/continents", ""),
+    ("/api/v1/countries", "country=Country 1-3"),
+    ("/api/v1/countries/Country 0-0/states", ""),
+    ("/api/v1/countries/Country 2-1/states/Country 2-1 State 3/local-governments", ""),
+    ("/api/v1/countries/Country 0-0/states/Nowhere/local-governments", ""),
+]
+
+
+def urlconfs():
+    from django.urls import include, path
+    from locations import async_views, views
+    from locations.urls import location_patterns
+
+    class SyncViews:
+        urlpatterns = [path("api/v1/", include(location_patterns(views)))]
+
+    class AsyncViews:
+        urlpatterns = [path("api/v1/", include(location_patterns(async_views)))]
+
+    return SyncViews, AsyncViews
+
+
+def run_wsgi(handler, requests, concurrency):
+    def get(index):
+        path, query = PATHS[index % len(PATHS)]
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query, "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80", "HTTP_HOST": "localhost", "HTTP_ACCEPT": "application/json",
+            "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+        }
+        started = time.perf_counter()
+        body = handler(environ, lambda status, headers: None)
+        b"".join(body)
+        body.close()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(get, range(requests)))
+
+
+async def run_asgi(handler, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get(index):
+        path, query = PATHS[index % len(PATHS)]
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"accept", b"application/json")],
+            "client": ("127.0.0.1", 50000), "server": ("localhost", 80),
+        }
+        sent_body = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                disconnected.set()
+
+        async with semaphore:
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return time.perf_counter() - started
+
+    return await asyncio.gather(*(get(index) for index in range(requests)))
+
+
+def main():
+    parser = size_arguments(continents=5, countries=10, states=10, local_governments=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 32, 256])
+    parser.add_argument("--requests", type=int, default=2000)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+
+    SyncViews, AsyncViews = urlconfs()
+    modes = [
+        ("WSGI + DRF views", SyncViews, lambda n, c: run_wsgi(WSGIHandler(), n, c)),
+        ("ASGI + DRF views", SyncViews, lambda n, c: asyncio.run(run_asgi(ASGIHandler(), n, c))),
+        ("ASGI + async views", AsyncViews, lambda n, c: asyncio.run(run_asgi(ASGIHandler(), n, c))),
+    ]
+
+    with benchmark_database():
+        seed(arguments.continents, arguments.countries, arguments.states, arguments.local_governments)
+        rows = []
+        for concurrency in arguments.concurrency:
+            for mode, urlconf, run in modes:
+                with override_settings(ROOT_URLCONF=urlconf, ALLOWED_HOSTS=["localhost"]):
+                    run(50, concurrency)  # warm up caches and connections
+                    started = time.perf_counter()
+                    latencies = sorted(run(arguments.requests, concurrency))
+                    seconds = time.perf_counter() - started
+                rows.append({
+                    "concurrency": concurrency,
+                    "mode": mode,
+                    "requests/s": f"{arguments.requests / seconds:,.0f}",
+                    "p50 ms": f"{statistics.median(latencies) * 1000:.1f}",
+                    "p99 ms": f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}",
+                })
+        print_table(rows, ["concurrency", "mode", "requests/s", "p50 ms", "p99 ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Per-keystroke latency, build time and memory of the autocomplete snapshot.
+
+    python -m benchmarks.autocomplete                       # a million LGAs
+    python -m benchmarks.autocomplete --local-governments 100000 --names 200
+
+A synthetic world (see ``locations/synthetic.py``) is imported into a throwaway
+database and the ``Places`` snapshot of ``locations/autocomplete.py`` is built
+from it. Then the typing of LGA names drawn from the data is replayed one
+keystroke at a time, with no scope, within the LGA's country and within its
+state. Latencies are grouped by prefix length: the short prefixes are answered
+from precomputed results, the longer ones by ranking a bisected range.
+"""
+
+import argparse
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.common import benchmark_database, print_table, setup_django
+from benchmarks.endpoints import percentile
+
+LENGTHS = [(1, "1"), (2, "2"), (3, "3"), (5, "4-5"), (8, "6-8"), (1000, "9+")]
+
+
+def bucket(size):
+    return next(label for limit, label in LENGTHS if size <= limit)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--countries", type=int, default=250)
+    parser.add_argument("--states", type=int, default=5000)
+    parser.add_argument("--local-governments", type=int, default=1_000_000)
+    parser.add_argument("--names", type=int, default=500, help="LGA names typed per scope")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from locations.autocomplete import Places
+    from locations.importer import Importer
+    from locations.models import DataVersion, LocalGovernment
+    from locations.synthetic import WorldGenerator
+
+    with benchmark_database():
+        started = time.perf_counter()
+        Importer(batch_size=10000).run(WorldGenerator(
+            countries=arguments.countries, states=arguments.states,
+            local_governments=arguments.local_governments, seed=arguments.seed,
+        ).records())
+        print(f"Imported in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        places = Places(DataVersion.current())
+        busy = sum(len(table.busy) for table in places.tables.values())
+        print(f"Snapshot built in {time.perf_counter() - started:.2f}s: {places.memory() / 2 ** 20:.1f} MiB for "
+              f"{len(places.keys):,} places, {busy:,} precomputed prefixes\n")
+
+        rng = random.Random(arguments.seed)
+        names = list(LocalGovernment.objects.values_list("name", "state__name", "state__country__name"))
+        typed = rng.sample(names, min(arguments.names, len(names)))
+        timings = defaultdict(list)
+        for scope in ("none", "country", "state"):
+            for name, state, country in typed:
+                options = {"country": country} if scope == "country" else {}
+                if scope == "state":
+                    options = {"country": country, "state": state}
+                for size in range(1, len(name) + 1):
+                    started = time.perf_counter()
+                    places.complete(name[:size], **options)
+                    timings[scope, bucket(size)].append(time.perf_counter() - started)
+
+    rows = [{
+        "scope": scope,
+        "prefix": label,
+        "keystrokes": len(timings[scope, label]),
+        "median_us": round(statistics.median(timings[scope, label]) * 1e6, 1),
+        "p99_us": round(percentile(timings[scope, label], 99) * 1e6, 1),
+        "max_us": round(max(timings[scope, label]) * 1e6, 1),
+    } for scope in ("none", "country", "state") for _, label in LENGTHS if timings[scope, label]]
+    print_table(rows, ["scope", "prefix", "keystrokes", "median_us", "p99_us", "max_us"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throwaway test database (the same one ``manage.py test``
+creates), seeded with synthetic data, so they can be run offline without
+touching real data, e.g.::
+
+    python -m benchmarks.planet_earth_memory --local-governments 50
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "controller.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmarks")
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    from django.test.utils import (setup_databases, setup_test_environment, teardown_databases,
+                                   teardown_test_environment)
+    setup_test_environment()
+    config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(config, verbosity=0)
+        teardown_test_environment()
+
+
+def size_arguments(parser=None, continents=7, countries=30, states=20, local_governments=20):
+    """Add the dataset size options (children per parent) to an argument parser."""
+    parser = parser or argparse.ArgumentParser()
+    parser.add_argument("--continents", type=int, default=continents)
+    parser.add_argument("--countries", type=int, default=countries, help="countries per continent")
+    parser.add_argument("--states", type=int, default=states, help="states per country")
+    parser.add_argument("--local-governments", type=int, default=local_governments, help="LGAs per state")
+    return parser
+
+
+def seed(continents=7, countries=30, states=20, local_governments=20, batch_size=5000):
+    """Bulk insert a uniform continent -> country -> state -> LGA tree."""
+    from locations.cache import response_cache
+    from locations.counters import recount
+    from locations.models import Continent, Country, State, LocalGovernment, DataVersion
+    from utils.text import normalize_name
+
+    def named(model, name, **fields):
+        return model(name=name, name_key=normalize_name(name), **fields)
+
+    continent_rows = [named(Continent, f"Continent {c}") for c in range(continents)]
+    Continent.objects.bulk_create(continent_rows)
+    country_rows = [
+        named(Country, f"Country {c}-{n}", capital=f"Capital {n}", language="English", currency="Naira", continent=continent)
+        for c, continent in enumerate(continent_rows) for n in range(countries)
+    ]
+    Country.objects.bulk_create(country_rows, batch_size=batch_size)
+    state_rows = [
+        named(State, f"{country.name} State {s}", capital=f"Town {s}", country=country)
+        for country in country_rows for s in range(states)
+    ]
+    State.objects.bulk_create(state_rows, batch_size=batch_size)
+    batch = []
+    for state in state_rows:
+        for lg in range(local_governments):
+            batch.append(named(LocalGovernment, f"{state.name} LGA {lg}", state=state))
+        if len(batch) >= batch_size:
+            LocalGovernment.objects.bulk_create(batch, batch_size=batch_size)
+            batch = []
+    LocalGovernment.objects.bulk_create(batch, batch_size=batch_size)
+
+    for model in (Continent, Country, State):
+        recount(model)
+    DataVersion.bump()
+    response_cache.invalidate_all()
+    return len(state_rows) * local_governments
+
+
+@contextmanager
+def measure():
+    """Collect wall time and peak traced memory of the block into the yielded dict."""
+    result = {}
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - started
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+def print_table(rows, columns):
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
@@ -0,0 +1,263 @@
+"""Latency, query count, payload size and memory of every endpoint, checked against budgets.
+
+    python -m benchmarks.endpoints                  # measure, save the results, check budgets.json
+    python -m benchmarks.endpoints --requests 200 --output run.json
+    python -m benchmarks.endpoints --write-budgets  # re-baseline budgets.json from this run
+
+Each route of ``locations/urls.py`` is requested through the test client (the
+whole middleware stack), ``/resolve`` with a POST of ``RESOLVE_ITEMS``
+addresses, against a synthetic world imported from a fixed seed (see
+``locations/synthetic.py``) into a throwaway database. The response cache is
+off unless ``--cache`` is given, so the views themselves are measured. Per
+endpoint the run records the median and p99 latency, the number of queries,
+the bytes rendered and the peak memory allocated during one request
+(tracemalloc), and writes them as JSON so runs can be diffed across commits.
+
+The budgets file holds the dataset it was made for and a maximum per endpoint
+and metric; the run exits with status 1 when any endpoint goes over one.
+Latency budgets have a wide margin since they depend on the machine. With
+``--only``, ``--write-budgets`` replaces the budgets of those endpoints only.
+"""
+
+import argparse
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+from benchmarks.common import benchmark_database, print_table, setup_django
+
+DIRECTORY = Path(__file__).resolve().parent
+BUDGETS = DIRECTORY / "budgets.json"
+DATASET = {"continents": 7, "countries": 60, "states": 600, "local_governments": 30000, "seed": 0}
+METRICS = ["queries", "bytes", "peak_kb", "median_ms", "p99_ms"]
+# metric -> (factor, minimum slack) applied by --write-budgets
+HEADROOM = {"queries": (1, 0), "bytes": (1.1, 1024), "peak_kb": (1.5, 64), "median_ms": (3, 2), "p99_ms": (4, 10)}
+# addresses in the /resolve batch, and the share of them with a typo
+RESOLVE_ITEMS = 1000
+RESOLVE_TYPOS = 0.05
+
+# An endpoint requested with a POST of the JSON ``body``; the others are GET URLs.
+Post = namedtuple("Post", ["url", "body"])
+
+
+def typo(name):
+    middle = len(name) // 2
+    return name[:middle] + name[middle + 1:]
+
+
+def endpoints():
+    """Endpoint name -> URL (or ``Post``), for the largest country and state of the dataset."""
+    from django.urls import reverse
+    from benchmarks.resolve import triples
+    from locations.models import Continent, Country, State
+
+    continent = Continent.objects.order_by("-countries_count", "pk").first()
+    country = Country.objects.order_by("-states_count", "pk").first()
+    state = State.objects.filter(country=country).order_by("-local_governments_count", "pk").first()
+    countries = reverse("fetching-all-countries-available-and-searching-for-a-particular-country")
+    local_governments = "get-all-local-governments-in-a-state"
+    return {
+        "planet-earth": reverse("all-continents-countries-states-sub-divisions"),
+        "planet-earth-fields": reverse("all-continents-countries-states-sub-divisions") + "?fields=name,countries.name",
+        "continents": reverse("list-of-available-continents"),
+        "countries-by-continent": reverse("fetching-countries-by-continent", args=[continent.name]),
+        "countries": countries,
+        "countries-page": countries + "?limit=50",
+        "country-search": countries + "?" + urlencode({"country": country.name}),
+        "country-suggestion": countries + "?" + urlencode({"country": typo(country.name)}),
+        "states": reverse("fetch-all-states-in-a-country", args=[country.name]),
+        "state-detail": reverse("search-state-in-a-particular-country", args=[country.name]) + "?"
+        + urlencode({"state": state.name}),
+        "local-governments": reverse(local_governments, args=[country.name, state.name]),
+        "local-governments-page": reverse(local_governments, args=[country.name, state.name]) + "?limit=50",
+        "local-government-suggestion": reverse(local_governments, args=[country.name, typo(state.name)]),
+        "search": reverse("search-places") + "?" + urlencode({"q": state.name}),
+        "search-in-country": reverse("search-places") + "?" + urlencode({"q": state.name.split()[0], "parent": country.name}),
+        "autocomplete": reverse("autocomplete-places") + "?" + urlencode({"q": state.name[:3]}),
+        "autocomplete-in-state": reverse("autocomplete-places") + "?" + urlencode(
+            {"q": "a", "country": country.name, "state": state.name}),
+        **{f"export-{format}": reverse("export-places", args=[format]) for format in ("ndjson", "csv", "binary")},
+        "resolve": Post(reverse("resolve-places"),
+                        json.dumps({"items": triples(RESOLVE_ITEMS, RESOLVE_TYPOS, random.Random(0))})),
+    }
+
+
+def fetch(client, endpoint):
+    if isinstance(endpoint, Post):
+        response = client.post(endpoint.url, endpoint.body, content_type="application/json",
+                               HTTP_ACCEPT="application/json")
+    else:
+        response = client.get(endpoint, HTTP_ACCEPT="application/json")
+    body = b"".join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, len(body)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+def measure_endpoint(client, endpoint, requests, warmup):
+    from django.db import connection
+
+    for _ in range(warmup):
+        fetch(client, endpoint)
+    # An execute wrapper, unlike connection.queries, survives the reconnections
+    # between requests.
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        status, size = fetch(client, endpoint)
+    tracemalloc.start()
+    fetch(client, endpoint)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    gc.collect()
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        fetch(client, endpoint)
+        timings.append(time.perf_counter() - started)
+    return {
+        "url": f"POST {endpoint.url}" if isinstance(endpoint, Post) else endpoint,
+        "status": status,
+        "queries": len(queries),
+        "bytes": size,
+        "peak_kb": round(peak / 1024, 1),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+def check_budgets(results, budgets):
+    """Return the budget violations of ``results``, as messages."""
+    violations = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            violations.append(f"{name}: no budget")
+            continue
+        if "status" in budget and result["status"] != budget["status"]:
+            violations.append(f"{name}: status {result['status']}, expected {budget['status']}")
+        for metric in METRICS:
+            if metric in budget and result[metric] > budget[metric]:
+                violations.append(f"{name}: {metric} {result[metric]} > budget {budget[metric]}")
+    return violations
+
+
+def budgets_from(results):
+    budgets = {}
+    for name, result in results.items():
+        budget = {"status": result["status"]}
+        for metric in METRICS:
+            factor, slack = HEADROOM[metric]
+            limit = max(result[metric] * factor, result[metric] + slack)
+            budget[metric] = math.ceil(limit) if metric in ("queries", "bytes") else round(limit, 1)
+        budgets[name] = budget
+    return budgets
+
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=DIRECTORY, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--budgets", type=Path, default=BUDGETS)
+    parser.add_argument("--output", type=Path, help="results file (default benchmarks/results/endpoints-<commit>.json)")
+    parser.add_argument("--write-budgets", action="store_true", help="write the budgets file from this run")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache on")
+    parser.add_argument("--only", nargs="+", metavar="ENDPOINT", help="measure these endpoints only")
+    for key, value in DATASET.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, help=f"dataset size (default: the budgets', or {value})")
+    arguments = parser.parse_args()
+
+    budgets = json.loads(arguments.budgets.read_text()) if arguments.budgets.exists() else None
+    dataset = dict(budgets["dataset"] if budgets else DATASET)
+    for key in DATASET:
+        if getattr(arguments, key) is not None:
+            dataset[key] = getattr(arguments, key)
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from locations.importer import Importer
+    from locations.synthetic import WorldGenerator
+
+    with benchmark_database(), override_settings(**({} if arguments.cache else {"RESPONSE_CACHE": None})):
+        started = time.perf_counter()
+        Importer(batch_size=10000).run(WorldGenerator(**dataset).records())
+        print(f"Imported {dataset} in {time.perf_counter() - started:.1f}s\n", file=sys.stderr)
+
+        client = Client()
+        results = {}
+        for name, endpoint in endpoints().items():
+            if arguments.only and name not in arguments.only:
+                continue
+            results[name] = measure_endpoint(client, endpoint, arguments.requests, arguments.warmup)
+        run = {
+            "commit": commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "dataset": dataset,
+            "settings": {
+                "PLANET_EARTH_MODE": settings.PLANET_EARTH_MODE,
+                "JSON_RENDERER": settings.JSON_RENDERER,
+                "RESPONSE_CACHE": bool(settings.RESPONSE_CACHE),
+            },
+            "requests": arguments.requests,
+            "endpoints": results,
+        }
+
+    print_table([{"endpoint": name, **result} for name, result in results.items()],
+                ["endpoint", "status", "queries", "bytes", "peak_kb", "median_ms", "p99_ms"])
+
+    output = arguments.output or DIRECTORY / "results" / f"endpoints-{run['commit'] or 'unknown'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(run, indent=2) + "\n")
+    print(f"\nResults written to {output}")
+
+    if arguments.write_budgets:
+        written = budgets_from(results)
+        if arguments.only and budgets and budgets["dataset"] == dataset:
+            written = {**budgets["endpoints"], **written}
+        arguments.budgets.write_text(json.dumps({"dataset": dataset, "endpoints": written}, indent=2) + "\n")
+        print(f"Budgets written to {arguments.budgets}")
+        return
+    if budgets is None:
+        sys.exit(f"No budgets file at {arguments.budgets}; run with --write-budgets to create it")
+    if budgets["dataset"] != dataset:
+        sys.exit(f"The budgets are for the dataset {budgets['dataset']}, not {dataset}")
+
+    violations = check_budgets(results, budgets["endpoints"])
+    for violation in violations:
+        print(f"OVER BUDGET {violation}", file=sys.stderr)
+    if violations:
+        sys.exit(1)
+    print(f"All {len(results)} endpoints within budget")
+
+
+if __name__ == "__main__":
+    main()
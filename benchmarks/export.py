@@ -0,0 +1,112 @@
+"""Cloning the dataset: dumpdata/loaddata against export_locations/import_locations.
+
+    python -m benchmarks.export
+    python -m benchmarks.export --local-governments 300000 --skip-dumpdata
+
+A synthetic world (see ``locations/synthetic.py``) is imported into a throwaway
+database, then exported and imported back with each method: Django's JSON
+fixtures, and the NDJSON, CSV and binary exports read back with the bulk
+importer. Every import starts from empty tables. Times and throughput are
+measured first, then each direction is run again under ``tracemalloc`` for its
+peak memory, which is what grows with the dataset for the fixtures.
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import benchmark_database, measure, print_table, setup_django
+
+
+def empty_tables():
+    from django.db import connection
+    from locations.models import Continent, Country, State, LocalGovernment
+
+    with connection.cursor() as cursor:
+        for model in (LocalGovernment, State, Country, Continent):
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--countries", type=int, default=60)
+    parser.add_argument("--states", type=int, default=600)
+    parser.add_argument("--local-governments", type=int, default=30000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-dumpdata", action="store_true", help="leave out dumpdata/loaddata, slow on large worlds")
+    arguments = parser.parse_args()
+    setup_django()
+
+    from django.core.management import call_command
+    from django.test import override_settings
+    from locations.export import ENCODERS, Exporter
+    from locations.importer import Importer, read_records
+    from locations.synthetic import WorldGenerator
+
+    def export(format, path):
+        exporter = Exporter(format)
+        with path.open("wb") as file:
+            for chunk in exporter.chunks():
+                file.write(chunk)
+        return exporter.records
+
+    def dumpdata(path):
+        call_command("dumpdata", "locations.continent", "locations.country", "locations.state",
+                     "locations.localgovernment", output=str(path), verbosity=0)
+
+    def loaddata(path):
+        call_command("loaddata", str(path), verbosity=0)
+
+    methods = [("dumpdata/loaddata", "json", dumpdata, loaddata)] if not arguments.skip_dumpdata else []
+    methods += [
+        (f"export {format}", encoder.extension, lambda path, format=format: export(format, path),
+         lambda path: Importer(batch_size=10000).run(read_records(path)))
+        for format, encoder in ENCODERS.items()
+    ]
+
+    rows = []
+    with benchmark_database(), override_settings(RESPONSE_CACHE=None), tempfile.TemporaryDirectory() as directory:
+        importer = Importer(batch_size=10000).run(WorldGenerator(
+            countries=arguments.countries, states=arguments.states,
+            local_governments=arguments.local_governments, seed=arguments.seed,
+        ).records())
+        records = importer.records
+        print(f"{records} records\n")
+
+        for name, extension, write, read in methods:
+            path = Path(directory) / f"locations.{extension}"
+            started = time.perf_counter()
+            write(path)
+            export_seconds = time.perf_counter() - started
+            gc.collect()
+            with measure() as export_memory:
+                write(path)
+
+            empty_tables()
+            started = time.perf_counter()
+            read(path)
+            import_seconds = time.perf_counter() - started
+            empty_tables()
+            gc.collect()
+            with measure() as import_memory:
+                read(path)
+
+            size = path.stat().st_size
+            rows.append({
+                "method": name,
+                "MB": round(size / 1e6, 1),
+                "export s": round(export_seconds, 2),
+                "export records/s": round(records / export_seconds),
+                "export MB/s": round(size / 1e6 / export_seconds, 1),
+                "export peak MiB": round(export_memory["peak_bytes"] / 2 ** 20, 1),
+                "import s": round(import_seconds, 2),
+                "import records/s": round(records / import_seconds),
+                "import peak MiB": round(import_memory["peak_bytes"] / 2 ** 20, 1),
+            })
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""The read endpoints from the database against the in-memory geography store.
+
+    python -m benchmarks.geography_store
+    python -m benchmarks.geography_store --local-governments 300000 --requests 50
+
+The synthetic world of ``benchmarks.endpoints`` is imported into a throwaway
+database, the store loads it once (its load time and footprint are printed),
+then every read endpoint the store serves is measured as in
+``benchmarks.endpoints``, through the DRF views and through
+``locations/memory_views.py``, with the response cache off.
+"""
+
+import argparse
+import sys
+import time
+
+from benchmarks.common import benchmark_database, print_table, setup_django
+from benchmarks.endpoints import DATASET, endpoints, measure_endpoint
+
+# The endpoints answered by the store; search and autocomplete keep their views.
+STORE_ENDPOINTS = [
+    "planet-earth", "planet-earth-fields", "continents", "countries-by-continent", "countries", "countries-page",
+    "country-search", "country-suggestion", "states", "state-detail", "local-governments", "local-governments-page",
+    "local-government-suggestion",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--check-interval", type=float, default=1.0, help="GEOGRAPHY_STORE CHECK_INTERVAL")
+    for key, value in DATASET.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=value)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from django.test import Client, override_settings
+    from django.urls import include, path
+    from locations import views
+    from locations.geography import geography
+    from locations.importer import Importer
+    from locations.synthetic import WorldGenerator
+    from locations.urls import location_patterns, store_views
+
+    class StoreURLConf:
+        urlpatterns = [path("api/v1/", include(location_patterns(store_views(views))))]
+
+    dataset = {key: getattr(arguments, key) for key in DATASET}
+    store = {"CHECK_INTERVAL": arguments.check_interval}
+    with benchmark_database(), override_settings(RESPONSE_CACHE=None, GEOGRAPHY_STORE=store):
+        started = time.perf_counter()
+        Importer(batch_size=10000).run(WorldGenerator(**dataset).records())
+        print(f"Imported {dataset} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        world = geography.world()
+        counts = ", ".join(f"{count} {level}" for level, count in world.counts().items())
+        print(f"Store loaded in {world.load_seconds:.2f}s: {counts}")
+        print_table([{"part": part, "MiB": round(size / 2 ** 20, 2)} for part, size in world.footprint.items()],
+                    ["part", "MiB"])
+        print()
+
+        client = Client()
+        urls = {name: url for name, url in endpoints().items() if name in STORE_ENDPOINTS}
+        rows = []
+        for name, url in urls.items():
+            database = measure_endpoint(client, url, arguments.requests, arguments.warmup)
+            with override_settings(ROOT_URLCONF=StoreURLConf):
+                memory = measure_endpoint(client, url, arguments.requests, arguments.warmup)
+            rows.append({
+                "endpoint": name,
+                "status": memory["status"],
+                "db queries": database["queries"],
+                "db median ms": database["median_ms"],
+                "db p99 ms": database["p99_ms"],
+                "store queries": memory["queries"],
+                "store median ms": memory["median_ms"],
+                "store p99 ms": memory["p99_ms"],
+                "speedup": round(database["median_ms"] / memory["median_ms"], 1) if memory["median_ms"] else None,
+            })
+    print_table(rows, list(rows[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Peak memory and time of rendering /planet-earth with the serializers vs. streaming.
+
+    python -m benchmarks.planet_earth_memory --countries 30 --states 20 --local-governments 50
+"""
+
+import gc
+
+from benchmarks.common import benchmark_database, measure, print_table, seed, setup_django, size_arguments
+
+
+def render_with_serializers():
+    from rest_framework.renderers import JSONRenderer
+    from locations.models import Continent
+    from locations.serializers import ContinentSerializer
+
+    queryset = Continent.objects.order_by("pk").prefetch_related("countries__states__local_governments")
+    continents = ContinentSerializer(queryset, many=True).data
+    return len(JSONRenderer().render({"count": len(continents), "continents": continents}))
+
+
+def render_streaming():
+    from locations.streaming import planet_earth_chunks
+
+    # Consume the chunks the way a WSGI server does, without keeping them.
+    return sum(len(chunk) for chunk in planet_earth_chunks())
+
+
+def main():
+    arguments = size_arguments().parse_args()
+    setup_django()
+    with benchmark_database():
+        total = seed(arguments.continents, arguments.countries, arguments.states, arguments.local_governments)
+        print(f"Seeded {total} local governments\n")
+        rows = []
+        for mode, render in (("serializers", render_with_serializers), ("streaming", render_streaming)):
+            gc.collect()
+            with measure() as result:
+                size = render()
+            rows.append({
+                "mode": mode,
+                "bytes": size,
+                "seconds": f"{result['seconds']:.3f}",
+                "peak MiB": f"{result['peak_bytes'] / 2 ** 20:.1f}",
+            })
+        print_table(rows, ["mode", "bytes", "seconds", "peak MiB"])
+
+
+if __name__ == "__main__":
+    main()
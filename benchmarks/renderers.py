@@ -0,0 +1,55 @@
+"""Time to render the planet-earth payload with each JSON renderer.
+
+    python -m benchmarks.renderers --countries 30 --states 20 --local-governments 20
+
+The payload is built once; only ``render()`` is timed. ``fast`` is reported
+as unavailable when orjson is not installed.
+"""
+
+import time
+
+from benchmarks.common import benchmark_database, print_table, seed, setup_django, size_arguments
+
+
+def main():
+    parser = size_arguments()
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+    from locations import lean
+    from locations.models import Continent
+    from locations.serializers import ContinentSerializer
+    from utils import renderers
+
+    with benchmark_database():
+        total = seed(arguments.continents, arguments.countries, arguments.states, arguments.local_governments)
+        continents = lean.serialize(lean.values_of(Continent.objects.order_by("pk"), ContinentSerializer), ContinentSerializer)
+        data = {"count": len(continents), "continents": continents}
+        print(f"Seeded {total} local governments\n")
+
+        expected = JSONRenderer().render(data)
+        rows = []
+        for name, renderer in (("stdlib", JSONRenderer()), ("fast", renderers.FastJSONRenderer())):
+            if name == "fast" and renderers.orjson is None:
+                rows.append({"renderer": name, "seconds": "n/a", "MB/s": "orjson is not installed", "same bytes": ""})
+                continue
+            timings = []
+            for _ in range(arguments.repeat):
+                started = time.perf_counter()
+                body = renderer.render(data)
+                timings.append(time.perf_counter() - started)
+            seconds = min(timings)
+            rows.append({
+                "renderer": name,
+                "seconds": f"{seconds:.4f}",
+                "MB/s": f"{len(body) / seconds / 1e6:,.0f}",
+                "same bytes": body == expected,
+            })
+        print(f"payload: {len(expected) / 1e6:.1f} MB")
+        print_table(rows, ["renderer", "seconds", "MB/s", "same bytes"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Address validation throughput: per-address lookups against the batch resolve endpoint.
+
+    python -m benchmarks.resolve
+    python -m benchmarks.resolve --items 50000 --local-governments 300000
+
+A synthetic world (see ``locations/synthetic.py``) is imported into a throwaway
+database and ``--items`` (country, state, LGA) triples are drawn from it, a
+share of them with a typo in one name. They are then validated through the
+test client (the whole middleware stack) three ways: the way a client of the
+single lookups does it, one ``/countries/<country>?state=`` and one
+``/local-governments`` request per address (on a sample, as it is slow), and
+with ``/resolve`` as one JSON body per ``MAX_ITEMS`` and as a single NDJSON
+stream. Queries are counted for every request made.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import benchmark_database, print_table, setup_django
+from benchmarks.endpoints import typo
+
+
+def triples(count, typos, rng):
+    from locations.models import LocalGovernment
+
+    rows = list(LocalGovernment.objects.values_list("state__country__name", "state__name", "name"))
+    items = []
+    for row in rng.choices(rows, k=count):
+        row = list(row)
+        if rng.random() < typos:
+            level = rng.randrange(3)
+            row[level] = typo(row[level])
+        items.append(row)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--countries", type=int, default=60)
+    parser.add_argument("--states", type=int, default=600)
+    parser.add_argument("--local-governments", type=int, default=30000)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--typos", type=float, default=0.05, help="share of items with a misspelled name")
+    parser.add_argument("--sample", type=int, default=500, help="items validated with the single lookups")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from locations.importer import Importer
+    from locations.resolver import MAX_ITEMS
+    from locations.synthetic import WorldGenerator
+
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def run(name, items, validate):
+        queries.clear()
+        started = time.perf_counter()
+        with connection.execute_wrapper(record):
+            found = validate(items)
+        elapsed = time.perf_counter() - started
+        rows.append({
+            "method": name,
+            "items": len(items),
+            "found": found,
+            "queries": len(queries),
+            "queries/1k": round(len(queries) * 1000 / len(items), 1),
+            "seconds": round(elapsed, 3),
+            "items/s": round(len(items) / elapsed),
+        })
+
+    with benchmark_database(), override_settings(RESPONSE_CACHE=None):
+        Importer(batch_size=10000).run(WorldGenerator(
+            countries=arguments.countries, states=arguments.states,
+            local_governments=arguments.local_governments, seed=arguments.seed,
+        ).records())
+        items = triples(arguments.items, arguments.typos, random.Random(arguments.seed))
+        client = Client()
+        url = reverse("resolve-places")
+
+        def single_lookups(items):
+            found = 0
+            for country, state, local_government in items:
+                detail = reverse("search-state-in-a-particular-country", args=[country])
+                if client.get(detail, {"state": state}, HTTP_ACCEPT="application/json").status_code != 200:
+                    continue
+                lgas = reverse("get-all-local-governments-in-a-state", args=[country, state])
+                names = {lga["name"] for lga in client.get(lgas, HTTP_ACCEPT="application/json").json()["local_governments"]}
+                found += local_government in names
+            return found
+
+        def json_batches(items):
+            found = 0
+            for start in range(0, len(items), MAX_ITEMS):
+                found += client.post(url, items[start:start + MAX_ITEMS], content_type="application/json").json()["found"]
+            return found
+
+        def ndjson_stream(items):
+            response = client.post(url, "\n".join(json.dumps(item) for item in items),
+                                   content_type="application/x-ndjson")
+            return sum(b'"error"' not in line for chunk in response.streaming_content for line in chunk.splitlines())
+
+        rows = []
+        # Warm the suggestion scopes, which every method shares.
+        json_batches(items[:MAX_ITEMS])
+        run("single lookups", items[:arguments.sample], single_lookups)
+        run("resolve, JSON", items, json_batches)
+        run("resolve, NDJSON", items, ndjson_stream)
+    print_table(rows, ["method", "items", "found", "queries", "queries/1k", "seconds", "items/s"])
+
+
+if __name__ == "__main__":
+    main()
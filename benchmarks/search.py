@@ -0,0 +1,87 @@
+"""Build time, memory and query latency of the search index (locations/search.py).
+
+    python -m benchmarks.search                            # a million LGAs
+    python -m benchmarks.search --local-governments 100000 --queries 2000
+
+A synthetic world (see ``locations/synthetic.py``) is imported into a throwaway
+database, the index is built once, and then queries drawn from the imported
+names are timed per kind: whole names, their first word only (the broadest
+result sets), names scoped to their country, names filtered by level, and
+misses. Latencies are those of ``SearchIndex.search`` with the data version
+passed in, as the views call it.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.common import benchmark_database, print_table, setup_django
+from benchmarks.endpoints import percentile
+
+
+def queries(count, rng):
+    """Query kind -> list of ``search`` keyword arguments."""
+    from locations.models import LocalGovernment, State
+
+    states = list(State.objects.values_list("name", "country__name"))
+    local_governments = list(LocalGovernment.objects.order_by("?").values_list("name", "state__country__name")[:count])
+    return {
+        "lga name": [{"query": name} for name, _ in local_governments],
+        "first word": [{"query": name.split()[0]} for name, _ in local_governments],
+        "state in country": [{"query": name, "parent": country} for name, country in rng.sample(states, min(count, len(states)))],
+        "lga name, level": [{"query": name, "levels": ["local_government"]} for name, _ in local_governments],
+        "miss": [{"query": f"{name} zzz"} for name, _ in local_governments],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--countries", type=int, default=250)
+    parser.add_argument("--states", type=int, default=5000)
+    parser.add_argument("--local-governments", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000, help="queries per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from locations.importer import Importer
+    from locations.models import DataVersion
+    from locations.search import SearchIndex
+    from locations.synthetic import WorldGenerator
+
+    with benchmark_database():
+        started = time.perf_counter()
+        Importer(batch_size=10000).run(WorldGenerator(
+            countries=arguments.countries, states=arguments.states,
+            local_governments=arguments.local_governments, seed=arguments.seed,
+        ).records())
+        print(f"Imported in {time.perf_counter() - started:.1f}s")
+
+        index = SearchIndex()
+        version = DataVersion.current()
+        started = time.perf_counter()
+        index.sync(version)
+        print(f"Index built in {time.perf_counter() - started:.2f}s: {index.memory() / 2 ** 20:.1f} MiB, "
+              f"{len(index.postings):,} words\n")
+
+        rows = []
+        for kind, cases in queries(arguments.queries, random.Random(arguments.seed)).items():
+            timings, results = [], 0
+            for options in cases:
+                started = time.perf_counter()
+                results += len(index.search(version=version, **options))
+                timings.append(time.perf_counter() - started)
+            rows.append({
+                "kind": kind,
+                "queries": len(cases),
+                "results/query": round(results / len(cases), 1),
+                "median_us": round(statistics.median(timings) * 1e6, 1),
+                "p99_us": round(percentile(timings, 99) * 1e6, 1),
+                "max_us": round(max(timings) * 1e6, 1),
+            })
+    print_table(rows, ["kind", "queries", "results/query", "median_us", "p99_us", "max_us"])
+
+
+if __name__ == "__main__":
+    main()
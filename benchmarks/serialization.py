@@ -0,0 +1,71 @@
+"""Per-item cost of the DRF serializers vs. the lean ``values()`` path.
+
+    python -m benchmarks.serialization --countries 30 --states 20 --local-governments 10
+
+Each case is timed twice: with the queries (what a view pays) and on rows that
+were fetched beforehand (the serialization alone). Costs are per top-level item.
+"""
+
+import time
+
+from benchmarks.common import benchmark_database, print_table, seed, setup_django, size_arguments
+
+
+def best_of(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def cases():
+    from locations.models import Continent, Country
+    from locations.serializers import ContinentSerializer, CountryOnlySerializer, CountrySerializer
+
+    # the lookups a view would prefetch to render each case with the serializers
+    return [
+        ("countries list", CountryOnlySerializer, Country.objects.order_by("name"), ["continent"]),
+        ("countries with states", CountrySerializer, Country.objects.order_by("name"),
+         ["continent", "states__local_governments"]),
+        ("planet earth", ContinentSerializer, Continent.objects.order_by("pk"), ["countries__states__local_governments"]),
+    ]
+
+
+def main():
+    parser = size_arguments(local_governments=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+    setup_django()
+
+    from locations import lean
+
+    with benchmark_database():
+        seed(arguments.continents, arguments.countries, arguments.states, arguments.local_governments)
+        rows = []
+        for name, serializer_class, queryset, prefetch in cases():
+            count = queryset.count()
+            instances = list(queryset.prefetch_related(*prefetch))
+            levels = lean.fetch_levels(lean.values_of(queryset.all(), serializer_class), serializer_class)
+            timings = {
+                "drf": best_of(arguments.repeat, lambda: serializer_class(
+                    queryset.prefetch_related(*prefetch), many=True).data),
+                "drf (serialize)": best_of(arguments.repeat, lambda: serializer_class(instances, many=True).data),
+                "lean": best_of(arguments.repeat, lambda: lean.serialize(
+                    lean.values_of(queryset.all(), serializer_class), serializer_class)),
+                "lean (serialize)": best_of(arguments.repeat, lambda: lean.assemble(levels)),
+            }
+            for mode, seconds in timings.items():
+                rows.append({
+                    "case": name,
+                    "mode": mode,
+                    "items": count,
+                    "seconds": f"{seconds:.4f}",
+                    "µs/item": f"{seconds / count * 1e6:,.1f}",
+                })
+        print_table(rows, ["case", "mode", "items", "seconds", "µs/item"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""IDs per second of the snowflake generator, one at a time, in batches and from threads.
+
+    python -m benchmarks.snowflake_ids --ids 1000000 --threads 4
+
+The generator issues at most 4096 IDs per millisecond and node, so anything
+above ~4M IDs/s is capped by the clock rather than by the code.
+"""
+
+import argparse
+import threading
+import time
+
+from benchmarks.common import print_table
+from utils.snowflake import Snowflake
+
+
+def one_at_a_time(generator, count):
+    for _ in range(count):
+        generator.generate_id()
+
+
+def batched(batch_size):
+    def run(generator, count):
+        for start in range(0, count, batch_size):
+            generator.generate_ids(min(batch_size, count - start))
+    return run
+
+
+def threaded(run, threads):
+    def run_threads(generator, count):
+        workers = [threading.Thread(target=run, args=(generator, count // threads)) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    return run_threads
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ids", type=int, default=500_000)
+    parser.add_argument("--threads", type=int, default=4)
+    arguments = parser.parse_args()
+
+    cases = [
+        ("generate_id", one_at_a_time),
+        ("generate_ids(100)", batched(100)),
+        ("generate_ids(5000)", batched(5000)),
+        (f"generate_id x {arguments.threads} threads", threaded(one_at_a_time, arguments.threads)),
+        (f"generate_ids(5000) x {arguments.threads} threads", threaded(batched(5000), arguments.threads)),
+    ]
+    rows = []
+    for name, run in cases:
+        generator = Snowflake(0, 0)
+        started = time.perf_counter()
+        run(generator, arguments.ids)
+        seconds = time.perf_counter() - started
+        rows.append({"mode": name, "seconds": f"{seconds:.3f}", "IDs/s": f"{arguments.ids / seconds:,.0f}"})
+    print_table(rows, ["mode", "seconds", "IDs/s"])
+
+
+if __name__ == "__main__":
+    main()
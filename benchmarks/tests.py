@@ -0,0 +1,63 @@
+import io
+import json
+import tempfile
+from contextlib import nullcontext, redirect_stderr, redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import endpoints as benchmark
+
+DATASET = {"continents": 1, "countries": 1, "states": 1, "local_governments": 1, "seed": 0}
+
+
+def result(status=200, queries=2, bytes=1000, peak_kb=80.0, median_ms=1.0, p99_ms=5.0):
+    return {"status": status, "queries": queries, "bytes": bytes, "peak_kb": peak_kb,
+            "median_ms": median_ms, "p99_ms": p99_ms}
+
+
+class BudgetTests(SimpleTestCase):
+
+    def setUp(self):
+        self.budgets = {"continents": benchmark.budgets_from({"continents": result()})["continents"]}
+
+    def test_within_budget(self):
+        self.assertEqual(self.budgets["continents"], {"status": 200, "queries": 2, "bytes": 2024, "peak_kb": 144.0,
+                                                      "median_ms": 3.0, "p99_ms": 20.0})
+        self.assertEqual(benchmark.check_budgets({"continents": result(bytes=2024, p99_ms=20)}, self.budgets), [])
+
+    def test_violations(self):
+        results = {"continents": result(status=500, queries=3, median_ms=3.5), "search": result()}
+        self.assertEqual(benchmark.check_budgets(results, self.budgets), [
+            "continents: status 500, expected 200",
+            "continents: queries 3 > budget 2",
+            "continents: median_ms 3.5 > budget 3.0",
+            "search: no budget",
+        ])
+
+    def run_main(self, results):
+        """Run the benchmark command on ``results`` against ``self.budgets``; its exit status and stderr."""
+        directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        budgets = directory / "budgets.json"
+        budgets.write_text(json.dumps({"dataset": DATASET, "endpoints": self.budgets}))
+        argv = ["endpoints", "--budgets", str(budgets), "--output", str(directory / "run.json")]
+        stderr = io.StringIO()
+        with mock.patch("sys.argv", argv), \
+                mock.patch.object(benchmark, "benchmark_database", nullcontext), \
+                mock.patch("locations.importer.Importer"), \
+                mock.patch.object(benchmark, "endpoints", return_value={name: name for name in results}), \
+                mock.patch.object(benchmark, "measure_endpoint", side_effect=lambda client, name, *_: results[name]), \
+                redirect_stdout(io.StringIO()), redirect_stderr(stderr):
+            try:
+                benchmark.main()
+            except SystemExit as exit:
+                return exit.code, stderr.getvalue()
+        return 0, stderr.getvalue()
+
+    def test_main_fails_over_budget(self):
+        self.assertEqual(self.run_main({"continents": result()})[0], 0)
+        status, stderr = self.run_main({"continents": result(bytes=4096), "search": result()})
+        self.assertEqual(status, 1)
+        self.assertIn("OVER BUDGET continents: bytes 4096 > budget 2024", stderr)
+        self.assertIn("OVER BUDGET search: no budget", stderr)
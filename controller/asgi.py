@@ -12,5 +12,14 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "controller.settings")
+os.environ.setdefault("ASYNC_VIEWS", "true")
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.GEOGRAPHY_STORE:
+    # Load the store before the first request rather than during it.
+    from locations.geography import geography
+
+    geography.world()
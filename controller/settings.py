@@ -14,6 +14,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
 import os
+from utils.cache import cache_from_url
 
 load_dotenv()
 
@@ -51,7 +52,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # First after security so cached and static responses are timed and counted too.
+    "utils.middleware.ServerTimingMiddleware",
+    "utils.middleware.WhiteNoiseMiddleware",
+    "locations.middleware.ResponseCacheMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -91,13 +95,101 @@ DATABASES = {
 }
 
 
+# JSON_RENDERER picks the JSON encoder: "fast" uses orjson when it is installed
+# (pip install orjson) and falls back to the standard library otherwise, with the
+# same output; "stdlib" always uses DRF's JSONRenderer.
+JSON_RENDERERS = {
+    "fast": "utils.renderers.FastJSONRenderer",
+    "stdlib": "rest_framework.renderers.JSONRenderer",
+}
+JSON_RENDERER = JSON_RENDERERS[os.getenv("JSON_RENDERER", "fast")]
+
+# RENDERER_PROFILE=production serves JSON only; the default profile also serves
+# the browsable API to clients that ask for HTML.
+RENDERER_PROFILES = {
+    "default": [JSON_RENDERER, 'rest_framework.renderers.BrowsableAPIRenderer'],
+    "production": [JSON_RENDERER],
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     
-    'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer', 
-    ],
+    'DEFAULT_RENDERER_CLASSES': RENDERER_PROFILES[os.getenv("RENDERER_PROFILE", "default")],
+}
+
+# How the JSON of /api/v1/planet-earth is produced: "snapshot" keeps the rendered
+# document (and its compressed copies) in memory per worker and rebuilds it when
+# the data changes; "stream" renders it incrementally on every request instead,
+# keeping worker memory flat at the cost of querying each time.
+PLANET_EARTH_MODE = os.getenv("PLANET_EARTH_MODE", "snapshot")
+
+# Serve the read endpoints with the native async views of locations/async_views.py
+# (JSON only) instead of the DRF views. controller/asgi.py enables it by default;
+# set ASYNC_VIEWS=false there to keep the DRF views under ASGI.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "false").lower() in ("1", "true", "yes")
+
+# Cache of the GET responses (see locations/cache.py). RESPONSE_CACHE_URL picks the
+# backend: locmem:// (per process, LRU, the default), file:///path or
+# redis://host:6379/0 (shared by every process, so writes anywhere invalidate
+# at once); "none" disables it. A per-process backend never sees the
+# invalidations of other processes (workers, management commands), so its
+# hits are checked against the data version, one query each;
+# RESPONSE_CACHE_CHECK_VERSION forces the check on or off.
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "locmem://responses")
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+RESPONSE_CACHE = None
+if RESPONSE_CACHE_URL != "none":
+    CACHES["responses"] = cache_from_url(RESPONSE_CACHE_URL, max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000)))
+    RESPONSE_CACHE = {
+        "ALIAS": "responses",
+        "TIMEOUT": int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300)),
+        # Larger responses (the planet-earth document) are not stored.
+        "MAX_SIZE": int(os.getenv("RESPONSE_CACHE_MAX_SIZE", 1024 * 1024)),
+        "CHECK_VERSION": os.getenv(
+            "RESPONSE_CACHE_CHECK_VERSION", str(RESPONSE_CACHE_URL.startswith("locmem:"))
+        ).lower() in ("1", "true", "yes"),
+    }
+
+# Request instrumentation (see utils/metrics.py): Server-Timing headers and the
+# Prometheus metrics served on /metrics. METRICS_SAMPLE_RATE is the share of
+# requests that are timed (all of them are counted). Under several worker
+# processes set METRICS_DIR to a directory they share, emptied at startup, so
+# /metrics reports the totals of every worker. METRICS_ENABLED=false removes it.
+METRICS = None
+if os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes"):
+    METRICS = {
+        "SERVER_TIMING": os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes"),
+        "SAMPLE_RATE": float(os.getenv("METRICS_SAMPLE_RATE", 1.0)),
+        "DIR": os.getenv("METRICS_DIR") or None,
+        "FLUSH_INTERVAL": float(os.getenv("METRICS_FLUSH_INTERVAL", 5)),
+    }
+
+# Serve the continent, country, state and LGA reads from a copy of the whole
+# hierarchy held in memory by each process (see locations/geography.py). The
+# data version is checked at most every GEOGRAPHY_STORE_CHECK_INTERVAL seconds,
+# and a changed version is reloaded in the background, so writes are served
+# after up to that delay.
+GEOGRAPHY_STORE = None
+if os.getenv("GEOGRAPHY_STORE", "false").lower() in ("1", "true", "yes"):
+    GEOGRAPHY_STORE = {
+        "CHECK_INTERVAL": float(os.getenv("GEOGRAPHY_STORE_CHECK_INTERVAL", 1.0)),
+    }
+
+# Fetching of the scrape_countries and scrape_states commands (see locations/scraper.py).
+# SCRAPE_SOURCES is the JSON file listing the pages to scrape (see
+# scrape_sources.example.json), SCRAPE_CACHE_DIR where the pages are kept to be
+# revalidated on the next run, and SCRAPE_WORKERS how many are fetched at once.
+SCRAPER = {
+    "SOURCES": os.getenv("SCRAPE_SOURCES", BASE_DIR / "scrape_sources.json"),
+    "CACHE_DIR": os.getenv("SCRAPE_CACHE_DIR", BASE_DIR / ".scrape-cache"),
+    "WORKERS": int(os.getenv("SCRAPE_WORKERS", 8)),
+    "TIMEOUT": float(os.getenv("SCRAPE_TIMEOUT", 30)),
+    # retries of a failed request, backing off exponentially from BACKOFF seconds
+    "RETRIES": int(os.getenv("SCRAPE_RETRIES", 3)),
+    "BACKOFF": float(os.getenv("SCRAPE_BACKOFF", 0.5)),
 }
 
 SPECTACULAR_SETTINGS = {
@@ -19,11 +19,14 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from utils.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/", include("locations.urls")),
     path('api/v1/schema', SpectacularAPIView.as_view(), name='schema'),
     path('api/v1/docs', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/v1/redoc', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "controller.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.GEOGRAPHY_STORE:
+    # Load the store before the first request rather than during it.
+    from locations.geography import geography
+
+    geography.world()
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class LocationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "locations"
+
+    def ready(self):
+        from utils.metrics import registry
+        from . import signals  # noqa: F401
+        from .cache import cache_metrics
+        from .geography import geography_metrics
+
+        registry.collectors.append(cache_metrics)
+        registry.collectors.append(geography_metrics)
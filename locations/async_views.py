@@ -0,0 +1,348 @@
+"""Native async versions of the read endpoints, for ASGI deployments.
+
+DRF views are synchronous, so under ASGI every request would be handed to a
+worker thread. These views run on the event loop instead: rows are fetched with
+the async ORM as plain values (no model instances), shaped by ``lean.py`` and
+rendered by the same ``settings.JSON_RENDERER`` as ``views.py``, so the JSON
+responses are byte for byte the same. Only the JSON representation is served
+(no browsable API). The suggestion index and the planet-earth snapshot do their
+blocking work through ``sync_to_async``.
+
+``urls.py`` routes to these views when ``settings.ASYNC_VIEWS`` is set, which
+``controller/asgi.py`` turns on by default.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django.views import View
+from utils.metrics import phase
+from utils.text import normalize_name
+from .autocomplete import InvalidCompletion, UnknownParent, autocomplete, parse_completion
+from .conditional import AsyncConditionalGetMixin
+from .export import Exporter, UnknownFormat
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+from .fields import InvalidFields
+from .lean import aserialize, values_of
+from .pagination import InvalidPage, KeysetPaginator
+from .resolver import MAX_ITEMS, Resolver, resolve_lines, summary
+from .search import InvalidSearch, parse_search, search_index
+from .serializers import (ContinentSerializer, ContinentOnlySerializer, CountryOnlySerializer,
+                          CountrySerializer, StateSerializer, LocalGovernmentSerializer)
+from .snapshot import planet_earth_snapshot
+from .streaming import planet_earth_chunks
+from .suggestions import not_found_message, suggestion_index
+from .views import NDJSON, batch_items, export_response, requested_fields
+
+renderer = import_string(settings.JSON_RENDERER)()
+
+
+def json_response(data, status=200):
+    with phase("render"):
+        content = renderer.render(data)
+    return HttpResponse(content, status=status, content_type="application/json")
+
+
+async def not_found_response(subject, level, word, version, parent=None, include_suggestions=True, **options):
+    suggestions = await sync_to_async(suggestion_index.suggest)(level, word, parent=parent, version=version, **options)
+    response_data = {"error": not_found_message(subject, suggestions)}
+    if include_suggestions:
+        response_data["suggestions"] = suggestions
+    return json_response(response_data, status=404)
+
+
+def bad_request(error):
+    return json_response({"error": str(error)}, status=400)
+
+
+async def in_thread(chunks):
+    """Iterate a blocking iterator of chunks from worker threads."""
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+class PlanetEarthListView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            fields = requested_fields(request, ContinentSerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        if fields is not None:
+            continents = [row async for row in values_of(Continent.objects.order_by("pk"), ContinentSerializer, fields)]
+            continents = await aserialize(continents, ContinentSerializer, fields)
+            return json_response({"count": len(continents), "continents": continents})
+        if settings.PLANET_EARTH_MODE == "stream":
+            return StreamingHttpResponse(in_thread(planet_earth_chunks()), content_type="application/json")
+        snapshot = await sync_to_async(planet_earth_snapshot.get)(self.data_version)
+        return snapshot.response(request)
+
+
+class ContinentListView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            fields = requested_fields(request, ContinentOnlySerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        continents = [row async for row in values_of(Continent.objects.all(), ContinentOnlySerializer, fields)]
+        continents = await aserialize(continents, ContinentOnlySerializer, fields)
+        return json_response({"count": len(continents), "continents": continents})
+
+
+class CountryListByContinentView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, continent_name, *args, **kwargs):
+        try:
+            fields = requested_fields(request, CountrySerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        continent_name = continent_name.strip()
+        continent = await Continent.objects.filter(name_key=normalize_name(continent_name)).afirst()
+
+        if not continent:
+            return await not_found_response(
+                f"Continent '{continent_name}'", "continent", continent_name, self.data_version,
+                include_suggestions=False, n=1, cutoff=0.8,
+            )
+
+        countries = values_of(Country.objects.filter(continent=continent), CountrySerializer, fields).order_by("name")
+        return json_response({
+            "continent": continent.name,
+            "count": continent.countries_count,
+            "countries": await aserialize([row async for row in countries], CountrySerializer, fields),
+        })
+
+
+class CountryListAndSearchView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, *args, **kwargs):
+        country_name = request.GET.get('country', '').strip()
+        try:
+            fields = requested_fields(request, CountrySerializer if country_name else CountryOnlySerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        if country_name:
+            country = await values_of(
+                Country.objects.filter(name_key=normalize_name(country_name)), CountrySerializer, fields
+            ).afirst()
+            if not country:
+                return await not_found_response(
+                    f"Country '{country_name}'", "country", country_name, self.data_version,
+                    include_suggestions=False, n=1, cutoff=0.8,
+                )
+            return json_response({"count": 1, "country": (await aserialize([country], CountrySerializer, fields))[0]})
+
+        try:
+            paginator = KeysetPaginator.from_request(request)
+        except InvalidPage as error:
+            return bad_request(error)
+
+        # The cursor needs the name of the last row, whether or not it is shown.
+        countries = values_of(Country.objects.all(), CountryOnlySerializer, fields, "name")
+        if paginator:
+            rows = await paginator.apaginate(countries)
+        else:
+            rows = [row async for row in countries.order_by("name")]
+        response_data = {
+            "count": len(rows),
+            "countries": await aserialize(rows, CountryOnlySerializer, fields),
+        }
+        if paginator:
+            total = await Continent.objects.aaggregate(total=Sum("countries_count"))
+            response_data["count"] = total["total"] or 0
+            response_data["next_cursor"] = paginator.next_cursor
+        return json_response(response_data)
+
+
+class StateListByCountryView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, country_name, *args, **kwargs):
+        try:
+            paginator = KeysetPaginator.from_request(request)
+            fields = requested_fields(request, StateSerializer)
+        except (InvalidPage, InvalidFields) as error:
+            return bad_request(error)
+
+        country_name = country_name.strip()
+        country = await Country.objects.filter(name_key=normalize_name(country_name)).afirst()
+
+        if not country:
+            return await not_found_response(
+                f"Country '{country_name}'", "country", country_name, self.data_version, include_suggestions=False,
+            )
+
+        states = values_of(State.objects.filter(country=country), StateSerializer, fields, "name")
+        if paginator:
+            rows = await paginator.apaginate(states)
+        else:
+            rows = [row async for row in states.order_by("name")]
+        response_data = {
+            "count": country.states_count,
+            "country": country.name,
+            "states": await aserialize(rows, StateSerializer, fields),
+        }
+        if paginator:
+            response_data["next_cursor"] = paginator.next_cursor
+        return json_response(response_data)
+
+
+class StateDetailByCountryView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, country_name, *args, **kwargs):
+        country_name = country_name.strip()
+        state_name = request.GET.get('state', '').strip()
+
+        if not state_name:
+            return json_response({"error": "State parameter is missing"}, status=400)
+
+        try:
+            fields = requested_fields(request, StateSerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        country = await Country.objects.filter(name_key=normalize_name(country_name)).afirst()
+
+        if not country:
+            return await not_found_response(f"Country '{country_name}'", "country", country_name, self.data_version)
+
+        state = await values_of(
+            State.objects.filter(name_key=normalize_name(state_name), country=country), StateSerializer, fields
+        ).afirst()
+
+        if not state:
+            return await not_found_response(
+                f"State '{state_name}' in '{country_name}'", "state", state_name, self.data_version, parent=country.pk,
+            )
+
+        return json_response({
+            "count": 1,
+            "country": country.name,
+            "state": (await aserialize([state], StateSerializer, fields))[0],
+        })
+
+
+class LocalGovernmentListByStateView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, country_name, state_name, *args, **kwargs):
+        try:
+            paginator = KeysetPaginator.from_request(request)
+            fields = requested_fields(request, LocalGovernmentSerializer)
+        except (InvalidPage, InvalidFields) as error:
+            return bad_request(error)
+
+        country_name = country_name.strip()
+        state_name = state_name.strip()
+
+        country = await Country.objects.filter(name_key=normalize_name(country_name)).afirst()
+
+        if not country:
+            return await not_found_response(f"Country '{country_name}'", "country", country_name, self.data_version)
+
+        state = await State.objects.filter(name_key=normalize_name(state_name), country=country).afirst()
+        if not state:
+            return await not_found_response(
+                f"State '{state_name}' in '{country_name}'", "state", state_name, self.data_version, parent=country.pk,
+            )
+
+        local_governments = values_of(LocalGovernment.objects.filter(state=state), LocalGovernmentSerializer, fields, "name")
+        if paginator:
+            rows = await paginator.apaginate(local_governments)
+        else:
+            rows = [row async for row in local_governments.order_by("name")]
+
+        response_data = {
+            "count": state.local_governments_count,
+            "country": country.name,
+            "state": state.name,
+            "local_governments": await aserialize(rows, LocalGovernmentSerializer, fields),
+        }
+        if paginator:
+            response_data["next_cursor"] = paginator.next_cursor
+        return json_response(response_data)
+
+
+class SearchView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            query, levels, parent, limit = parse_search(request.GET)
+        except InvalidSearch as error:
+            return bad_request(error)
+
+        results = await sync_to_async(search_index.search)(
+            query, levels=levels, parent=parent, limit=limit, version=self.data_version
+        )
+        return json_response({"query": query, "count": len(results), "results": results})
+
+
+class AutocompleteView(AsyncConditionalGetMixin, View):
+    lagging = True
+
+    async def current_version(self):
+        # Completing is quick enough to run on the event loop; building a snapshot is not.
+        version = await DataVersion.acurrent()
+        self.places = autocomplete.current(version)
+        if self.places is None:
+            self.places = await sync_to_async(autocomplete.places)(version)
+        return self.places.version
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            prefix, levels, country, state, limit = parse_completion(request.GET)
+        except InvalidCompletion as error:
+            return bad_request(error)
+
+        try:
+            results = self.places.complete(prefix, levels, country, state, limit)
+        except UnknownParent as error:
+            if error.level == "country":
+                return await not_found_response(f"Country '{error.name}'", "country", error.name, self.data_version)
+            return await not_found_response(
+                f"State '{error.name}' in '{country}'", "state", error.name, self.data_version, parent=error.parent_id
+            )
+        return json_response({"query": prefix, "count": len(results), "results": results})
+
+
+class ResolveView(View):
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Exempt from CSRF checks like the DRF view, which only enforces them for session logins.
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def post(self, request, *args, **kwargs):
+        resolver = Resolver(await DataVersion.acurrent())
+        if request.content_type == NDJSON:
+            return StreamingHttpResponse(in_thread(resolve_lines(request, resolver)), content_type=NDJSON)
+
+        try:
+            items = batch_items(json.loads(request.body))
+        except ValueError as error:
+            return bad_request(f"JSON parse error - {error}")
+        if items is None:
+            return bad_request("Expected a list of items, or an object with one under 'items'")
+        if len(items) > MAX_ITEMS:
+            return bad_request(f"At most {MAX_ITEMS} items per request; send larger batches as NDJSON")
+        return json_response(summary(await sync_to_async(resolver.resolve)(items)))
+
+
+class ExportView(AsyncConditionalGetMixin, View):
+
+    async def get(self, request, export_format, *args, **kwargs):
+        try:
+            exporter = Exporter(export_format)
+        except UnknownFormat as error:
+            return json_response({"error": str(error)}, status=404)
+        return export_response(exporter, in_thread(exporter.chunks()))
@@ -0,0 +1,332 @@
+"""Prefix autocompletion of country, state and LGA names.
+
+Every name is kept once, in a ``Places`` snapshot. The names and their lookup
+keys (``utils.text.normalize_name``, so completion folds case and accents like
+the lookups do) are each concatenated into one string with an offsets array,
+and parents, ranks and sort orders are arrays of ints. That is a few bytes of
+overhead per place rather than several Python objects.
+
+Each ``Table`` holds the places of one level sorted by scope and key. The
+scope is nothing for the global tables, the country or the state for the
+scoped ones. The places under a prefix are then a contiguous range found with
+two bisections.
+
+Completions are ranked by key length and then key, so that "Lagos" comes
+before "Lagos Island". A range small enough (``BUSY``) is ranked when it is
+asked for. The top ``MAX_LIMIT`` of every larger one, the short prefixes of
+the global tables, are computed at build time, so no keystroke ranks more
+than ``BUSY`` places.
+
+A snapshot is built on first use and never modified. When the data version
+changes, a new snapshot is built in a background thread while the previous
+one keeps answering, and is then swapped in.
+"""
+
+import heapq
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.db import connection
+
+from utils.text import normalize_name
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+
+logger = logging.getLogger(__name__)
+
+# level -> (model, parent field), parents first
+LEVELS = {
+    "continent": (Continent, None),
+    "country": (Country, "continent_id"),
+    "state": (State, "country_id"),
+    "local_government": (LocalGovernment, "state_id"),
+}
+LEVEL_NAMES = list(LEVELS)
+COMPLETED_LEVELS = ["country", "state", "local_government"]
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+# Prefixes matching more places than this have their results precomputed.
+BUSY = 128
+
+# sorts after every character a name can have
+HIGHEST = "\U0010ffff"
+GLOBAL = -1
+
+
+class InvalidCompletion(ValueError):
+    pass
+
+
+class UnknownParent(LookupError):
+    """The ``country`` or ``state`` a completion is scoped to does not exist."""
+
+    def __init__(self, level, name, parent_id=None):
+        super().__init__(level, name, parent_id)
+        self.level = level
+        self.name = name
+        self.parent_id = parent_id
+
+
+def parse_completion(params):
+    """The ``(prefix, levels, country, state, limit)`` of the autocomplete query parameters."""
+    prefix = params.get("q", "")
+    country = params.get("country", "").strip() or None
+    state = params.get("state", "").strip() or None
+    if state and not country:
+        raise InvalidCompletion("state can only be given with its country")
+    # only the levels below the scope can be completed in it
+    allowed = COMPLETED_LEVELS[2:] if state else COMPLETED_LEVELS[1:] if country else COMPLETED_LEVELS
+    levels = allowed
+    if params.get("level"):
+        levels = [level.strip() for level in params["level"].split(",") if level.strip()]
+        unknown = [level for level in levels if level not in allowed]
+        if unknown:
+            raise InvalidCompletion(f"Unknown level '{unknown[0]}' here; expected one of {', '.join(allowed)}")
+    try:
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise InvalidCompletion("limit must be an integer") from None
+    if not 1 <= limit <= MAX_LIMIT:
+        raise InvalidCompletion(f"limit must be between 1 and {MAX_LIMIT}")
+    return prefix, levels, country, state, limit
+
+
+class Blob:
+    """Read-only sequence of strings stored as one string and their offsets."""
+
+    __slots__ = ("text", "offsets")
+
+    def __init__(self, strings):
+        self.text = "".join(strings)
+        self.offsets = array("I", [0])
+        end = 0
+        for string in strings:
+            end += len(string)
+            self.offsets.append(end)
+
+    def __getitem__(self, position):
+        return self.text[self.offsets[position]:self.offsets[position + 1]]
+
+    def getter(self):
+        """``__getitem__`` as a plain function, for the hot loops."""
+        text, offsets = self.text, self.offsets
+
+        def get(position):
+            return text[offsets[position]:offsets[position + 1]]
+
+        return get
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class Table:
+    """The places of one level sorted by ``(scope, key)``, and the results of its busy prefixes."""
+
+    __slots__ = ("key_of", "rank", "order", "scopes", "busy")
+
+    def __init__(self, places, order, scope_of=None):
+        self.key_of = places.keys.getter()
+        self.rank = places.rank.__getitem__
+        # Stable: within a scope the places stay in key order.
+        self.order = array("I", sorted(order, key=scope_of) if scope_of else order)
+        # scope -> the range of the order holding its places
+        self.scopes = {}
+        start = 0
+        while start < len(self.order):
+            scope = scope_of(self.order[start]) if scope_of else GLOBAL
+            end = bisect_right(self.order, scope, start, key=scope_of) if scope_of else len(self.order)
+            self.scopes[scope] = (start, end)
+            start = end
+        self.busy = {}
+        self._find_busy()
+
+    def _find_busy(self):
+        order, key_of = self.order, self.key_of
+        ranges = [(scope, "", start, end) for scope, (start, end) in self.scopes.items()]
+        while ranges:
+            scope, prefix, start, end = ranges.pop()
+            if end - start <= BUSY:
+                continue
+            self.busy[scope, prefix] = array("I", heapq.nsmallest(MAX_LIMIT, order[start:end], key=self.rank))
+            # Split the range by the next character; keys equal to the prefix come first.
+            size = len(prefix) + 1
+            while start < end and len(key_of(order[start])) < size:
+                start += 1
+            while start < end:
+                child = key_of(order[start])[:size]
+                child_end = bisect_right(order, child, start, end, key=lambda position: key_of(position)[:size])
+                ranges.append((scope, child, start, child_end))
+                start = child_end
+
+    def complete(self, prefix, limit, scope=GLOBAL):
+        """Positions of the best ``limit`` places of ``scope`` whose key starts with ``prefix``."""
+        found = self.busy.get((scope, prefix))
+        if found is not None:
+            return found[:limit]
+        bounds = self.scopes.get(scope)
+        if bounds is None:
+            return []
+        start = bisect_left(self.order, prefix, *bounds, key=self.key_of)
+        # Prefixes that are not busy have at most BUSY places.
+        end = bisect_left(self.order, prefix + HIGHEST, start, min(start + BUSY, bounds[1]), key=self.key_of)
+        return heapq.nsmallest(limit, self.order[start:end], key=self.rank)
+
+
+class Places:
+    """An immutable snapshot of every place name and the completion tables over them."""
+
+    def __init__(self, version):
+        self.version = version
+        names, keys = [], []
+        self.levels = bytearray()
+        self.parents = array("i")
+        # key -> (position, id); (country position, key) -> (position, id)
+        self.countries = {}
+        self.states = {}
+        by_level = {level: [] for level in LEVELS}
+        positions = {}
+        for level, (model, parent_field) in LEVELS.items():
+            columns = ["id", "name", "name_key"] + ([parent_field] if parent_field else [])
+            for row in model.objects.values_list(*columns).iterator(chunk_size=10000):
+                position = len(names)
+                names.append(row[1])
+                keys.append(row[2])
+                self.levels.append(LEVEL_NAMES.index(level))
+                parent = positions[row[3]] if parent_field else -1
+                self.parents.append(parent)
+                by_level[level].append(position)
+                if level != "local_government":
+                    positions[row[0]] = position
+                if level == "country":
+                    self.countries[row[2]] = (position, row[0])
+                elif level == "state":
+                    self.states[parent, row[2]] = (position, row[0])
+        del positions
+        self.names = Blob(names)
+        self.keys = Blob(keys)
+        self.rank = array("I", bytes(4 * len(keys)))
+        for rank, position in enumerate(sorted(range(len(keys)), key=lambda position: (len(keys[position]), keys[position]))):
+            self.rank[position] = rank
+        del names
+
+        parents = self.parents
+        country_of_state = parents.__getitem__
+
+        def country_of_local_government(position):
+            return parents[parents[position]]
+
+        ordered = {level: sorted(positions, key=keys.__getitem__) for level, positions in by_level.items()}
+        self.tables = {
+            ("country", None): Table(self, ordered["country"]),
+            ("state", None): Table(self, ordered["state"]),
+            ("state", "country"): Table(self, ordered["state"], country_of_state),
+            ("local_government", None): Table(self, ordered["local_government"]),
+            ("local_government", "country"): Table(self, ordered["local_government"], country_of_local_government),
+            ("local_government", "state"): Table(self, ordered["local_government"], parents.__getitem__),
+        }
+
+    def complete(self, prefix, levels=COMPLETED_LEVELS, country=None, state=None, limit=DEFAULT_LIMIT):
+        """The ``limit`` best completions of ``prefix``, countries first, then states and LGAs.
+
+        ``country`` and ``state`` are names scoping the completions to the
+        places under them; ``UnknownParent`` is raised when one does not exist.
+        """
+        prefix = normalize_name(prefix)
+        scope, by = GLOBAL, None
+        if country is not None:
+            found = self.countries.get(normalize_name(country))
+            if found is None:
+                raise UnknownParent("country", country)
+            (scope, country_id), by = found, "country"
+            if state is not None:
+                found = self.states.get((scope, normalize_name(state)))
+                if found is None:
+                    raise UnknownParent("state", state, country_id)
+                scope, by = found[0], "state"
+        results = []
+        for level in COMPLETED_LEVELS:
+            if level in levels and len(results) < limit and (level, by) in self.tables:
+                results += self.tables[level, by].complete(prefix, limit - len(results), scope)
+        return [self._result(position) for position in results]
+
+    def _result(self, position):
+        path = [self.names[position]]
+        parent = self.parents[position]
+        while parent >= 0:
+            path.append(self.names[parent])
+            parent = self.parents[parent]
+        path.reverse()
+        return {"name": path[-1], "level": LEVEL_NAMES[self.levels[position]], "path": path}
+
+    def memory(self):
+        """Approximate bytes held by the snapshot."""
+        size = sum(sys.getsizeof(part) for part in (
+            self.names.text, self.names.offsets, self.keys.text, self.keys.offsets, self.levels, self.parents,
+            self.rank, self.countries, self.states,
+        ))
+        for table in self.tables.values():
+            size += sys.getsizeof(table.order) + sys.getsizeof(table.busy)
+            size += sum(sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(top) for key, top in table.busy.items())
+        return size
+
+
+class Autocomplete:
+    """Per-process holder of the current ``Places`` snapshot; see the module docstring."""
+
+    # Rebuild in a background thread when the data changes; tests build inline.
+    background = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._places = None
+        self._building = None
+
+    def complete(self, prefix, levels=COMPLETED_LEVELS, country=None, state=None, limit=DEFAULT_LIMIT,
+                 version=None):
+        places = self.places(DataVersion.current() if version is None else version)
+        return places.complete(prefix, levels=levels, country=country, state=state, limit=limit)
+
+    def places(self, version):
+        places = self._places
+        if places is not None and places.version == version:
+            return places
+        if places is None or not self.background:
+            with self._lock:
+                if self._places is None or self._places.version != version:
+                    self._places = Places(version)
+                return self._places
+        with self._lock:
+            if self._building is None:
+                self._building = threading.Thread(target=self._rebuild, args=(version,), daemon=True)
+                self._building.start()
+        return places
+
+    def current(self, version):
+        """The snapshot answering ``version`` if it can be had without building one here, else ``None``."""
+        places = self._places
+        if places is None or (places.version != version and not self.background):
+            return None
+        return self.places(version)
+
+    def _rebuild(self, version):
+        try:
+            places = Places(version)
+            with self._lock:
+                if self._places is None or self._places.version != version:
+                    self._places = places
+        except Exception:
+            logger.exception("Rebuilding the autocomplete snapshot failed")
+        finally:
+            self._building = None
+            connection.close()
+
+    def clear(self):
+        with self._lock:
+            self._places = None
+
+
+autocomplete = Autocomplete()
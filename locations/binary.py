@@ -0,0 +1,123 @@
+"""Compact binary encoding of the import records.
+
+A file is ``MAGIC`` followed by one record per location, parents before their
+children. A record is a ``HEAD``: its level, its id, the index of its parent
+among the records of the parent level (0 for a continent) and the length of
+its name, then the UTF-8 name and, for countries and states, the
+``TEXT``-prefixed attributes of ``ATTRIBUTES``. A length of ``NULL`` stands
+for ``None``.
+
+Parents are referenced by position instead of repeating their names or ids, so
+an LGA takes 15 bytes plus its name, and the fixed-width fields are decoded
+with one ``struct`` call per record. ``read_binary`` yields the records of
+``importer.FIELDS`` that ``tree_records`` yields for the same tree, with the
+``id`` and ``parent_id`` of each location.
+"""
+
+import struct
+
+MAGIC = b"GEOB\x02"
+
+CONTINENT, COUNTRY, STATE, LOCAL_GOVERNMENT = range(4)
+
+# level -> record keys of its attributes, after the name
+ATTRIBUTES = {
+    CONTINENT: (),
+    COUNTRY: ("capital", "currency", "language"),
+    STATE: ("state_capital",),
+    LOCAL_GOVERNMENT: (),
+}
+
+HEAD = struct.Struct("<BQIH")
+TEXT = struct.Struct("<H")
+NULL = 0xFFFF
+
+READ_SIZE = 1 << 20
+
+
+class InvalidBinary(ValueError):
+    pass
+
+
+def pack_text(value):
+    if value is None:
+        return TEXT.pack(NULL)
+    data = value.encode()
+    if len(data) >= NULL:
+        raise InvalidBinary(f"'{value[:20]}...' is too long")
+    return TEXT.pack(len(data)) + data
+
+
+def pack_record(level, pk, parent, name, *attributes):
+    data = name.encode()
+    if len(data) >= NULL:
+        raise InvalidBinary(f"'{name[:20]}...' is too long")
+    return b"".join((HEAD.pack(level, pk, parent, len(data)), data, *map(pack_text, attributes)))
+
+
+def _unpack(data, offset):
+    """The ``(level, pk, parent, name, attributes, end)`` of the record at ``offset``, or ``None`` if it is cut off."""
+    if offset + HEAD.size > len(data):
+        return None
+    level, pk, parent, length = HEAD.unpack_from(data, offset)
+    if level not in ATTRIBUTES:
+        raise InvalidBinary(f"unknown record type {level}")
+    start = offset + HEAD.size
+    end = start + length
+    if end > len(data):
+        return None
+    name = data[start:end].decode()
+    attributes = []
+    for _ in ATTRIBUTES[level]:
+        if end + TEXT.size > len(data):
+            return None
+        length, = TEXT.unpack_from(data, end)
+        end += TEXT.size
+        if length == NULL:
+            attributes.append(None)
+            continue
+        if end + length > len(data):
+            return None
+        attributes.append(data[end:end + length].decode())
+        end += length
+    return level, pk, parent, name, attributes, end
+
+
+def read_binary(file):
+    """Yield the records of the binary file object ``file``."""
+    if file.read(len(MAGIC)) != MAGIC:
+        raise InvalidBinary("not a binary locations file")
+    # ids and names of the records so far, by level, for the references of their children
+    continents, countries, states = [], [], []
+    data, offset, eof = b"", 0, False
+    while True:
+        record = _unpack(data, offset)
+        if record is None:
+            if eof:
+                if offset < len(data):
+                    raise InvalidBinary("the file is truncated")
+                return
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            data, offset = data[offset:] + chunk, 0
+            continue
+        level, pk, parent, name, attributes, offset = record
+        try:
+            if level == LOCAL_GOVERNMENT:
+                state_id, country, state = states[parent]
+                yield {"id": pk, "parent_id": state_id, "country": country, "state": state, "local_government": name}
+            elif level == STATE:
+                country_id, country = countries[parent]
+                states.append((pk, country, name))
+                yield {"id": pk, "parent_id": country_id, "country": country, "state": name,
+                       **({"state_capital": attributes[0]} if attributes[0] is not None else {})}
+            elif level == COUNTRY:
+                continent_id, continent = continents[parent]
+                countries.append((pk, name))
+                yield {"id": pk, "parent_id": continent_id, "continent": continent, "country": name,
+                       **{key: value for key, value in zip(ATTRIBUTES[COUNTRY], attributes) if value is not None}}
+            else:
+                continents.append((pk, name))
+                yield {"id": pk, "continent": name}
+        except IndexError:
+            raise InvalidBinary(f"'{name}' refers to a parent that is not in the file") from None
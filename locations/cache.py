@@ -0,0 +1,358 @@
+"""Response cache for the GET endpoints, invalidated per scope.
+
+Every cacheable endpoint depends on a few *scopes*: the planet-earth document,
+the continent list, the country list, one continent, one country (its detail and
+its states), one state's LGAs, and the names among which a miss looks for
+suggestions. Each scope has a generation counter stored in the cache backend,
+and a response is stored under a key made of the request (path, query string,
+``Accept``) and the generations of its scopes. A write bumps the generations of
+the scopes it affects (see ``signals.py``), so only the responses that depend on
+them stop being found; nothing has to be deleted, and stale entries age out of
+the backend. Bulk writers, which bypass the signals, call ``invalidate_all``.
+Views answering from an in-memory copy that can lag behind a write (the
+geography store, the autocomplete snapshot) tag their responses with its
+version, and those built from an older version than the database's are not
+stored: they would outlive the copy under the new generations.
+
+Scopes are named from the URL (normalized name keys), so a cached response is
+found without touching the database. Which backend holds the entries is set by
+``settings.RESPONSE_CACHE``. A process-local backend (local memory) only sees
+the generations bumped by its own process, not those of the other workers or
+of the management commands; with ``CHECK_VERSION`` each entry keeps the data
+version read before its response was built, and a hit whose version is not
+the current one is a miss, at the cost of that one query per lookup.
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from utils.text import normalize_name
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+
+ALL = "all"
+PLANET = "planet"
+CONTINENTS = "continents"
+COUNTRIES = "countries"
+COUNTRY_NAMES = "country-names"
+
+CACHEABLE_STATUSES = (200, 404)
+
+
+def continent_scope(key):
+    return f"continent:{key}"
+
+
+def country_scope(key):
+    return f"country:{key}"
+
+
+def state_scope(country_key, state_key):
+    return f"state:{country_key}:{state_key}"
+
+
+def state_names_scope(country_key):
+    return f"state-names:{country_key}"
+
+
+def _countries_scopes(kwargs, query):
+    country = query.get("country", "").strip()
+    if country:
+        return [country_scope(normalize_name(country)), COUNTRY_NAMES]
+    return [COUNTRIES]
+
+
+def _country_scopes(kwargs, query):
+    return [country_scope(normalize_name(kwargs["country_name"])), COUNTRY_NAMES]
+
+
+def _local_government_scopes(kwargs, query):
+    country_key = normalize_name(kwargs["country_name"])
+    return [state_scope(country_key, normalize_name(kwargs["state_name"])), COUNTRY_NAMES, state_names_scope(country_key)]
+
+
+# URL name -> function of (URL kwargs, query dict) returning the scopes of the response
+ENDPOINT_SCOPES = {
+    "all-continents-countries-states-sub-divisions": lambda kwargs, query: [PLANET],
+    "list-of-available-continents": lambda kwargs, query: [CONTINENTS],
+    "fetching-countries-by-continent": lambda kwargs, query: [continent_scope(normalize_name(kwargs["continent_name"]))],
+    "fetching-all-countries-available-and-searching-for-a-particular-country": _countries_scopes,
+    "fetch-all-states-in-a-country": _country_scopes,
+    "search-state-in-a-particular-country": _country_scopes,
+    "get-all-local-governments-in-a-state": _local_government_scopes,
+}
+
+
+def _digest(*parts):
+    return hashlib.blake2b("\n".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def _generation_key(scope):
+    return f"rc:gen:{_digest(scope)}"
+
+
+class Plan:
+    """What the middleware needs to look a request up and store its response."""
+
+    __slots__ = ("request", "scopes", "generation_keys", "key", "version")
+
+    def __init__(self, request, scopes):
+        self.request = request
+        self.scopes = scopes
+        self.generation_keys = [_generation_key(scope) for scope in (ALL, *scopes)]
+        self.key = None
+        # the data version number when checked, read before the response is built
+        self.version = None
+
+    def set_generations(self, generations):
+        request = self.request
+        self.key = "rc:response:" + _digest(
+            request.path,
+            request.META.get("QUERY_STRING", ""),
+            request.META.get("HTTP_ACCEPT", ""),
+            *(str(generations[key]) for key in self.generation_keys),
+        )
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.skipped = self.invalidations = 0
+
+    @property
+    def options(self):
+        return settings.RESPONSE_CACHE
+
+    @property
+    def backend(self):
+        return caches[self.options["ALIAS"]]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "skipped": self.skipped,
+            "invalidations": self.invalidations,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.stores = self.skipped = self.invalidations = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # Lookups
+
+    def plan(self, request):
+        """Return a ``Plan`` for a cacheable request, ``None`` otherwise."""
+        if not self.options or request.method not in ("GET", "HEAD"):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        scopes = ENDPOINT_SCOPES.get(match.url_name)
+        if scopes is None:
+            return None
+        return Plan(request, scopes(match.kwargs, request.GET))
+
+    def _missing_generations(self, plan, generations):
+        # A generation that is not in the backend (never bumped, or evicted)
+        # starts from the clock, so it can never reach a value an older entry
+        # was stored under.
+        return {key: time.time_ns() for key in plan.generation_keys if key not in generations}
+
+    def get(self, plan):
+        if self.options.get("CHECK_VERSION"):
+            plan.version = DataVersion.current().number
+        backend = self.backend
+        generations = backend.get_many(plan.generation_keys)
+        missing = self._missing_generations(plan, generations)
+        for key, value in missing.items():
+            backend.add(key, value, timeout=None)
+        if missing:
+            generations.update(backend.get_many(list(missing)))
+        plan.set_generations(generations)
+        return self._hit(plan, None if missing else backend.get(plan.key))
+
+    async def aget(self, plan):
+        if self.options.get("CHECK_VERSION"):
+            plan.version = (await DataVersion.acurrent()).number
+        backend = self.backend
+        generations = await backend.aget_many(plan.generation_keys)
+        missing = self._missing_generations(plan, generations)
+        for key, value in missing.items():
+            await backend.aadd(key, value, timeout=None)
+        if missing:
+            generations.update(await backend.aget_many(list(missing)))
+        plan.set_generations(generations)
+        return self._hit(plan, None if missing else await backend.aget(plan.key))
+
+    def _hit(self, plan, entry):
+        if entry is None:
+            self._count("misses")
+            return None
+        version, status, headers, content = pickle.loads(entry)
+        if version != plan.version:
+            # written in another process since this entry was stored
+            self._count("misses")
+            return None
+        self._count("hits")
+        response = HttpResponse(content, status=status)
+        for name, value in headers:
+            response.headers[name] = value
+        if status == 200:
+            conditional = get_conditional_response(
+                plan.request,
+                etag=response.get("ETag"),
+                last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+                response=response,
+            )
+            if conditional is not None:
+                response = conditional
+        response["X-Cache"] = "HIT"
+        return response
+
+    def _entry(self, plan, response):
+        """Return the pickled response, or ``None`` when it must not be cached."""
+        if (response.status_code not in CACHEABLE_STATUSES
+                or response.streaming
+                or response.cookies
+                or response.has_header("Content-Encoding")
+                or "no-store" in response.get("Cache-Control", "")
+                or "private" in response.get("Cache-Control", "")
+                or len(response.content) > self.options["MAX_SIZE"]):
+            return None
+        headers = [(name, value) for name, value in response.items() if name != "X-Cache"]
+        return pickle.dumps((plan.version, response.status_code, headers, response.content), pickle.HIGHEST_PROTOCOL)
+
+    def set(self, plan, response):
+        entry = self._entry(plan, response)
+        response["X-Cache"] = "MISS"
+        # A response of a copy lagging behind the database would be kept under
+        # the generations of the writes it does not show.
+        lagging = getattr(response, "data_version", None)
+        if entry is None or (lagging is not None and lagging != DataVersion.current()):
+            self._count("skipped")
+            return
+        self.backend.set(plan.key, entry, timeout=self.options["TIMEOUT"])
+        self._count("stores")
+
+    async def aset(self, plan, response):
+        entry = self._entry(plan, response)
+        response["X-Cache"] = "MISS"
+        lagging = getattr(response, "data_version", None)
+        if entry is None or (lagging is not None and lagging != await DataVersion.acurrent()):
+            self._count("skipped")
+            return
+        await self.backend.aset(plan.key, entry, timeout=self.options["TIMEOUT"])
+        self._count("stores")
+
+    # Invalidation
+
+    def _bump(self, scopes):
+        backend = self.backend
+        for scope in scopes:
+            key = _generation_key(scope)
+            try:
+                backend.incr(key)
+            except ValueError:
+                backend.set(key, time.time_ns(), timeout=None)
+        self._count("invalidations")
+
+    def invalidate(self, *scopes):
+        """Make the responses depending on any of ``scopes`` stale.
+
+        Inside a transaction the scopes are bumped again once it commits, so a
+        response rendered by a concurrent reader before the commit is not kept.
+        """
+        if not self.options or not scopes:
+            return
+        self._bump(scopes)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._bump(scopes))
+
+    def invalidate_all(self):
+        self.invalidate(ALL)
+
+    def clear(self):
+        if self.options:
+            self.backend.clear()
+
+
+response_cache = ResponseCache()
+
+
+# model -> (parent model, name key lookups from the parent up to its continent)
+PARENT_KEYS = {
+    Country: (Continent, ("name_key",)),
+    State: (Country, ("name_key", "continent__name_key")),
+    LocalGovernment: (State, ("name_key", "country__name_key", "country__continent__name_key")),
+}
+
+
+def row_scopes(model, parent_id, name_key, membership):
+    """Scopes affected by writing a ``model`` row with this parent and name key.
+
+    ``membership`` is true when the row was created, deleted, renamed or moved,
+    which also changes the lists and names of its siblings. Returns ``None`` when
+    the parent no longer exists (a cascading delete).
+    """
+    parent_model, lookups = PARENT_KEYS[model]
+    keys = parent_model.objects.filter(pk=parent_id).values_list(*lookups).first()
+    if keys is None:
+        return None
+    if model is LocalGovernment:
+        state_key, country_key, continent_key = keys
+        return [PLANET, continent_scope(continent_key), country_scope(country_key), state_scope(country_key, state_key)]
+    if model is State:
+        country_key, continent_key = keys
+        scopes = [PLANET, continent_scope(continent_key), country_scope(country_key), state_scope(country_key, name_key)]
+        if membership:
+            scopes += [COUNTRIES, state_names_scope(country_key)]
+        return scopes
+    (continent_key,) = keys
+    scopes = [PLANET, COUNTRIES, continent_scope(continent_key), country_scope(name_key)]
+    if membership:
+        scopes += [CONTINENTS, COUNTRY_NAMES]
+    return scopes
+
+
+def invalidate_rows(model, rows, membership):
+    """Invalidate the scopes of ``(parent_id, name_key)`` rows of ``model``."""
+    if model is Continent:
+        # Continent names appear in every country of every document.
+        response_cache.invalidate_all()
+        return
+    scopes = set()
+    for parent_id, name_key in rows:
+        affected = row_scopes(model, parent_id, name_key, membership)
+        if affected is None:
+            response_cache.invalidate_all()
+            return
+        scopes.update(affected)
+    response_cache.invalidate(*sorted(scopes))
+
+
+def cache_metrics():
+    """The counters of ``response_cache`` for ``/metrics`` (this process only)."""
+    lines = []
+    for name, value in response_cache.stats().items():
+        if name != "hit_ratio":
+            lines += [f"# TYPE response_cache_{name}_total counter", f"response_cache_{name}_total {value}"]
+    return lines
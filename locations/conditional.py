@@ -0,0 +1,98 @@
+"""Conditional GET support for the location endpoints.
+
+Validators are derived from the global ``DataVersion`` row rather than from the
+response body, so a client revalidating an unchanged resource gets its 304 after
+a single cheap query, before any lookup or serialization happens.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import DataVersion
+
+
+def compute_validators(request, version):
+    """Return the ``(etag, last_modified)`` pair for ``request`` at ``version``."""
+    representation = "\n".join([
+        request.path,
+        request.META.get("QUERY_STRING", ""),
+        request.META.get("HTTP_ACCEPT", ""),
+        str(version.number),
+        version.date_updated.isoformat() if version.date_updated else "",
+    ])
+    digest = hashlib.blake2b(representation.encode(), digest_size=12).hexdigest()
+    last_modified = int(version.date_updated.timestamp()) if version.date_updated else None
+    return f'W/"{digest}"', last_modified
+
+
+def set_validators(response, etag, last_modified):
+    response.headers.setdefault("ETag", etag)
+    if last_modified is not None:
+        response.headers.setdefault("Last-Modified", http_date(last_modified))
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+class ConditionalGetMixin:
+    """Answer unchanged GET/HEAD requests with 304 and tag fresh 200 responses.
+
+    The data version read here is kept on ``self.data_version`` so the view can
+    reuse it instead of querying it a second time. Views answering from a copy
+    of the data that can lag behind the database override ``current_version``
+    to return the version of that copy, so a stale body never gets the
+    validators of the data it lacks, and set ``lagging`` so their responses
+    carry that version as ``response.data_version``: the response cache does
+    not store one built from an older version than the database's.
+    """
+
+    data_version = None
+    lagging = False
+
+    def current_version(self):
+        return DataVersion.current()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.data_version = self.current_version()
+        etag, last_modified = compute_validators(request, self.data_version)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return set_validators(response, etag, last_modified)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        if self.lagging:
+            response.data_version = self.data_version
+        return response
+
+
+class AsyncConditionalGetMixin:
+    """``ConditionalGetMixin`` for views with async handlers."""
+
+    data_version = None
+    lagging = False
+
+    async def current_version(self):
+        return await DataVersion.acurrent()
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await super().dispatch(request, *args, **kwargs)
+
+        self.data_version = await self.current_version()
+        etag, last_modified = compute_validators(request, self.data_version)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return set_validators(response, etag, last_modified)
+
+        response = await super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        if self.lagging:
+            response.data_version = self.data_version
+        return response
@@ -0,0 +1,38 @@
+"""Denormalized child counts kept on the parent rows.
+
+``Continent.countries_count``, ``Country.states_count`` and
+``State.local_governments_count`` are maintained by the model signals on
+every save and delete. Bulk writers, which bypass the signals, call
+``recount`` for the parents they touched.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Continent, Country, State, LocalGovernment
+
+# child model -> (foreign key attname, parent model, counter field on the parent)
+COUNTERS = {
+    Country: ("continent_id", Continent, "countries_count"),
+    State: ("country_id", Country, "states_count"),
+    LocalGovernment: ("state_id", State, "local_governments_count"),
+}
+
+
+def adjust(child_model, parent_id, delta):
+    _, parent_model, field = COUNTERS[child_model]
+    parent_model.objects.filter(pk=parent_id).update(**{field: F(field) + delta})
+
+
+def recount(parent_model, parent_ids=None):
+    """Recompute the counter of ``parent_model`` rows (all of them by default) in one query."""
+    for child_model, (foreign_key, model, field) in COUNTERS.items():
+        if model is not parent_model:
+            continue
+        children = (child_model.objects.filter(**{foreign_key: OuterRef("pk")})
+                    .order_by().values(foreign_key).annotate(total=Count("pk")).values("total"))
+        parents = parent_model.objects.all()
+        if parent_ids is not None:
+            parents = parents.filter(pk__in=list(parent_ids))
+        return parents.update(**{field: Coalesce(Subquery(children), Value(0))})
+    raise ValueError(f"{parent_model.__name__} has no child counter")
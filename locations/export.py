@@ -0,0 +1,214 @@
+"""Streaming export of the whole hierarchy, for ``import_locations`` to load back.
+
+``Exporter.chunks`` reads the continents, then the countries, states and LGAs,
+each with one ordered ``values_list`` iterator fetched ``chunk_size`` rows at a
+time (a server-side cursor on PostgreSQL, ``fetchmany`` on SQLite), and yields
+the encoded output every ``flush_every`` records. Memory is bounded by those
+sizes plus the names of the continents, countries and states, which the
+records of their children repeat, whatever the number of LGAs.
+
+The output holds the flat records of ``importer.FIELDS``, parents first, as
+NDJSON, as CSV with a header row, or in the format of ``binary.py``; each of
+them is read back by ``importer.read_records``. Every record has the ``id`` of
+its location and, below the continents, the ``parent_id`` of its parent, and
+the importer creates the missing locations with those ids. The four tables
+are read in one transaction, at the repeatable read isolation level on
+PostgreSQL, so a write made during an export is either wholly in it or not at
+all, and no row is exported without its parent.
+"""
+
+import csv
+import io
+import time
+
+from utils.db import consistent_reads
+from . import binary
+from .importer import FIELDS
+from .models import Continent, Country, State, LocalGovernment
+from .streaming import dumps
+
+CHUNK_SIZE = 5000
+FLUSH_EVERY = 5000
+
+
+class NDJSONEncoder:
+    content_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self):
+        self.lines = []
+        # id -> the JSON of the name, or of the names leading to the row, that its children repeat
+        self.continents = {}
+        self.countries = {}
+        self.states = {}
+
+    def header(self):
+        pass
+
+    def continent(self, pk, name):
+        self.continents[pk] = dumps(name)
+        self.lines.append(f'{{"id":{pk},"continent":{self.continents[pk]}}}\n')
+
+    def country(self, pk, continent_id, name, capital, currency, language):
+        self.countries[pk] = dumps(name)
+        record = {"capital": capital, "currency": currency, "language": language}
+        attributes = "".join(f',"{key}":{dumps(value)}' for key, value in record.items() if value is not None)
+        self.lines.append(f'{{"id":{pk},"parent_id":{continent_id},"continent":{self.continents[continent_id]},'
+                          f'"country":{self.countries[pk]}{attributes}}}\n')
+
+    def state(self, pk, country_id, name, capital):
+        self.states[pk] = f'"country":{self.countries[country_id]},"state":{dumps(name)}'
+        capital = f',"state_capital":{dumps(capital)}' if capital is not None else ""
+        self.lines.append(f'{{"id":{pk},"parent_id":{country_id},{self.states[pk]}{capital}}}\n')
+
+    def local_government(self, pk, state_id, name):
+        self.lines.append(f'{{"id":{pk},"parent_id":{state_id},{self.states[state_id]},'
+                          f'"local_government":{dumps(name)}}}\n')
+
+    def flush(self):
+        data = "".join(self.lines).encode()
+        self.lines.clear()
+        return data
+
+
+class CSVEncoder:
+    content_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self):
+        self.rows = []
+        self.continents = {}
+        self.countries = {}
+        self.states = {}
+
+    def header(self):
+        self.rows.append(FIELDS)
+
+    def continent(self, pk, name):
+        self.continents[pk] = name
+        self.rows.append((pk, "", name, "", "", "", "", "", "", ""))
+
+    def country(self, pk, continent_id, name, capital, currency, language):
+        self.countries[pk] = name
+        self.rows.append((pk, continent_id, self.continents[continent_id], name, capital, currency, language, "", "", ""))
+
+    def state(self, pk, country_id, name, capital):
+        self.states[pk] = self.countries[country_id], name
+        self.rows.append((pk, country_id, "", self.countries[country_id], "", "", "", name, capital, ""))
+
+    def local_government(self, pk, state_id, name):
+        country, state = self.states[state_id]
+        self.rows.append((pk, state_id, "", country, "", "", "", state, "", name))
+
+    def flush(self):
+        output = io.StringIO()
+        csv.writer(output).writerows(self.rows)
+        self.rows.clear()
+        return output.getvalue().encode()
+
+
+class BinaryEncoder:
+    content_type = "application/octet-stream"
+    extension = "bin"
+
+    def __init__(self):
+        self.parts = []
+        # id -> position among the rows of its level, which the children refer to
+        self.continents = {}
+        self.countries = {}
+        self.states = {}
+
+    def header(self):
+        self.parts.append(binary.MAGIC)
+
+    def continent(self, pk, name):
+        self.continents[pk] = len(self.continents)
+        self.parts.append(binary.pack_record(binary.CONTINENT, pk, 0, name))
+
+    def country(self, pk, continent_id, name, capital, currency, language):
+        self.countries[pk] = len(self.countries)
+        self.parts.append(binary.pack_record(binary.COUNTRY, pk, self.continents[continent_id], name,
+                                             capital, currency, language))
+
+    def state(self, pk, country_id, name, capital):
+        self.states[pk] = len(self.states)
+        self.parts.append(binary.pack_record(binary.STATE, pk, self.countries[country_id], name, capital))
+
+    def local_government(self, pk, state_id, name):
+        self.parts.append(binary.pack_record(binary.LOCAL_GOVERNMENT, pk, self.states[state_id], name))
+
+    def flush(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+ENCODERS = {"ndjson": NDJSONEncoder, "csv": CSVEncoder, "binary": BinaryEncoder}
+
+
+class UnknownFormat(ValueError):
+    pass
+
+
+class Exporter:
+    """Encode every location as ``format``; ``records`` and ``bytes`` count what was yielded so far."""
+
+    def __init__(self, format="ndjson", chunk_size=CHUNK_SIZE, flush_every=FLUSH_EVERY):
+        if format not in ENCODERS:
+            raise UnknownFormat(f"Unknown export format '{format}', expected {', '.join(ENCODERS)}")
+        self.encoder = ENCODERS[format]()
+        self.chunk_size = chunk_size
+        self.flush_every = flush_every
+        self.records = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    @property
+    def content_type(self):
+        return self.encoder.content_type
+
+    @property
+    def filename(self):
+        return f"locations.{self.encoder.extension}"
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def _rows(self, queryset, *fields):
+        return queryset.values_list(*fields).iterator(chunk_size=self.chunk_size)
+
+    def chunks(self):
+        """Yield the export as ``bytes`` chunks, all read from one snapshot of the database."""
+        with consistent_reads():
+            yield from self._chunks()
+
+    def _chunks(self):
+        encoder = self.encoder
+        encoder.header()
+        levels = (
+            (encoder.continent, self._rows(Continent.objects.order_by("pk"), "pk", "name")),
+            (encoder.country, self._rows(Country.objects.order_by("pk"),
+                                         "pk", "continent_id", "name", "capital", "currency", "language")),
+            (encoder.state, self._rows(State.objects.order_by("pk"), "pk", "country_id", "name", "capital")),
+            # grouped by state, so the importer loads the LGA names of few states per batch
+            (encoder.local_government, self._rows(LocalGovernment.objects.order_by("state_id", "pk"),
+                                                  "pk", "state_id", "name")),
+        )
+        pending = 0
+        for encode, rows in levels:
+            for row in rows:
+                encode(*row)
+                pending += 1
+                if pending == self.flush_every:
+                    yield self._flush(pending)
+                    pending = 0
+        data = self._flush(pending)
+        if data:
+            yield data
+
+    def _flush(self, pending):
+        data = self.encoder.flush()
+        self.records += pending
+        self.bytes += len(data)
+        return data
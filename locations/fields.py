@@ -0,0 +1,60 @@
+"""Sparse fieldsets: ``?fields=name,capital,states.name``.
+
+The selector lists the fields of the serialized items, with dotted paths into
+nested ones. It is parsed into a tree of field name -> subtree, where a subtree
+of ``None`` keeps the whole field (``states`` alone keeps every state field).
+The tree is checked against the serializers' fields, then restricts the
+columns ``lean.py`` selects and the nested levels it fetches.
+"""
+
+from rest_framework import serializers
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def parse_fields(value):
+    """Return the field tree of a ``fields`` query value, ``None`` when it is empty."""
+    paths = [path.strip() for path in (value or "").split(",") if path.strip()]
+    if not paths:
+        return None
+    tree = {}
+    for path in paths:
+        names = path.split(".")
+        if not all(names):
+            raise InvalidFields(f"Invalid field '{path}'")
+        node = tree
+        for name in names[:-1]:
+            if name in node and node[name] is None:
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[names[-1]] = None
+    return tree
+
+
+def nested_serializer(field):
+    field = getattr(field, "child", field)
+    return field if isinstance(field, serializers.Serializer) else None
+
+
+def check_fields(serializer, tree, prefix=""):
+    """Raise ``InvalidFields`` unless every path of ``tree`` exists on ``serializer``."""
+    for name, subtree in tree.items():
+        if name not in serializer.fields:
+            available = ", ".join(prefix + field for field in serializer.fields)
+            raise InvalidFields(f"Unknown field '{prefix}{name}'. Available fields: {available}")
+        if subtree is not None:
+            nested = nested_serializer(serializer.fields[name])
+            if nested is None:
+                raise InvalidFields(f"Field '{prefix}{name}' has no nested fields")
+            check_fields(nested, subtree, f"{prefix}{name}.")
+
+
+def wants(fields, name):
+    return fields is None or name in fields
+
+
+def subfields(fields, name):
+    return None if fields is None else fields[name]
@@ -0,0 +1,339 @@
+"""In-memory copy of the whole hierarchy, for serving the reads without the database.
+
+With ``settings.GEOGRAPHY_STORE`` set, ``urls.py`` routes the read endpoints
+to ``memory_views.py``, which answer from the ``World`` held by ``geography``.
+A ``World`` is loaded with one query per table and never modified:
+
+* continents, countries and states are ``__slots__`` records, indexed by name
+  key (states by country and name key) in dicts, each holding its children in
+  id order and in name order;
+* LGAs, the bulk of the rows, are columns sorted by state and id: the ids in
+  an ``array``, the names in one ``Blob`` string. The LGAs of a state are the
+  range its record points to, and ``by_name`` holds the same ranges in name
+  order.
+
+Records answer ``row[column]`` for the columns of ``serializers.py``, so the
+shapes of ``lean.py`` turn them into response items as they do ``values()``
+rows and the responses are the database views' (see the tests). Lists sorted by
+name are sorted by code point, as SQLite does, with the id breaking ties.
+
+``geography.world()`` reads ``DataVersion`` at most every ``CHECK_INTERVAL``
+seconds, so requests in between make no query at all, and a write is served
+once the next check sees it. A new version is loaded in a background thread
+while the current world keeps answering, then swapped in with one assignment:
+a request sees one world or the other, never a mix. The first world of a
+process is loaded on first use; ``controller/wsgi.py`` and ``asgi.py`` load it
+at startup.
+"""
+
+import logging
+import sys
+import threading
+import time
+from array import array
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection
+
+from utils.db import consistent_reads
+from utils.text import normalize_name
+from .autocomplete import Blob
+from .lean import nested_levels, shape_of
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10000
+
+
+class Row:
+    """A record readable as a ``values()`` row: ``row[column]``."""
+
+    __slots__ = ()
+
+    def __getitem__(self, column):
+        return getattr(self, column)
+
+
+class ContinentRow(Row):
+    __slots__ = ("id", "name", "name_key", "countries_count", "children", "children_by_name")
+
+    def __init__(self, pk, name, name_key, countries_count):
+        self.id, self.name, self.name_key, self.countries_count = pk, name, name_key, countries_count
+        self.children = self.children_by_name = ()
+
+
+class CountryRow(Row):
+    __slots__ = ("id", "name", "name_key", "capital", "currency", "language", "states_count",
+                 "continent_id", "continent__name", "children", "children_by_name")
+
+    def __init__(self, pk, name, name_key, capital, currency, language, states_count, continent):
+        self.id, self.name, self.name_key = pk, name, name_key
+        self.capital, self.currency, self.language, self.states_count = capital, currency, language, states_count
+        self.continent_id, self.continent__name = continent.id, continent.name
+        self.children = self.children_by_name = ()
+
+
+class StateRow(Row):
+    # start and end delimit the state's LGAs in the columns of the world
+    __slots__ = ("id", "name", "name_key", "capital", "local_governments_count", "country_id", "start", "end")
+
+    def __init__(self, pk, name, name_key, capital, local_governments_count, country_id):
+        self.id, self.name, self.name_key, self.capital = pk, name, name_key, capital
+        self.local_governments_count, self.country_id = local_governments_count, country_id
+        self.start = self.end = 0
+
+
+by_name = attrgetter("name", "id")
+
+
+class LocalGovernments:
+    """The LGAs at ``positions`` of a world's columns, as a sequence of ``values()``-like rows.
+
+    Rows are only made for the positions read, so a page of a long list costs
+    the page.
+    """
+
+    __slots__ = ("ids", "name_of", "state_id", "positions")
+
+    def __init__(self, world, state_id, positions):
+        self.ids, self.name_of, self.state_id, self.positions = world.ids, world.names.getter(), state_id, positions
+
+    def _row(self, position):
+        return {"id": self.ids[position], "name": self.name_of(position), "state_id": self.state_id}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(position) for position in self.positions[index]]
+        return self._row(self.positions[index])
+
+    def __iter__(self):
+        return map(self._row, self.positions)
+
+
+class World:
+    """Every location at ``version``; see the module docstring."""
+
+    def __init__(self, version):
+        started = time.perf_counter()
+        self.version = version
+        # one snapshot: a row added between two queries would have no parent yet
+        with consistent_reads():
+            self.continents = tuple(
+                ContinentRow(*row) for row in
+                Continent.objects.order_by("pk").values_list("pk", "name", "name_key", "countries_count")
+            )
+            self.continents_by_key = {continent.name_key: continent for continent in self.continents}
+            continents = {continent.id: continent for continent in self.continents}
+
+            rows = Country.objects.order_by("pk").values_list(
+                "pk", "name", "name_key", "capital", "currency", "language", "states_count", "continent_id")
+            self.countries = tuple(CountryRow(*row[:-1], continents[row[-1]]) for row in rows.iterator(chunk_size=CHUNK_SIZE))
+            self.countries_by_key = {country.name_key: country for country in self.countries}
+            self.countries_by_id = {country.id: country for country in self.countries}
+            self.countries_by_name = tuple(sorted(self.countries, key=by_name))
+            self._group(self.continents, self.countries, "continent_id")
+
+            rows = State.objects.order_by("pk").values_list(
+                "pk", "name", "name_key", "capital", "local_governments_count", "country_id")
+            self.states = tuple(StateRow(*row) for row in rows.iterator(chunk_size=CHUNK_SIZE))
+            self.states_by_key = {(state.country_id, state.name_key): state for state in self.states}
+            self.states_by_id = {state.id: state for state in self.states}
+            self._group(self.countries, self.states, "country_id")
+            self._load_local_governments()
+        self.load_seconds = time.perf_counter() - started
+        self.footprint = self._measure()
+
+    @staticmethod
+    def _group(parents, children, parent_column):
+        grouped = {parent.id: [] for parent in parents}
+        for child in children:
+            grouped[getattr(child, parent_column)].append(child)
+        for parent in parents:
+            parent.children = tuple(grouped[parent.id])
+            parent.children_by_name = tuple(sorted(parent.children, key=by_name))
+
+    def _load_local_governments(self):
+        states = self.states_by_id
+        self.ids = array("q")
+        names = []
+        rows = LocalGovernment.objects.order_by("state_id", "pk").values_list("state_id", "pk", "name")
+        state = None
+        for state_id, pk, name in rows.iterator(chunk_size=CHUNK_SIZE):
+            if state is None or state.id != state_id:
+                if state is not None:
+                    state.end = len(names)
+                state = states[state_id]
+                state.start = len(names)
+            self.ids.append(pk)
+            names.append(name)
+        if state is not None:
+            state.end = len(names)
+        self.names = Blob(names)
+        self.by_name = array("I", range(len(names)))
+        for state in self.states:
+            self.by_name[state.start:state.end] = array("I", sorted(
+                range(state.start, state.end), key=lambda position: (names[position], self.ids[position])))
+
+    def continent(self, name):
+        return self.continents_by_key.get(normalize_name(name))
+
+    def country(self, name):
+        return self.countries_by_key.get(normalize_name(name))
+
+    def state(self, country, name):
+        return self.states_by_key.get((country.id, normalize_name(name)))
+
+    def local_governments(self, state, ordered_by_name=False):
+        """The LGAs of ``state``, in id or name order."""
+        positions = self.by_name[state.start:state.end] if ordered_by_name else range(state.start, state.end)
+        return LocalGovernments(self, state.id, positions)
+
+    def children(self, row):
+        return self.local_governments(row) if isinstance(row, StateRow) else row.children
+
+    def names_under(self, level, parent=None):
+        """The names of ``level`` (under the id ``parent``), for the suggestion index."""
+        if level == "continent":
+            return [continent.name for continent in self.continents]
+        if level == "country":
+            return [country.name for country in self.countries]
+        if level == "state":
+            return [state.name for state in self.countries_by_id[parent].children]
+        state = self.states_by_id[parent]
+        return [self.names[position] for position in range(state.start, state.end)]
+
+    def levels(self, rows, serializer_class, fields=None):
+        """``lean.fetch_levels`` from memory: the ``(shape, parent column, rows)`` of ``rows`` and below."""
+        levels = [(shape_of(serializer_class, fields), None, rows)]
+        for nested_class, nested_fields, parent_column in nested_levels(serializer_class, fields):
+            rows = [child for row in rows for child in self.children(row)]
+            levels.append((shape_of(nested_class, nested_fields), parent_column, rows))
+        return levels
+
+    def _measure(self):
+        """Approximate bytes held per part; strings shared by several records are counted once."""
+        seen = set()
+
+        def size(value):
+            if id(value) in seen:
+                return 0
+            seen.add(id(value))
+            return sys.getsizeof(value)
+
+        def records(rows):
+            total = size(rows)
+            for row in rows:
+                total += size(row)
+                for slot in row.__slots__:
+                    value = getattr(row, slot)
+                    if isinstance(value, (str, tuple)):
+                        total += size(value)
+            return total
+
+        footprint = {
+            "continents": records(self.continents),
+            "countries": records(self.countries) + size(self.countries_by_name),
+            "states": records(self.states),
+            "local_governments": sum(size(part) for part in (
+                self.ids, self.names.text, self.names.offsets, self.by_name)),
+            "indexes": sum(size(index) for index in (self.continents_by_key, self.countries_by_key, self.countries_by_id,
+                                                     self.states_by_key, self.states_by_id))
+            + sum(size(key) for key in self.states_by_key),
+        }
+        footprint["total"] = sum(footprint.values())
+        return footprint
+
+    def counts(self):
+        return {
+            "continents": len(self.continents),
+            "countries": len(self.countries),
+            "states": len(self.states),
+            "local_governments": len(self.ids),
+        }
+
+
+class GeographyStore:
+    """Per-process holder of the current ``World``; see the module docstring."""
+
+    # Load new versions in a background thread; tests load inline.
+    background = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._world = None
+        self._building = None
+        self._checked = 0.0
+        self.loads = 0
+
+    @property
+    def check_interval(self):
+        return (settings.GEOGRAPHY_STORE or {}).get("CHECK_INTERVAL", 0)
+
+    def world(self):
+        world = self._world
+        now = time.monotonic()
+        if world is not None and now - self._checked < self.check_interval:
+            return world
+        self._checked = now
+        version = DataVersion.current()
+        if world is not None and world.version == version:
+            return world
+        if world is None or not self.background:
+            with self._lock:
+                if self._world is None or self._world.version != version:
+                    self._swap(World(version))
+                return self._world
+        with self._lock:
+            if self._building is None:
+                self._building = threading.Thread(target=self._reload, args=(version,), daemon=True)
+                self._building.start()
+        return world
+
+    def _swap(self, world):
+        self._world = world
+        self.loads += 1
+
+    def _reload(self, version):
+        try:
+            world = World(version)
+            with self._lock:
+                if self._world is None or self._world.version != version:
+                    self._swap(world)
+        except Exception:
+            logger.exception("Reloading the geography store failed")
+        finally:
+            self._building = None
+            connection.close()
+
+    def current(self):
+        """The loaded world, without checking the version; ``None`` before the first load."""
+        return self._world
+
+    def clear(self):
+        with self._lock:
+            self._world = None
+            self._checked = 0.0
+
+
+geography = GeographyStore()
+
+
+def geography_metrics():
+    """The size of this process's ``World`` for ``/metrics``."""
+    world = geography.current()
+    if world is None:
+        return []
+    lines = ["# TYPE geography_store_bytes gauge"]
+    lines += [f'geography_store_bytes{{part="{part}"}} {size}' for part, size in world.footprint.items() if part != "total"]
+    lines += ["# TYPE geography_store_rows gauge"]
+    lines += [f'geography_store_rows{{level="{level}"}} {count}' for level, count in world.counts().items()]
+    lines += [
+        "# TYPE geography_store_version gauge", f"geography_store_version {world.version.number}",
+        "# TYPE geography_store_loads_total counter", f"geography_store_loads_total {geography.loads}",
+    ]
+    return lines
@@ -0,0 +1,405 @@
+"""Bulk import of continent -> country -> state -> LGA trees.
+
+Input is read as flat records, one per location, with the keys of ``FIELDS``;
+a record names its ancestors and only the deepest level it names is created or
+updated from it (its ancestors must then exist or be defined by the record's
+own ancestor columns). A location is created with the record's ``id`` when it
+has one, so an export loads back with the same ids; a location that already
+exists keeps its own. ``parent_id`` is informative only: parents are found by
+name. The readers accept:
+
+* JSON: a list of continents, or the ``/planet-earth`` document, where each
+  continent has ``countries``, each country ``states`` and each state
+  ``local_governments`` (names or ``{"name": ...}`` objects);
+* CSV with a header row of ``FIELDS`` columns;
+* NDJSON with one record object per line;
+* the binary format of ``binary.py``.
+
+``export.py`` writes the CSV, NDJSON and binary files.
+
+``Importer`` resolves parents in memory: continents, countries and states are
+loaded once, and the existing LGA names of the states a chunk touches are
+loaded with one query per chunk. New rows are inserted with ``bulk_create``
+and changed rows saved with ``bulk_update``, one transaction per chunk, after
+which the parent counters of the chunk are recomputed and the data version is
+bumped once. Rows another writer created since they were loaded make their
+inserts conflict with the unique name constraints; the conflicts are ignored
+and the existing rows used instead, so concurrent imports do not fail.
+"""
+
+import csv
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from utils.snowflake import generate_ids
+from utils.text import normalize_name
+from .binary import read_binary
+from .cache import response_cache
+from .counters import recount
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+
+FIELDS = ["id", "parent_id", "continent", "country", "capital", "currency", "language", "state", "state_capital",
+          "local_government"]
+
+# record key -> model field, for the optional attributes of each level
+COUNTRY_ATTRIBUTES = {"capital": "capital", "currency": "currency", "language": "language"}
+STATE_ATTRIBUTES = {"state_capital": "capital"}
+
+LEVELS = ("continent", "country", "state", "local_government")
+
+# level -> the fields of its unique name constraint
+UNIQUE_FIELDS = {"continent": ("name_key",), "country": ("name_key",), "state": ("country_id", "name_key")}
+
+
+class InvalidRecord(ValueError):
+    """A record that cannot be imported."""
+
+
+def tree_records(continents):
+    """Flatten nested continent dicts (as served by /planet-earth) into records."""
+    for continent in continents:
+        yield {"continent": continent["name"]}
+        for country in continent.get("countries", ()):
+            yield {"continent": continent["name"], "country": country["name"],
+                   **{key: country[key] for key in COUNTRY_ATTRIBUTES if key in country}}
+            for state in country.get("states", ()):
+                record = {"country": country["name"], "state": state["name"]}
+                if "capital" in state:
+                    record["state_capital"] = state["capital"]
+                yield record
+                for local_government in state.get("local_governments", ()):
+                    name = local_government["name"] if isinstance(local_government, dict) else local_government
+                    yield {"country": country["name"], "state": state["name"], "local_government": name}
+
+
+def read_records(path, format=None):
+    """Yield the records of a JSON, CSV, NDJSON or binary file; the format defaults to the file extension."""
+    path = Path(path)
+    format = (format or path.suffix.lstrip(".")).lower()
+
+    if format == "json":
+        with path.open(encoding="utf-8") as file:
+            data = json.load(file)
+        yield from tree_records(data["continents"] if isinstance(data, dict) else data)
+    elif format == "csv":
+        with path.open(encoding="utf-8", newline="") as file:
+            for row in csv.DictReader(file):
+                yield {key: value for key, value in row.items() if key in FIELDS and value != ""}
+    elif format in ("ndjson", "jsonl"):
+        with path.open(encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    elif format in ("binary", "bin"):
+        with path.open("rb") as file:
+            yield from read_binary(file)
+    else:
+        raise InvalidRecord(f"Unsupported format '{format}', expected json, csv, ndjson or binary")
+
+
+class LevelStats:
+    __slots__ = ("created", "updated", "unchanged")
+
+    def __init__(self):
+        self.created = self.updated = self.unchanged = 0
+
+
+class Importer:
+    """Stage records and write them in batches.
+
+    Use ``feed`` for each record (or ``run`` for an iterable) and ``close`` at the
+    end. With ``dry_run`` nothing is written but the statistics are the same.
+    ``progress`` is called with the importer after every written batch.
+    """
+
+    def __init__(self, batch_size=5000, dry_run=False, progress=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.stats = {level: LevelStats() for level in LEVELS}
+        self.records = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+        self.continents = {c.name_key: c for c in Continent.objects.all()}
+        self.countries = {c.name_key: c for c in Country.objects.all()}
+        self.states = {(s.country_id, s.name_key): s for s in State.objects.all()}
+        self.ids = {
+            "continent": {c.pk for c in self.continents.values()},
+            "country": {c.pk for c in self.countries.values()},
+            "state": {s.pk for s in self.states.values()},
+        }
+        # state id -> name keys of its LGAs; filled for the states a batch touches
+        self.local_government_keys = {}
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self.new = {level: [] for level in LEVELS[:3]}
+        self.changed = {level: {} for level in LEVELS[:3]}
+        self.pending_local_governments = []
+        self.touched = defaultdict(set)
+        self.pending = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def run(self, records):
+        for record in records:
+            self.feed(record)
+        self.close()
+        return self
+
+    def feed(self, record):
+        self.records += 1
+        try:
+            self._stage(record)
+        except (InvalidRecord, KeyError, TypeError, AttributeError) as error:
+            self.errors.append(f"Record {self.records}: {error}")
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def close(self):
+        self.flush()
+
+    def _text(self, record, key):
+        value = record.get(key)
+        if value is None:
+            return None
+        value = str(value).strip()
+        if not value:
+            raise InvalidRecord(f"'{key}' is empty")
+        return value
+
+    def _id(self, record):
+        value = record.get("id")
+        if value is None or value == "":
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise InvalidRecord(f"'id' is not an integer: {value!r}") from None
+
+    def _stage(self, record):
+        names = {level: self._text(record, level) for level in LEVELS}
+        deepest = max((i for i, level in enumerate(LEVELS) if names[level]), default=None)
+        if deepest is None:
+            raise InvalidRecord("the record names no location")
+        pk = self._id(record)
+        continent = self._continent(names["continent"], pk, create=deepest == 0) if names["continent"] else None
+        if deepest == 0:
+            return
+        country = self._country(names["country"], continent, record, pk, define=deepest == 1)
+        if deepest == 1:
+            return
+        state = self._state(names["state"], country, record, pk, define=deepest == 2)
+        if deepest == 2:
+            return
+        self.pending_local_governments.append((state, names["local_government"], pk))
+        self.touched["state"].add(state.pk)
+        self.pending += 1
+
+    def _continent(self, name, pk, create):
+        key = normalize_name(name)
+        continent = self.continents.get(key)
+        if continent is None:
+            continent = self.continents[key] = self._create(
+                "continent", Continent, pk if create else None, name=name, name_key=key,
+            )
+        elif create:
+            self.stats["continent"].unchanged += 1
+        return continent
+
+    def _country(self, name, continent, record, pk, define):
+        if not name:
+            raise InvalidRecord("'country' is missing")
+        key = normalize_name(name)
+        country = self.countries.get(key)
+        attributes = {field: record[key_] for key_, field in COUNTRY_ATTRIBUTES.items() if key_ in record} if define else {}
+        if country is None:
+            if continent is None:
+                raise InvalidRecord(f"country '{name}' does not exist and the record has no continent")
+            country = self.countries[key] = self._create(
+                "country", Country, pk if define else None, name=name, name_key=key, continent=continent,
+                capital=attributes.get("capital", ""), language=attributes.get("language", ""),
+                currency=attributes.get("currency"),
+            )
+            self.touched["continent"].add(continent.pk)
+        elif define:
+            if continent is not None and country.continent_id != continent.pk:
+                self.touched["continent"].update((country.continent_id, continent.pk))
+                attributes["continent"] = continent
+            self._update("country", country, attributes)
+        elif continent is not None and country.continent_id != continent.pk:
+            raise InvalidRecord(f"country '{name}' belongs to another continent")
+        return country
+
+    def _state(self, name, country, record, pk, define):
+        if not name:
+            raise InvalidRecord("'state' is missing")
+        key = normalize_name(name)
+        state = self.states.get((country.pk, key))
+        attributes = {field: record[key_] for key_, field in STATE_ATTRIBUTES.items() if key_ in record} if define else {}
+        if state is None:
+            state = self.states[(country.pk, key)] = self._create(
+                "state", State, pk if define else None, name=name, name_key=key, country=country,
+                capital=attributes.get("capital"),
+            )
+            self.local_government_keys[state.pk] = set()
+            self.touched["country"].add(country.pk)
+        elif define:
+            self._update("state", state, attributes)
+        return state
+
+    def _create(self, level, model, pk, **fields):
+        """Stage a new row, with the id ``pk`` if given or a new snowflake."""
+        if pk is not None and pk in self.ids[level]:
+            raise InvalidRecord(f"id {pk} is already used by another {level.replace('_', ' ')}")
+        instance = model(**fields) if pk is None else model(id=pk, **fields)
+        self.ids[level].add(instance.pk)
+        self.new[level].append(instance)
+        self.stats[level].created += 1
+        self.pending += 1
+        return instance
+
+    def _update(self, level, instance, attributes):
+        changed = {field: value for field, value in attributes.items() if getattr(instance, field) != value}
+        if not changed:
+            self.stats[level].unchanged += 1
+            return
+        for field, value in changed.items():
+            setattr(instance, field, value)
+        if instance._state.adding:
+            # Not written yet: the pending insert picks the new values up.
+            return
+        self.changed[level].setdefault(instance.pk, (instance, set()))[1].update(changed)
+        self.stats[level].updated += 1
+        self.pending += 1
+
+    def _load_local_government_keys(self):
+        missing = {state.pk for state, *_ in self.pending_local_governments} - self.local_government_keys.keys()
+        for state_id in missing:
+            self.local_government_keys[state_id] = set()
+        missing = list(missing)
+        for start in range(0, len(missing), 500):
+            rows = LocalGovernment.objects.filter(state_id__in=missing[start:start + 500]).values_list("state_id", "name_key")
+            for state_id, name_key in rows.iterator(chunk_size=self.batch_size):
+                self.local_government_keys[state_id].add(name_key)
+
+    def _taken_local_government_ids(self):
+        """The ids given to the pending LGAs that an existing row already has."""
+        given = [pk for _, _, pk in self.pending_local_governments if pk is not None]
+        taken = set()
+        for start in range(0, len(given), 500):
+            taken.update(LocalGovernment.objects.filter(pk__in=given[start:start + 500]).values_list("pk", flat=True))
+        return taken
+
+    def _insert(self, level, model):
+        """Insert the new rows of ``level``, adopting those a concurrent writer created first.
+
+        A row that lost to a conflict on its unique name takes the id of the
+        existing one, and its children in the batch are moved to it.
+        """
+        instances = self.new[level]
+        if not instances:
+            return
+        model.objects.bulk_create(instances, batch_size=self.batch_size, ignore_conflicts=True)
+        pks = [instance.pk for instance in instances]
+        inserted = set()
+        for start in range(0, len(pks), 500):
+            inserted.update(model.objects.filter(pk__in=pks[start:start + 500]).values_list("pk", flat=True))
+        lost = [instance for instance in instances if instance.pk not in inserted]
+        if not lost:
+            return
+
+        fields = UNIQUE_FIELDS[level]
+        rows = model.objects.filter(name_key__in={instance.name_key for instance in lost}).values_list(*fields, "pk")
+        winners = {tuple(row[:-1]): row[-1] for row in rows}
+        moved = {}
+        for instance in lost:
+            key = tuple(getattr(instance, field) for field in fields)
+            if key not in winners:
+                raise IntegrityError(f"{level} '{instance.name}' could not be inserted")
+            self.ids[level].discard(instance.pk)
+            moved[instance.pk] = instance.pk = winners[key]
+            self.ids[level].add(instance.pk)
+            self.stats[level].created -= 1
+            self.stats[level].unchanged += 1
+
+        self.touched[level] = {moved.get(pk, pk) for pk in self.touched[level]}
+        if level == "continent":
+            for country in [*self.new["country"], *(instance for instance, _ in self.changed["country"].values())]:
+                country.continent_id = moved.get(country.continent_id, country.continent_id)
+        elif level == "country":
+            for state in self.new["state"]:
+                if state.country_id in moved:
+                    del self.states[(state.country_id, state.name_key)]
+                    state.country_id = moved[state.country_id]
+                    self.states[(state.country_id, state.name_key)] = state
+        else:
+            # reloaded by the next batch that touches them
+            for pk in moved:
+                self.local_government_keys.pop(pk, None)
+
+    def flush(self):
+        if not self.pending:
+            return
+        self._load_local_government_keys()
+        taken = self._taken_local_government_ids()
+        new_local_governments = []
+        for state, name, pk in self.pending_local_governments:
+            key = normalize_name(name)
+            existing = self.local_government_keys[state.pk]
+            if key in existing:
+                self.stats["local_government"].unchanged += 1
+            elif pk in taken:
+                self.errors.append(f"Local government '{name}' of '{state.name}': id {pk} is already used")
+            else:
+                existing.add(key)
+                if pk is not None:
+                    taken.add(pk)
+                new_local_governments.append((pk, name, key, state))
+                self.stats["local_government"].created += 1
+
+        if not self.dry_run:
+            with transaction.atomic():
+                for level, model in (("continent", Continent), ("country", Country), ("state", State)):
+                    self._insert(level, model)
+                # One ID allocation for the whole batch instead of one per instance; built after the
+                # states were inserted, which may have given some of them the id of a concurrent row.
+                ids = iter(generate_ids(sum(pk is None for pk, *_ in new_local_governments)))
+                local_governments = [
+                    LocalGovernment(id=next(ids) if pk is None else pk, name=name, name_key=key, state=state)
+                    for pk, name, key, state in new_local_governments
+                ]
+                # An LGA a concurrent import created first is left as it is (and counted as created).
+                LocalGovernment.objects.bulk_create(local_governments, batch_size=self.batch_size,
+                                                    ignore_conflicts=True)
+                now = timezone.now()
+                for level, model in (("country", Country), ("state", State)):
+                    if not self.changed[level]:
+                        continue
+                    fields = {"date_updated"}
+                    instances = []
+                    for instance, changed in self.changed[level].values():
+                        instance.date_updated = now
+                        instances.append(instance)
+                        fields |= changed
+                    model.objects.bulk_update(instances, sorted(fields), batch_size=self.batch_size)
+                for model, level in ((Continent, "continent"), (Country, "country"), (State, "state")):
+                    if self.touched[level]:
+                        recount(model, self.touched[level])
+                DataVersion.bump()
+                response_cache.invalidate_all()
+
+        for level in LEVELS[:3]:
+            for instance in self.new[level]:
+                instance._state.adding = False
+        self._reset_batch()
+        if self.progress:
+            self.progress(self)
@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from locations.scraper import Fetcher, InvalidSources, ScrapeError, WriteStats, load_sources, scrape, write
+from utils.text import normalize_name
+
+
+class ScrapeCommand(BaseCommand):
+    """Runs the pipeline of ``locations/scraper.py`` over the sources of ``kind``."""
+
+    kind = None
+    parent = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', help='JSON file listing the pages to scrape (default: settings.SCRAPER["SOURCES"])')
+        parser.add_argument('--only', action='append', metavar='NAME',
+                            help=f'Only scrape the pages of this {self.parent} (can be repeated)')
+        parser.add_argument('--workers', type=int, help='Number of pages fetched at once')
+        parser.add_argument('--cache-dir', help='Directory of the HTTP cache (default: settings.SCRAPER["CACHE_DIR"])')
+        parser.add_argument('--no-cache', action='store_true', help='Download every page, without revalidating')
+
+    def handle(self, *args, **kwargs):
+        try:
+            sources = load_sources(kwargs['config'] or settings.SCRAPER["SOURCES"], self.kind)
+        except InvalidSources as error:
+            raise CommandError(error)
+        if kwargs['only']:
+            wanted = {normalize_name(name) for name in kwargs['only']}
+            sources = [source for source in sources if normalize_name(source.parent) in wanted]
+        if not sources:
+            raise CommandError(f"No {self.kind} pages to scrape")
+
+        options = dict(settings.SCRAPER, **({"CACHE_DIR": kwargs['cache_dir']} if kwargs['cache_dir'] else {}))
+        fetcher = Fetcher.from_settings(options, cache=not kwargs['no_cache'], workers=kwargs['workers'])
+        started = time.perf_counter()
+        failed = cached = 0
+        totals = WriteStats(0, 0, 0)
+        with fetcher:
+            for result in scrape(sources, fetcher):
+                error = result.error
+                if error is None:
+                    try:
+                        stats = write(result.source, result.records)
+                    except ScrapeError as write_error:
+                        error = str(write_error)
+                if error is not None:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"{result.source.url}: {error}"))
+                    continue
+                cached += result.cached
+                totals = WriteStats(*(total + count for total, count in zip(totals, stats)))
+                self.stdout.write(
+                    f"{result.source.url}{' (not modified)' if result.cached else ''}: {result.source.parent}: "
+                    f"{stats.inserted} inserted, {stats.updated} updated, {stats.unchanged} unchanged, "
+                    f"{result.skipped} rows skipped"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(sources)} pages scraped in {time.perf_counter() - started:.2f}s: "
+            f"{len(sources) - failed - cached} downloaded, {cached} not modified, {failed} failed; "
+            f"{self.kind}: {totals.inserted} inserted, {totals.updated} updated, {totals.unchanged} unchanged"
+        ))
+        if failed:
+            raise CommandError(f"{failed} of {len(sources)} pages failed")
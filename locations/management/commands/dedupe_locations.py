@@ -0,0 +1,75 @@
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from locations.cache import response_cache
+from locations.counters import COUNTERS, recount
+from locations.models import Continent, Country, State, LocalGovernment, DataVersion
+from utils.text import normalize_name
+
+# model -> the foreign key its names are unique under (None: unique overall)
+SCOPES = ((Continent, None), (Country, None), (State, "country_id"), (LocalGovernment, "state_id"))
+
+
+class Command(BaseCommand):
+    help = ("Merge the locations whose names only differ in case, accents or spacing (countries and continents "
+            "overall, states per country, local governments per state) and refresh their lookup keys, e.g. before "
+            "adding the unique name key constraints to existing data")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the duplicates without merging them')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of rows read or updated per query')
+
+    def duplicates(self, model, scope, batch_size):
+        """``{kept id: [ids of its duplicates]}``, the oldest (lowest) id of each name being kept."""
+        fields = ("pk", "name") if scope is None else (scope, "pk", "name")
+        rows = model.objects.order_by(*fields[:-1]).values_list(*fields).iterator(chunk_size=batch_size)
+        duplicates = {}
+        for _, group in groupby(rows, key=lambda row: row[0] if scope else None):
+            kept = {}
+            for *_, pk, name in group:
+                key = normalize_name(name)
+                if key in kept:
+                    duplicates.setdefault(kept[key], []).append(pk)
+                else:
+                    kept[key] = pk
+        return duplicates
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        changes = 0
+
+        with transaction.atomic():
+            # Parents first: merging two countries can make their states duplicates.
+            for model, scope in SCOPES:
+                duplicates = self.duplicates(model, scope, batch_size)
+                for kept, others in duplicates.items():
+                    for child, (foreign_key, parent, _) in COUNTERS.items():
+                        if parent is model:
+                            child.objects.filter(**{f"{foreign_key}__in": others}).update(**{foreign_key: kept})
+                removed = [pk for others in duplicates.values() for pk in others]
+                for start in range(0, len(removed), batch_size):
+                    model.objects.filter(pk__in=removed[start:start + batch_size]).delete()
+
+                changed = []
+                for location in model.objects.only('id', 'name', 'name_key').iterator(chunk_size=batch_size):
+                    name_key = normalize_name(location.name)
+                    if location.name_key != name_key:
+                        location.name_key = name_key
+                        changed.append(location)
+                model.objects.bulk_update(changed, ['name_key'], batch_size=batch_size)
+
+                changes += len(removed) + len(changed)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{model._meta.verbose_name_plural}: {len(removed)} duplicates merged, "
+                    f"{len(changed)} lookup keys updated"
+                ))
+
+            if kwargs['dry_run']:
+                transaction.set_rollback(True)
+            elif changes:
+                # The moves and bulk_update do not go through the signals.
+                for model in (Continent, Country, State):
+                    recount(model)
+                DataVersion.bump()
+                response_cache.invalidate_all()
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from locations.export import CHUNK_SIZE, ENCODERS, Exporter
+
+EXTENSIONS = {encoder.extension: format for format, encoder in ENCODERS.items()}
+
+
+class Command(BaseCommand):
+    help = "Export every continent, country, state and local government as NDJSON, CSV or binary, for import_locations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path of the file to write')
+        parser.add_argument('--format', choices=list(ENCODERS), help='File format (defaults to the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Number of rows fetched from the database at a time')
+
+    def handle(self, *args, **kwargs):
+        path = Path(kwargs['path'])
+        format = kwargs['format'] or EXTENSIONS.get(path.suffix.lstrip(".").lower())
+        if format is None:
+            raise CommandError(f"Cannot tell the format from '{path.name}', pass --format")
+
+        exporter = Exporter(format, chunk_size=kwargs['chunk_size'])
+        try:
+            with path.open('wb') as file:
+                for chunk in exporter.chunks():
+                    file.write(chunk)
+        except OSError as error:
+            raise CommandError(f"Error writing {path}: {error}")
+
+        elapsed = exporter.elapsed
+        rate = exporter.records / elapsed if elapsed else 0
+        throughput = exporter.bytes / 1e6 / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{exporter.records} records ({exporter.bytes / 1e6:.1f} MB) exported to {path} in {elapsed:.2f}s "
+            f"({rate:,.0f} records/s, {throughput:.1f} MB/s)"
+        ))
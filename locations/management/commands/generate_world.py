@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from locations.importer import LEVELS, Importer
+from locations.synthetic import WorldGenerator
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic world of the given size and bulk import it (or write it as NDJSON)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continents', type=int, default=7)
+        parser.add_argument('--countries', type=int, default=250, help='Total number of countries')
+        parser.add_argument('--states', type=int, default=5000, help='Total number of states')
+        parser.add_argument('--local-governments', type=int, default=1_000_000, help='Total number of local governments')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed always generates the same world')
+        parser.add_argument('--near-duplicates', type=float, default=0.05,
+                            help='Share of names that are a one-letter variation of a sibling name')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Number of records written per transaction')
+        parser.add_argument('--output', type=str, help='Write the records to this NDJSON file instead of importing them')
+
+    def report_progress(self, importer):
+        rate = importer.records / importer.elapsed if importer.elapsed else 0
+        self.stdout.write(f"{importer.records} records in {importer.elapsed:.1f}s ({rate:,.0f} records/s)")
+
+    def handle(self, *args, **kwargs):
+        if min(kwargs['continents'], kwargs['countries'], kwargs['states'], kwargs['local_governments']) < 0:
+            raise CommandError("Sizes must not be negative")
+        if not 0 <= kwargs['near_duplicates'] < 1:
+            raise CommandError("--near-duplicates must be between 0 and 1")
+
+        generator = WorldGenerator(
+            continents=kwargs['continents'], countries=kwargs['countries'], states=kwargs['states'],
+            local_governments=kwargs['local_governments'], seed=kwargs['seed'], near_duplicates=kwargs['near_duplicates'],
+        )
+
+        if kwargs['output']:
+            count = 0
+            with open(kwargs['output'], 'w', encoding='utf-8') as file:
+                for record in generator.records():
+                    file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+            self.stdout.write(self.style.SUCCESS(f"{count} records written to {kwargs['output']}"))
+            return
+
+        importer = Importer(batch_size=kwargs['batch_size'], progress=self.report_progress)
+        try:
+            importer.run(generator.records())
+        except IntegrityError as error:
+            raise CommandError(f"A batch conflicted with a concurrent write and was rolled back, please rerun: {error}")
+
+        for level in LEVELS:
+            stats = importer.stats[level]
+            self.stdout.write(
+                f"{level.replace('_', ' ')}: {stats.created} created, {stats.updated} updated, {stats.unchanged} unchanged"
+            )
+        for error in importer.errors:
+            self.stdout.write(self.style.WARNING(error))
+
+        rate = importer.records / importer.elapsed if importer.elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{importer.records} records imported in {importer.elapsed:.2f}s ({rate:,.0f} records/s)"
+        ))
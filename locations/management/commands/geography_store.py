@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from locations.geography import World
+from locations.models import DataVersion
+
+
+class Command(BaseCommand):
+    help = "Load the in-memory geography store once and report its size and load time"
+
+    def handle(self, *args, **kwargs):
+        world = World(DataVersion.current())
+        counts = ", ".join(f"{count} {level.replace('_', ' ')}" for level, count in world.counts().items())
+        self.stdout.write(f"Version {world.version.number}: {counts}, loaded in {world.load_seconds:.2f}s")
+        for part, size in world.footprint.items():
+            self.stdout.write(f"  {part:<18} {size / 2 ** 20:8.1f} MiB")
+        self.stdout.write(self.style.SUCCESS("Geography store loaded"))
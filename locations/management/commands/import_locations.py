@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from locations.importer import LEVELS, Importer, read_records
+
+
+class Command(BaseCommand):
+    help = "Bulk import continents, countries, states and local governments from a JSON, CSV, NDJSON or binary file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path to the file to import')
+        parser.add_argument('--format', choices=['json', 'csv', 'ndjson', 'binary'], help='File format (defaults to the file extension)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of records written per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Resolve and count everything without writing')
+        parser.add_argument('--max-errors', type=int, default=20, help='Number of rejected records to list')
+
+    def report_progress(self, importer):
+        rate = importer.records / importer.elapsed if importer.elapsed else 0
+        self.stdout.write(f"{importer.records} records in {importer.elapsed:.1f}s ({rate:,.0f} records/s)")
+
+    def handle(self, *args, **kwargs):
+        importer = Importer(batch_size=kwargs['batch_size'], dry_run=kwargs['dry_run'], progress=self.report_progress)
+
+        try:
+            importer.run(read_records(kwargs['path'], kwargs['format']))
+        except FileNotFoundError:
+            raise CommandError(f"File {kwargs['path']} not found")
+        except (ValueError, KeyError) as error:
+            raise CommandError(f"Error reading {kwargs['path']}: {error}")
+        except IntegrityError as error:
+            # Rows created concurrently are adopted by the importer; this is a location deleted meanwhile.
+            raise CommandError(f"A batch conflicted with a concurrent delete and was rolled back: {error}")
+
+        for level in LEVELS:
+            stats = importer.stats[level]
+            self.stdout.write(
+                f"{level.replace('_', ' ')}: {stats.created} created, {stats.updated} updated, {stats.unchanged} unchanged"
+            )
+        for error in importer.errors[:kwargs['max_errors']]:
+            self.stdout.write(self.style.WARNING(error))
+        if len(importer.errors) > kwargs['max_errors']:
+            self.stdout.write(self.style.WARNING(f"... and {len(importer.errors) - kwargs['max_errors']} more rejected records"))
+
+        rate = importer.records / importer.elapsed if importer.elapsed else 0
+        throughput = os.path.getsize(kwargs['path']) / 1e6 / importer.elapsed if importer.elapsed else 0
+        prefix = "Dry run: " if kwargs['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{importer.records} records processed in {importer.elapsed:.2f}s "
+            f"({rate:,.0f} records/s, {throughput:.1f} MB/s), "
+            f"{len(importer.errors)} rejected"
+        ))
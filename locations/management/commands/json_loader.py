@@ -1,6 +1,8 @@
 import json
 from django.core.management.base import BaseCommand
-from locations.models import State, LocalGovernment, Country
+from locations.importer import Importer
+from locations.models import State, Country
+from utils.text import normalize_name
 
 class Command(BaseCommand):
     help = "Populate LGAs for states in Nigeria from a JSON file"
@@ -34,19 +36,24 @@ class Command(BaseCommand):
         else:
             states_to_populate = data
 
+        existing_states = set(State.objects.filter(country=nigeria).values_list('name_key', flat=True))
+        importer = Importer()
+
         for state_name, lgas in states_to_populate.items():
             if not lgas:
                 self.stdout.write(self.style.ERROR(f"No LGAs found for state: {state_name} in the JSON file"))
                 continue
 
-            try:
-                state = State.objects.get(name=state_name)
-            except State.DoesNotExist:
+            if normalize_name(state_name) not in existing_states:
                 self.stdout.write(self.style.ERROR(f"State {state_name} does not exist in the database."))
                 continue
 
             for lga_name in lgas:
-                LocalGovernment.objects.get_or_create(name=lga_name, state=state)
-                self.stdout.write(self.style.SUCCESS(f"Added/Updated LGA: {lga_name} in state: {state_name}"))
+                importer.feed({"country": nigeria.name, "state": state_name, "local_government": lga_name})
 
+        importer.close()
+        stats = importer.stats["local_government"]
+        for error in importer.errors:
+            self.stdout.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(f"Added {stats.created} LGAs, {stats.unchanged} were already present"))
         self.stdout.write(self.style.SUCCESS("Finished populating LGAs"))
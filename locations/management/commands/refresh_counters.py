@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from locations.counters import recount
+from locations.cache import response_cache
+from locations.models import Continent, Country, State, DataVersion
+
+
+class Command(BaseCommand):
+    help = "Recompute the countries, states and local governments counters from the child tables"
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            for model in (Continent, Country, State):
+                updated = recount(model)
+                self.stdout.write(self.style.SUCCESS(f"{model._meta.verbose_name_plural}: {updated} counters refreshed"))
+            DataVersion.bump()
+            response_cache.invalidate_all()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from locations.cache import response_cache
+from locations.models import Continent, Country, State, LocalGovernment, DataVersion
+from utils.text import normalize_name
+
+
+class Command(BaseCommand):
+    help = "Recompute the normalized lookup key of every location, e.g. after adding the column to existing data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of rows updated per query')
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        updated = 0
+
+        for model in (Continent, Country, State, LocalGovernment):
+            changed = []
+            total = 0
+            for location in model.objects.only('id', 'name', 'name_key').iterator(chunk_size=batch_size):
+                name_key = normalize_name(location.name)
+                if location.name_key != name_key:
+                    location.name_key = name_key
+                    changed.append(location)
+
+            with transaction.atomic():
+                for start in range(0, len(changed), batch_size):
+                    batch = changed[start:start + batch_size]
+                    model.objects.bulk_update(batch, ['name_key'])
+                    total += len(batch)
+
+            updated += total
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.verbose_name_plural}: {total} lookup keys updated"))
+
+        # bulk_update does not send post_save, so let the cached documents know.
+        if updated:
+            DataVersion.bump()
+            response_cache.invalidate_all()
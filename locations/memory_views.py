@@ -0,0 +1,238 @@
+"""The read endpoints answered from the in-memory ``World`` of ``geography.py``.
+
+``urls.py`` routes to these views, in place of those of ``views.py`` or
+``async_views.py``, when ``settings.GEOGRAPHY_STORE`` is set. They follow the
+DRF views step by step, with the same checks in the same order, and shape the
+records of the world with ``lean.py``, so the JSON responses are byte for byte
+the same (see the tests) on SQLite, whose collation the world sorts names by.
+Only the JSON representation is served, as by the async views. The version of
+the world is the data version the conditional GET validators are computed
+from, so a request between two version checks makes no query at all, and the
+response cache does not keep the responses of a world older than the database.
+Search, autocomplete, resolve and export keep their views.
+"""
+
+from django.views import View
+from .async_views import bad_request, json_response
+from .conditional import ConditionalGetMixin
+from .fields import InvalidFields
+from .geography import geography
+from .lean import assemble
+from .pagination import InvalidPage, KeysetPaginator
+from .serializers import (ContinentSerializer, ContinentOnlySerializer, CountryOnlySerializer,
+                          CountrySerializer, StateSerializer, LocalGovernmentSerializer)
+from .snapshot import planet_earth_snapshot
+from .suggestions import not_found_message, suggestion_index
+from .views import requested_fields
+
+VIEWS = [
+    "PlanetEarthListView", "ContinentListView", "CountryListByContinentView", "CountryListAndSearchView",
+    "StateListByCountryView", "StateDetailByCountryView", "LocalGovernmentListByStateView",
+]
+
+
+class WorldView(ConditionalGetMixin, View):
+    world = None
+    lagging = True
+
+    def current_version(self):
+        self.world = geography.world()
+        return self.world.version
+
+    def serialize(self, rows, serializer_class, fields):
+        return assemble(self.world.levels(rows, serializer_class, fields))
+
+    def not_found_response(self, subject, level, word, parent=None, include_suggestions=True, **options):
+        suggestions = suggestion_index.suggest(
+            level, word, parent=parent, version=self.data_version, names=self.world.names_under, **options
+        )
+        response_data = {"error": not_found_message(subject, suggestions)}
+        if include_suggestions:
+            response_data["suggestions"] = suggestions
+        return json_response(response_data, status=404)
+
+
+class PlanetEarthListView(WorldView):
+
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = requested_fields(request, ContinentSerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        if fields is None:
+            return planet_earth_snapshot.get(self.data_version).response(request)
+        continents = self.serialize(self.world.continents, ContinentSerializer, fields)
+        return json_response({"count": len(continents), "continents": continents})
+
+
+class ContinentListView(WorldView):
+
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = requested_fields(request, ContinentOnlySerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        continents = self.serialize(self.world.continents, ContinentOnlySerializer, fields)
+        return json_response({"count": len(continents), "continents": continents})
+
+
+class CountryListByContinentView(WorldView):
+
+    def get(self, request, continent_name, *args, **kwargs):
+        try:
+            fields = requested_fields(request, CountrySerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        continent_name = continent_name.strip()
+        continent = self.world.continent(continent_name)
+
+        if not continent:
+            return self.not_found_response(
+                f"Continent '{continent_name}'", "continent", continent_name,
+                include_suggestions=False, n=1, cutoff=0.8,
+            )
+
+        return json_response({
+            "continent": continent.name,
+            "count": continent.countries_count,
+            "countries": self.serialize(continent.children_by_name, CountrySerializer, fields),
+        })
+
+
+class CountryListAndSearchView(WorldView):
+
+    def get(self, request, *args, **kwargs):
+        country_name = request.GET.get('country', '').strip()
+        try:
+            fields = requested_fields(request, CountrySerializer if country_name else CountryOnlySerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        if country_name:
+            country = self.world.country(country_name)
+            if not country:
+                return self.not_found_response(
+                    f"Country '{country_name}'", "country", country_name, include_suggestions=False, n=1, cutoff=0.8,
+                )
+            return json_response({"count": 1, "country": self.serialize([country], CountrySerializer, fields)[0]})
+
+        try:
+            paginator = KeysetPaginator.from_request(request)
+        except InvalidPage as error:
+            return bad_request(error)
+
+        countries = self.world.countries_by_name
+        if paginator:
+            countries = paginator.paginate_sorted(countries)
+        response_data = {
+            "count": len(countries),
+            "countries": self.serialize(countries, CountryOnlySerializer, fields),
+        }
+        if paginator:
+            response_data["count"] = sum(continent.countries_count for continent in self.world.continents)
+            response_data["next_cursor"] = paginator.next_cursor
+        return json_response(response_data)
+
+
+class StateListByCountryView(WorldView):
+
+    def get(self, request, country_name, *args, **kwargs):
+        try:
+            paginator = KeysetPaginator.from_request(request)
+            fields = requested_fields(request, StateSerializer)
+        except (InvalidPage, InvalidFields) as error:
+            return bad_request(error)
+
+        country_name = country_name.strip()
+        country = self.world.country(country_name)
+
+        if not country:
+            return self.not_found_response(
+                f"Country '{country_name}'", "country", country_name, include_suggestions=False,
+            )
+
+        states = country.children_by_name
+        if paginator:
+            states = paginator.paginate_sorted(states)
+        response_data = {
+            "count": country.states_count,
+            "country": country.name,
+            "states": self.serialize(states, StateSerializer, fields),
+        }
+        if paginator:
+            response_data["next_cursor"] = paginator.next_cursor
+        return json_response(response_data)
+
+
+class StateDetailByCountryView(WorldView):
+
+    def get(self, request, country_name, *args, **kwargs):
+        country_name = country_name.strip()
+        state_name = request.GET.get('state', '').strip()
+
+        if not state_name:
+            return json_response({"error": "State parameter is missing"}, status=400)
+
+        try:
+            fields = requested_fields(request, StateSerializer)
+        except InvalidFields as error:
+            return bad_request(error)
+
+        country = self.world.country(country_name)
+
+        if not country:
+            return self.not_found_response(f"Country '{country_name}'", "country", country_name)
+
+        state = self.world.state(country, state_name)
+
+        if not state:
+            return self.not_found_response(
+                f"State '{state_name}' in '{country_name}'", "state", state_name, parent=country.id,
+            )
+
+        return json_response({
+            "count": 1,
+            "country": country.name,
+            "state": self.serialize([state], StateSerializer, fields)[0],
+        })
+
+
+class LocalGovernmentListByStateView(WorldView):
+
+    def get(self, request, country_name, state_name, *args, **kwargs):
+        try:
+            paginator = KeysetPaginator.from_request(request)
+            fields = requested_fields(request, LocalGovernmentSerializer)
+        except (InvalidPage, InvalidFields) as error:
+            return bad_request(error)
+
+        country_name = country_name.strip()
+        state_name = state_name.strip()
+
+        country = self.world.country(country_name)
+
+        if not country:
+            return self.not_found_response(f"Country '{country_name}'", "country", country_name)
+
+        state = self.world.state(country, state_name)
+        if not state:
+            return self.not_found_response(
+                f"State '{state_name}' in '{country_name}'", "state", state_name, parent=country.id,
+            )
+
+        local_governments = self.world.local_governments(state, ordered_by_name=True)
+        if paginator:
+            local_governments = paginator.paginate_sorted(local_governments)
+
+        response_data = {
+            "count": state.local_governments_count,
+            "country": country.name,
+            "state": state.name,
+            "local_governments": self.serialize(local_governments, LocalGovernmentSerializer, fields),
+        }
+        if paginator:
+            response_data["next_cursor"] = paginator.next_cursor
+        return json_response(response_data)
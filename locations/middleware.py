@@ -0,0 +1,40 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .cache import response_cache
+
+
+class ResponseCacheMiddleware:
+    """Serve the GET endpoints from ``response_cache`` and fill it on misses.
+
+    Works in both sync and async chains, so cached responses under ASGI never
+    leave the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        plan = response_cache.plan(request)
+        if plan is None:
+            return self.get_response(request)
+        response = response_cache.get(plan)
+        if response is None:
+            response = self.get_response(request)
+            response_cache.set(plan, response)
+        return response
+
+    async def __acall__(self, request):
+        plan = response_cache.plan(request)
+        if plan is None:
+            return await self.get_response(request)
+        response = await response_cache.aget(plan)
+        if response is None:
+            response = await self.get_response(request)
+            await response_cache.aset(plan, response)
+        return response
@@ -1,24 +1,53 @@
-from django.db import models
+from collections import namedtuple
+from django.db import models, transaction
+from django.utils import timezone
 from utils.models import BaseModel
+from utils.text import normalize_name
 
 # Create your models here.
 
-class Continent(BaseModel):
+class NamedLocation(BaseModel):
+    """Base model for locations that are looked up by name.
+
+    ``name_key`` holds the normalized form of ``name`` and is what the views
+    filter on, so lookups are case and accent insensitive and can use an index.
+    Saves run in a transaction so the signal handlers that maintain the parent
+    counters and the data version commit or roll back together with the row.
+    """
+
+    name_key = models.CharField(max_length=255, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_name(self.name)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "name" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "name_key"}
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class Continent(NamedLocation):
     name = models.CharField(max_length=100, unique=True, verbose_name="Continent Name")
+    countries_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
     class Meta:
         abstract = False
+        constraints = [models.UniqueConstraint(fields=["name_key"], name="unique_continent_name_key")]
 
 
-class Country(BaseModel):
+class Country(NamedLocation):
     name = models.CharField(max_length=100, verbose_name="Country Name or Nation")
     capital = models.CharField(max_length=100)
     language = models.CharField(max_length=100)
     currency = models.CharField(max_length=100, null=True)
     continent = models.ForeignKey(Continent, related_name='countries', on_delete=models.CASCADE)
+    states_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.name} - {self.capital} - {self.language} - {self.continent.name}"
@@ -26,21 +55,33 @@ class Country(BaseModel):
     class Meta:
         abstract = False
         verbose_name_plural = "Countries"
+        indexes = [
+            models.Index(fields=["continent", "name_key"]),
+            models.Index(fields=["name", "id"]),
+        ]
+        constraints = [models.UniqueConstraint(fields=["name_key"], name="unique_country_name_key")]
 
 
-class State(BaseModel):
+class State(NamedLocation):
     name = models.CharField(max_length=100, unique=False, verbose_name="State Name or Region")
     capital = models .CharField(max_length=100, unique=False, null=True)
     country = models.ForeignKey(Country, related_name='states', on_delete=models.CASCADE)
+    local_governments_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.name} - {self.capital} - {self.country.name} - {self.country.continent.name}"
 
     class Meta:
         abstract = False
+        indexes = [
+            models.Index(fields=["country", "name", "id"]),
+            # rows changed since a point in time, read by the search index (locations/search.py)
+            models.Index(fields=["date_updated"]),
+        ]
+        constraints = [models.UniqueConstraint(fields=["country", "name_key"], name="unique_state_name_key_per_country")]
 
 
-class LocalGovernment(BaseModel):
+class LocalGovernment(NamedLocation):
     name = models.CharField(max_length=100, verbose_name="Name of Local Government")
     state = models.ForeignKey(State, related_name='local_governments', on_delete=models.CASCADE)
 
@@ -49,3 +90,46 @@ class LocalGovernment(BaseModel):
 
     class Meta:
         abstract = False
+        indexes = [
+            models.Index(fields=["state", "name", "id"]),
+            models.Index(fields=["date_updated"]),
+        ]
+        constraints = [models.UniqueConstraint(fields=["state", "name_key"], name="unique_lga_name_key_per_state")]
+
+
+Version = namedtuple("Version", ["number", "date_updated"])
+
+
+class DataVersion(models.Model):
+    """Single-row counter bumped whenever any location table is written to.
+
+    Caches and precomputed documents compare the version they were built from
+    against this row to decide whether they are stale, which also works across
+    worker processes and for writes made by the management commands.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+    date_updated = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        abstract = False
+
+    def __str__(self):
+        return f"Data version {self.version}"
+
+    @classmethod
+    def current(cls):
+        """Return the current ``(version, date_updated)`` pair; ``(0, None)`` before any write."""
+        row = cls.objects.filter(pk=1).values_list("version", "date_updated").first()
+        return Version(*row) if row else Version(0, None)
+
+    @classmethod
+    async def acurrent(cls):
+        row = await cls.objects.filter(pk=1).values_list("version", "date_updated").afirst()
+        return Version(*row) if row else Version(0, None)
+
+    @classmethod
+    def bump(cls):
+        now = timezone.now()
+        if not cls.objects.filter(pk=1).update(version=models.F("version") + 1, date_updated=now):
+            cls.objects.get_or_create(pk=1, defaults={"version": 1, "date_updated": now})
@@ -0,0 +1,93 @@
+"""Opt-in keyset pagination for the country, state and LGA lists.
+
+Lists are ordered by name, so a page boundary is the ``(name, id)`` pair of the
+last row served; the snowflake ``id`` breaks ties between equal names. The next
+page is fetched with ``WHERE (name, id) > boundary ORDER BY name, id LIMIT n``,
+which the ``(parent, name, id)`` indexes answer with a seek instead of
+skipping over an OFFSET. Cursors are the boundary encoded as URL-safe base64.
+"""
+
+import base64
+import json
+from bisect import bisect_right
+
+from django.db.models import Q
+
+
+class InvalidPage(ValueError):
+    pass
+
+
+def encode_cursor(name, pk):
+    raw = json.dumps([name, pk], separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, pk = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidPage("The cursor is invalid")
+    if not isinstance(name, str) or not isinstance(pk, int):
+        raise InvalidPage("The cursor is invalid")
+    return name, pk
+
+
+class KeysetPaginator:
+    default_limit = 100
+    max_limit = 1000
+
+    def __init__(self, limit, after=None):
+        self.limit = limit
+        self.after = after
+        self.next_cursor = None
+
+    @classmethod
+    def from_request(cls, request):
+        """Return a paginator when ``limit`` or ``cursor`` is given, ``None`` otherwise.
+
+        Raises ``InvalidPage`` for a malformed limit or cursor.
+        """
+        limit = request.GET.get("limit", "").strip()
+        cursor = request.GET.get("cursor", "").strip()
+        if not limit and not cursor:
+            return None
+
+        if limit:
+            if not limit.isdecimal() or not 1 <= int(limit) <= cls.max_limit:
+                raise InvalidPage(f"The limit must be a whole number between 1 and {cls.max_limit}")
+            limit = int(limit)
+        else:
+            limit = cls.default_limit
+        return cls(limit, decode_cursor(cursor) if cursor else None)
+
+    def page_queryset(self, queryset):
+        if self.after is not None:
+            name, pk = self.after
+            queryset = queryset.filter(Q(name__gt=name) | Q(name=name, pk__gt=pk))
+        return queryset.order_by("name", "pk")[:self.limit + 1]
+
+    def paginate(self, queryset):
+        """Return the rows of the current page and remember the cursor of the next one.
+
+        ``queryset`` is a ``values()`` queryset that includes ``name`` and ``id``.
+        """
+        return self._page(list(self.page_queryset(queryset)))
+
+    async def apaginate(self, queryset):
+        """``paginate`` with the async ORM."""
+        return self._page([row async for row in self.page_queryset(queryset)])
+
+    def paginate_sorted(self, rows):
+        """``paginate`` over a sequence of rows already sorted by ``(name, id)``, found with a bisection."""
+        start = 0
+        if self.after is not None:
+            start = bisect_right(rows, tuple(self.after), key=lambda row: (row["name"], row["id"]))
+        return self._page(list(rows[start:start + self.limit + 1]))
+
+    def _page(self, rows):
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            self.next_cursor = encode_cursor(rows[-1]["name"], rows[-1]["id"])
+        return rows
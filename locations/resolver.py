@@ -0,0 +1,197 @@
+"""Batch resolution of country, state and LGA names, for address validation.
+
+An item names a country and optionally a state of it and an LGA of that state.
+``Resolver`` answers a batch of items with three set-based queries - the
+countries of every distinct country key, then the states of those countries
+with a requested key, then the LGAs likewise - and matches the rows back to
+the items in memory, instead of a lookup per level per item. Names are matched
+on ``name_key`` like the single lookups, so case and accents are ignored.
+
+Every item comes back with the canonical names and ids of the levels it
+names, or, from the first level that does not exist, with an error and
+spelling suggestions worded like the 404s of the other endpoints. Items are
+resolved ``BATCH_SIZE`` at a time, which keeps the parameters of every query
+under SQLite's limit; ``resolve_lines`` reads NDJSON input of any length the
+same way, yielding the NDJSON results of a batch before reading the next one.
+"""
+
+import json
+import operator
+from collections import defaultdict
+from functools import reduce
+
+from django.db.models import Q
+
+from utils.text import normalize_name
+from .models import Country, State, LocalGovernment, DataVersion
+from .streaming import dumps
+from .suggestions import not_found_message, suggestion_index
+
+LEVELS = ("country", "state", "local_government")
+
+# Items per round of queries: at most this many parent ids and as many keys per query.
+BATCH_SIZE = 400
+# Parents per term of the state and LGA queries; see ``Resolver._children``.
+PARENT_GROUP = 16
+# Items accepted in one JSON body; larger batches are sent as NDJSON.
+MAX_ITEMS = 10000
+
+
+class InvalidItem(ValueError):
+    pass
+
+
+def parse_item(item):
+    """The ``(country, state, local_government)`` names of an item, the last two possibly ``None``.
+
+    An item is an object with those keys or a list of up to three names.
+    """
+    if isinstance(item, list):
+        if not 1 <= len(item) <= len(LEVELS):
+            raise InvalidItem("A list item holds a country, state and local government name")
+        item = dict(zip(LEVELS, item))
+    elif not isinstance(item, dict):
+        raise InvalidItem("An item is an object with country, state and local_government names")
+    names = []
+    for level in LEVELS:
+        name = item.get(level)
+        if name is not None and not isinstance(name, str):
+            raise InvalidItem(f"{level} must be a string")
+        names.append((name.strip() or None) if name else None)
+    country, state, local_government = names
+    if not country:
+        raise InvalidItem("country is missing")
+    if local_government and not state:
+        raise InvalidItem("local_government can only be given with its state")
+    return country, state, local_government
+
+
+class Resolver:
+    """Resolve items against the data at ``version`` (the current one by default)."""
+
+    def __init__(self, version=None):
+        self.version = DataVersion.current() if version is None else version
+
+    def resolve(self, items):
+        """One result dict per item, in order; see the module docstring."""
+        results = []
+        for start in range(0, len(items), BATCH_SIZE):
+            results += self._resolve_batch(items[start:start + BATCH_SIZE])
+        return results
+
+    def _resolve_batch(self, items):
+        parsed = []
+        for item in items:
+            if isinstance(item, InvalidItem):
+                parsed.append(item)
+                continue
+            try:
+                names = parse_item(item)
+            except InvalidItem as error:
+                parsed.append(error)
+                continue
+            parsed.append((names, tuple(name and normalize_name(name) for name in names)))
+
+        valid = [item[1] for item in parsed if not isinstance(item, InvalidItem)]
+        countries = {
+            key: (pk, name) for key, pk, name in
+            Country.objects.filter(name_key__in={keys[0] for keys in valid}).values_list("name_key", "id", "name")
+        } if valid else {}
+        states = self._children(State, "country_id", {
+            (countries[keys[0]][0], keys[1]) for keys in valid if keys[1] and keys[0] in countries
+        })
+        local_governments = self._children(LocalGovernment, "state_id", {
+            (states[countries[keys[0]][0], keys[1]][0], keys[2]) for keys in valid
+            if keys[2] and keys[0] in countries and (countries[keys[0]][0], keys[1]) in states
+        })
+
+        suggestions = {}
+        results = []
+        for item in parsed:
+            if isinstance(item, InvalidItem):
+                results.append({"error": str(item)})
+                continue
+            (country, state, local_government), keys = item
+            result = {}
+            found = countries.get(keys[0])
+            if found is None:
+                results.append(self._miss(result, suggestions, "country", f"Country '{country}'", country))
+                continue
+            result["country"] = {"id": found[0], "name": found[1]}
+            if state is not None:
+                parent = found[0]
+                found = states.get((parent, keys[1]))
+                if found is None:
+                    results.append(self._miss(result, suggestions, "state", f"State '{state}' in '{country}'",
+                                              state, parent))
+                    continue
+                result["state"] = {"id": found[0], "name": found[1]}
+            if local_government is not None:
+                parent = found[0]
+                found = local_governments.get((parent, keys[2]))
+                if found is None:
+                    results.append(self._miss(result, suggestions, "local_government",
+                                              f"Local government '{local_government}' in '{state}'",
+                                              local_government, parent))
+                    continue
+                result["local_government"] = {"id": found[0], "name": found[1]}
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _children(model, parent_field, wanted):
+        """``(parent id, key) -> (id, name)`` of the ``wanted`` rows of ``model``, read with one query."""
+        if not wanted:
+            return {}
+        keys = defaultdict(set)
+        for parent, key in wanted:
+            keys[parent].add(key)
+        # "parent IN (...) AND name_key IN (...)" probes the (parent, name_key) unique
+        # index once per pair of the two lists, so the parents are split into small
+        # groups, each with the keys of its own parents only.
+        parents = sorted(keys)
+        groups = [parents[start:start + PARENT_GROUP] for start in range(0, len(parents), PARENT_GROUP)]
+        condition = reduce(operator.or_, (Q(**{
+            f"{parent_field}__in": group,
+            "name_key__in": set().union(*(keys[parent] for parent in group)),
+        }) for group in groups))
+        rows = model.objects.filter(condition).values_list(parent_field, "name_key", "id", "name")
+        return {(parent, key): (pk, name) for parent, key, pk, name in rows if (parent, key) in wanted}
+
+    def _miss(self, result, suggestions, level, subject, name, parent=None):
+        # A batch often repeats the same misspelling.
+        key = (level, parent, name)
+        if key not in suggestions:
+            suggestions[key] = suggestion_index.suggest(level, name, parent=parent, version=self.version)
+        result["not_found"] = level
+        result["error"] = not_found_message(subject, suggestions[key])
+        result["suggestions"] = suggestions[key]
+        return result
+
+
+def summary(results):
+    return {"count": len(results), "found": sum("error" not in result for result in results), "results": results}
+
+
+def resolve_lines(lines, resolver):
+    """Yield the NDJSON results of NDJSON ``lines`` as ``bytes``, one chunk per batch.
+
+    Blank lines are skipped; a line that is not JSON gets an error result.
+    """
+    batch = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(json.loads(line))
+        except ValueError:
+            batch.append(InvalidItem(f"Line {number} is not valid JSON"))
+        if len(batch) == BATCH_SIZE:
+            yield encode_lines(resolver.resolve(batch))
+            batch = []
+    if batch:
+        yield encode_lines(resolver.resolve(batch))
+
+
+def encode_lines(results):
+    return "".join(dumps(result) + "\n" for result in results).encode()
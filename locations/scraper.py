@@ -0,0 +1,311 @@
+"""Fetch, parse and write stages of the scrape_countries and scrape_states commands.
+
+The pages to scrape are listed in a JSON file (``settings.SCRAPER["SOURCES"]``,
+see ``scrape_sources.example.json``): pages of countries, each for a continent,
+and pages of states, each for a country, with the table and columns to read.
+
+``scrape`` fetches the sources with a bounded pool of worker threads and parses
+each page in the worker that fetched it, yielding the results as they complete
+so the caller writes them while the other pages download. Each worker keeps its
+own ``requests.Session``, so connections to a host are reused across pages,
+and its adapter retries connection errors, 429 and 5xx responses with
+exponential backoff, honouring Retry-After. A page listed by several sources is
+fetched once.
+
+``HTTPCache`` keeps every page that came with an ETag or Last-Modified on disk,
+one file per URL. The next fetch of the page sends them back as If-None-Match
+and If-Modified-Since, and a 304 reuses the stored body, so unchanged pages are
+not downloaded again.
+
+``write`` is the last stage. It diffs the records of a page against the rows
+under the page's continent or country, read with one query, and applies only
+the differences with ``bulk_create`` and ``bulk_update`` in one transaction.
+Rows are matched on ``name_key`` within their parent, like the lookups.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import requests
+from bs4 import BeautifulSoup
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.snowflake import generate_ids
+from utils.text import normalize_name
+from .cache import invalidate_rows
+from .counters import recount
+from .models import Continent, Country, State, DataVersion
+
+# kind -> (field naming the parent of the page, default columns, fields a row must have)
+KINDS = {
+    "countries": ("continent", {"country": 2, "capital": 3, "language": 4}, ("country", "capital", "language")),
+    "states": ("country", {"state": 0, "state_capital": 9}, ("state",)),
+}
+
+# kind -> (model, parent model, record key -> model field)
+TARGETS = {
+    "countries": (Country, Continent, {"country": "name", "capital": "capital", "language": "language"}),
+    "states": (State, Country, {"state": "name", "state_capital": "capital"}),
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+# footnote markers such as "[1]" or "*" in the cells
+FOOTNOTES = re.compile(r"\[[^\]]*\]|\*")
+
+Source = namedtuple("Source", ["kind", "url", "parent", "table", "columns"])
+Page = namedtuple("Page", ["url", "content", "cached"])
+Result = namedtuple("Result", ["source", "records", "skipped", "cached", "error"])
+WriteStats = namedtuple("WriteStats", ["inserted", "updated", "unchanged"])
+
+
+class InvalidSources(ValueError):
+    pass
+
+
+class ScrapeError(Exception):
+    pass
+
+
+def load_sources(path, kind):
+    """The ``Source`` list of ``kind`` ("countries" or "states") in the sources file at ``path``."""
+    path = Path(path)
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise InvalidSources(f"{path} not found; list the pages to scrape there, "
+                             f"see scrape_sources.example.json") from None
+    except ValueError as error:
+        raise InvalidSources(f"{path} is not valid JSON: {error}") from None
+    parent_field, default_columns, _ = KINDS[kind]
+    sources = []
+    for number, entry in enumerate(data.get(kind, []), 1):
+        if not isinstance(entry, dict) or not entry.get("url") or not entry.get(parent_field):
+            raise InvalidSources(f"{kind} source {number} needs a url and a {parent_field}")
+        columns = {**default_columns, **entry.get("columns", {})}
+        unknown = set(columns) - set(default_columns)
+        if unknown:
+            raise InvalidSources(f"{kind} source {number}: unknown column '{unknown.pop()}'")
+        sources.append(Source(kind, entry["url"], entry[parent_field], entry.get("table", {}), columns))
+    return sources
+
+
+def parse(content, source):
+    """The ``(records, skipped rows)`` of a page, as records of ``importer.FIELDS``."""
+    table = BeautifulSoup(content, "html.parser").find("table", attrs=source.table)
+    if table is None:
+        raise ScrapeError("no matching table in the page")
+    parent_field, _, required = KINDS[source.kind]
+    width = max(source.columns.values()) + 1
+    records, skipped = [], 0
+    for row in table.find_all("tr")[1:]:
+        cells = row.find_all("td")
+        if len(cells) < width:
+            skipped += 1
+            continue
+        record = {parent_field: source.parent}
+        for field, column in source.columns.items():
+            value = FOOTNOTES.sub("", cells[column].get_text()).strip()
+            if value:
+                record[field] = value
+        if all(field in record for field in required):
+            records.append(record)
+        else:
+            skipped += 1
+    return records, skipped
+
+
+class HTTPCache:
+    """Pages and their validators on disk: a line of JSON metadata, then the body, per URL."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def _path(self, url):
+        return self.directory / hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url):
+        """The ``(validators, body)`` stored for ``url``, or ``None``."""
+        try:
+            with self._path(url).open("rb") as file:
+                meta = json.loads(file.readline())
+                body = file.read()
+        except (OSError, ValueError):
+            return None
+        return (meta["validators"], body) if meta.get("url") == url else None
+
+    def store(self, url, response):
+        validators = {name: response.headers[name] for name in VALIDATORS if name in response.headers}
+        if not validators:
+            # nothing to revalidate with
+            return
+        path = self._path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with temporary.open("wb") as file:
+            file.write(json.dumps({"url": url, "validators": validators}).encode() + b"\n")
+            file.write(response.content)
+        os.replace(temporary, path)
+
+
+class Fetcher:
+    """GETs pages with per-thread pooled sessions, retries and the optional ``HTTPCache``."""
+
+    def __init__(self, cache=None, workers=8, timeout=30, retries=3, backoff=0.5):
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, options, cache=True, **overrides):
+        """A fetcher configured by ``settings.SCRAPER``-like ``options``, and ``overrides``."""
+        arguments = {
+            "cache": HTTPCache(options["CACHE_DIR"]) if cache else None,
+            "workers": options["WORKERS"],
+            "timeout": options["TIMEOUT"],
+            "retries": options["RETRIES"],
+            "backoff": options["BACKOFF"],
+        }
+        arguments.update((name, value) for name, value in overrides.items() if value is not None)
+        return cls(**arguments)
+
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            retry = Retry(total=self.retries, backoff_factor=self.backoff, status_forcelist=RETRY_STATUSES,
+                          allowed_methods=["GET"], raise_on_status=False)
+            adapter = HTTPAdapter(max_retries=retry)
+            session = self._local.session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def fetch(self, url):
+        cached = self.cache.get(url) if self.cache else None
+        headers = {VALIDATORS[name]: value for name, value in cached[0].items()} if cached else {}
+        try:
+            response = self.session().get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as error:
+            raise ScrapeError(f"request failed: {error}") from error
+        if response.status_code == 304 and cached:
+            return Page(url, cached[1], True)
+        if response.status_code != 200:
+            raise ScrapeError(f"status code {response.status_code}")
+        if self.cache:
+            self.cache.store(url, response)
+        return Page(url, response.content, False)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def scrape_url(url, sources, fetcher):
+    try:
+        page = fetcher.fetch(url)
+    except ScrapeError as error:
+        return [Result(source, [], 0, False, str(error)) for source in sources]
+    results = []
+    for source in sources:
+        try:
+            records, skipped = parse(page.content, source)
+        except ScrapeError as error:
+            results.append(Result(source, [], 0, page.cached, str(error)))
+            continue
+        results.append(Result(source, records, skipped, page.cached, None))
+    return results
+
+
+def scrape(sources, fetcher):
+    """Fetch and parse ``sources`` on ``fetcher.workers`` threads; yield a ``Result`` per source as they complete."""
+    by_url = defaultdict(list)
+    for source in sources:
+        by_url[source.url].append(source)
+    with ThreadPoolExecutor(max_workers=fetcher.workers, thread_name_prefix="scraper") as pool:
+        futures = [pool.submit(scrape_url, url, url_sources, fetcher) for url, url_sources in by_url.items()]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def write(source, records):
+    """Insert and update the rows of ``source``'s parent from its ``records``; return the ``WriteStats``.
+
+    A country is unique across continents, so one listed on another
+    continent's page is moved there. Nothing is written when nothing changed.
+    """
+    model, parent_model, fields = TARGETS[source.kind]
+    parent_field = KINDS[source.kind][0]
+    parent = parent_model.objects.filter(name_key=normalize_name(source.parent)).first()
+    if parent is None:
+        raise ScrapeError(f"{parent_field} '{source.parent}' does not exist")
+
+    # name key -> field values; the last of the rows sharing a key wins
+    rows = {}
+    for record in records:
+        values = {field: record.get(key) for key, field in fields.items()}
+        rows[normalize_name(values["name"])] = values
+    existing = model.objects.filter(name_key__in=list(rows))
+    if model is State:
+        # state names are only unique within their country
+        existing = existing.filter(country=parent)
+    existing = {row.name_key: row for row in existing}
+
+    parent_id = f"{parent_field}_id"
+    new, changed, fields_changed, moved = [], [], set(), []
+    unchanged = 0
+    for key, values in rows.items():
+        row = existing.get(key)
+        if row is None:
+            new.append(model(name_key=key, **values, **{parent_field: parent}))
+            continue
+        changes = {field: value for field, value in values.items() if getattr(row, field) != value}
+        if getattr(row, parent_id) != parent.pk:
+            moved.append((getattr(row, parent_id), key))
+            changes[parent_id] = parent.pk
+        if not changes:
+            unchanged += 1
+            continue
+        for field, value in changes.items():
+            setattr(row, field, value)
+        changed.append(row)
+        fields_changed.update(changes)
+
+    if new or changed:
+        with transaction.atomic():
+            for row, pk in zip(new, generate_ids(len(new))):
+                row.id = pk
+            model.objects.bulk_create(new)
+            now = timezone.now()
+            for row in changed:
+                row.date_updated = now
+            model.objects.bulk_update(changed, sorted(fields_changed | {"date_updated"}))
+            if new or moved:
+                recount(parent_model, {parent.pk} | {previous for previous, _ in moved})
+            DataVersion.bump()
+            invalidate_rows(model, [(parent.pk, row.name_key) for row in new] + moved, membership=True)
+            invalidate_rows(model, [(parent.pk, row.name_key) for row in changed], membership=False)
+    return WriteStats(len(new), len(changed), unchanged)
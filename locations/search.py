@@ -0,0 +1,347 @@
+"""Ranked name search across continents, countries, states and LGAs.
+
+``SearchIndex`` is an inverted index from the words of every name key (see
+``utils.text.normalize_name``) to the positions of the places carrying them.
+Places are kept in flat arrays - level, parent position, word count and name
+per position - so a million LGAs cost a few compact arrays rather than an
+object each, and the ancestry of a result is a walk up the parent positions.
+
+A query matches the places whose name contains all of its words. Results are
+ranked by how few other words the name has (so "Lagos" comes before "Lagos
+Island"), then by level (continents first), then by name length and name.
+
+The index is built on first use and then kept current incrementally: saves
+and deletes made in this process are applied once their transaction commits,
+and when the data version changes because of another process (or a bulk
+writer bypassing the signals) the rows updated since the last sync are read
+back and applied. Row counts tell whether every unknown row of that read is
+an insert; when they do not add up (rows deleted elsewhere) or too many rows
+changed at once, the index is rebuilt instead.
+"""
+
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from utils.text import normalize_name
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+
+# level -> (model, parent field); in hierarchy order, which is also the ranking order
+LEVELS = {
+    "continent": (Continent, None),
+    "country": (Country, "continent_id"),
+    "state": (State, "country_id"),
+    "local_government": (LocalGovernment, "state_id"),
+}
+LEVEL_NAMES = list(LEVELS)
+LEAF = LEVEL_NAMES.index("local_government")
+DELETED = 255
+
+WORD = re.compile(r"[^\W_]+")
+
+# Postings this many times longer than the shortest one are not turned into sets.
+INTERSECT_RATIO = 8
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Rows written by other processes are looked up by ``date_updated``; the margin
+# covers transactions that committed after a sync with an earlier timestamp.
+CATCH_UP_MARGIN = timedelta(seconds=60)
+# Past this many changed rows per level a rebuild is cheaper than catching up.
+CATCH_UP_LIMIT = 10000
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def words(name_key):
+    return WORD.findall(name_key)
+
+
+def parse_search(params):
+    """The ``(query, levels, parent, limit)`` of the search query parameters.
+
+    Raises ``InvalidSearch`` for a missing query, an unknown level or a bad limit.
+    """
+    query = params.get("q", "").strip()
+    if not words(normalize_name(query)):
+        raise InvalidSearch("q parameter is missing")
+    levels = None
+    if params.get("level"):
+        levels = [level.strip() for level in params["level"].split(",") if level.strip()]
+        unknown = [level for level in levels if level not in LEVELS]
+        if unknown:
+            raise InvalidSearch(f"Unknown level '{unknown[0]}'; expected one of {', '.join(LEVELS)}")
+    parent = params.get("parent", "").strip() or None
+    try:
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise InvalidSearch("limit must be an integer") from None
+    if not 1 <= limit <= MAX_LIMIT:
+        raise InvalidSearch(f"limit must be between 1 and {MAX_LIMIT}")
+    return query, levels, parent, limit
+
+
+class SearchIndex:
+    """Per-process inverted index of every place name; see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.synced_at = None
+        self._clear()
+
+    def _clear(self):
+        self.ids = array("q")
+        self.levels = bytearray()
+        self.parents = array("q")
+        self.word_counts = bytearray()
+        self.names = []
+        self.postings = {}
+        # id -> position, but for the LGAs of the last build: those are in two arrays sorted by id,
+        # which take 12 bytes an LGA where a dict would take a hundred
+        self.positions = {}
+        self.leaf_ids = array("q")
+        self.leaf_positions = array("I")
+        self.counts = [0] * len(LEVELS)
+
+    @property
+    def built(self):
+        return self.version is not None
+
+    def clear(self):
+        with self._lock:
+            self.version = None
+            self.synced_at = None
+            self._clear()
+
+    def search(self, query, levels=None, parent=None, limit=DEFAULT_LIMIT, version=None):
+        """The ``limit`` best places named like ``query``, as ``{"name", "level", "path"}`` dicts.
+
+        ``levels`` restricts the results to those level names and ``parent`` to
+        the places under a continent, country or state of that name.
+        """
+        self.sync(DataVersion.current() if version is None else version)
+        terms = set(words(normalize_name(query)))
+        if not terms:
+            return []
+        with self._lock:
+            candidates = self._matching(terms)
+            if levels is not None:
+                wanted = {LEVEL_NAMES.index(level) for level in levels}
+                candidates = (position for position in candidates if self.levels[position] in wanted)
+            if parent is not None:
+                ancestors = self._named(normalize_name(parent))
+                candidates = (position for position in candidates if self._descends(position, ancestors))
+            return [self._result(position) for position in islice(candidates, limit)]
+
+    def _rank(self, position):
+        return self.word_counts[position], self.levels[position], len(self.names[position]), self.names[position]
+
+    def _matching(self, terms):
+        """The positions whose name has all of ``terms``, best ranked first.
+
+        Posting lists are kept in rank order, so a search stops reading them as
+        soon as it has its results.
+        """
+        postings = [self.postings.get(term) for term in terms]
+        if not all(postings):
+            return ()
+        postings.sort(key=len)
+        shortest = postings[0]
+        if len(postings) == 1:
+            return shortest
+        if len(postings[-1]) <= INTERSECT_RATIO * len(shortest):
+            others = [set(posting) for posting in postings[1:]]
+            return (position for position in shortest if all(position in other for other in others))
+        # Rather than a set of a long posting list, check the words of the few candidates.
+        return (position for position in shortest if terms <= set(words(normalize_name(self.names[position]))))
+
+    def _named(self, name_key):
+        """Positions of the continents, countries and states whose key is ``name_key``."""
+        return {
+            position for position in self._matching(set(words(name_key)))
+            if self.levels[position] < LEAF and normalize_name(self.names[position]) == name_key
+        }
+
+    def _descends(self, position, ancestors):
+        position = self.parents[position]
+        while position >= 0:
+            if position in ancestors:
+                return True
+            position = self.parents[position]
+        return False
+
+    def _result(self, position):
+        path = [self.names[position]]
+        parent = self.parents[position]
+        while parent >= 0:
+            path.append(self.names[parent])
+            parent = self.parents[parent]
+        path.reverse()
+        return {"name": path[-1], "level": LEVEL_NAMES[self.levels[position]], "path": path}
+
+    def sync(self, version):
+        """Bring the index up to ``version`` of the data."""
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            started = timezone.now()
+            if not self.built or not self._catch_up(self.synced_at - CATCH_UP_MARGIN):
+                self._build()
+            self.version = version
+            self.synced_at = started
+
+    def _build(self):
+        self._clear()
+        keys = []
+        for level, (model, parent_field) in enumerate(LEVELS.values()):
+            columns = ["id", "name", "name_key"] + ([parent_field] if parent_field else [])
+            for row in model.objects.values_list(*columns).iterator(chunk_size=10000):
+                self._insert(level, row[0], row[1], row[2], row[3] if parent_field else None, building=True)
+                keys.append(row[2])
+        # Appending in rank order leaves every posting list sorted.
+        for position in sorted(range(len(keys)), key=self._rank):
+            for term in set(words(keys[position])):
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = array("I")
+                posting.append(position)
+        leaves = sorted((pk, position) for position, pk in enumerate(self.ids) if self.levels[position] == LEAF)
+        self.leaf_ids = array("q", (pk for pk, _ in leaves))
+        self.leaf_positions = array("I", (position for _, position in leaves))
+
+    def _catch_up(self, since):
+        """Apply the rows updated since ``since``; ``False`` when the index must be rebuilt instead."""
+        changes = []
+        for level, (model, parent_field) in enumerate(LEVELS.values()):
+            columns = ["id", "name", "name_key"] + ([parent_field] if parent_field else [])
+            rows = list(model.objects.filter(date_updated__gte=since).values_list(*columns)[:CATCH_UP_LIMIT + 1])
+            if len(rows) > CATCH_UP_LIMIT:
+                return False
+            inserts = sum(self._locate(level, row[0]) is None for row in rows)
+            # With no deletes elsewhere, the rows this index does not know are exactly the new ones.
+            if model.objects.count() != self.counts[level] + inserts:
+                return False
+            changes.append((level, parent_field, rows))
+        try:
+            for level, parent_field, rows in changes:
+                for row in rows:
+                    self._update(level, row[0], row[1], row[2], row[3] if parent_field else None)
+        except KeyError:
+            # a parent the index does not know about
+            return False
+        return True
+
+    def _locate(self, level, pk):
+        position = self.positions.get(pk)
+        if position is None and level == LEAF:
+            index = bisect_left(self.leaf_ids, pk)
+            if index < len(self.leaf_ids) and self.leaf_ids[index] == pk:
+                position = self.leaf_positions[index]
+        if position is None or self.levels[position] != level:
+            # an LGA deleted since the build
+            return None
+        return position
+
+    def _insert(self, level, pk, name, name_key, parent_id, building=False):
+        parent = self.positions[parent_id] if parent_id is not None else -1
+        position = len(self.ids)
+        self.ids.append(pk)
+        self.levels.append(level)
+        self.parents.append(parent)
+        self.names.append(name)
+        self.word_counts.append(min(len(set(words(name_key))), 255))
+        if not building:
+            self._index(position, name_key)
+        if level < LEAF or not building:
+            self.positions[pk] = position
+        self.counts[level] += 1
+
+    def _index(self, position, name_key):
+        for term in set(words(name_key)):
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = array("I")
+            insort(posting, position, key=self._rank)
+
+    def _unindex(self, position, name_key):
+        for term in set(words(name_key)):
+            posting = self.postings[term]
+            posting.remove(position)
+            if not posting:
+                del self.postings[term]
+
+    def _update(self, level, pk, name, name_key, parent_id):
+        position = self._locate(level, pk)
+        if position is None:
+            self._insert(level, pk, name, name_key, parent_id)
+            return
+        if self.names[position] != name:
+            self._unindex(position, normalize_name(self.names[position]))
+            self.names[position] = name
+            self.word_counts[position] = min(len(set(words(name_key))), 255)
+            self._index(position, name_key)
+        if parent_id is not None:
+            self.parents[position] = self.positions[parent_id]
+
+    def _delete(self, level, pk):
+        position = self._locate(level, pk)
+        if position is None:
+            return
+        self._unindex(position, normalize_name(self.names[position]))
+        self.levels[position] = DELETED
+        self.names[position] = ""
+        self.positions.pop(pk, None)
+        self.counts[level] -= 1
+
+    def saved(self, level, instance):
+        """Apply a saved row once its transaction commits."""
+        parent_field = LEVELS[level][1]
+        row = (LEVEL_NAMES.index(level), instance.pk, instance.name, instance.name_key,
+               getattr(instance, parent_field) if parent_field else None)
+
+        def apply():
+            with self._lock:
+                if self.built:
+                    try:
+                        self._update(*row)
+                    except KeyError:
+                        # a parent the index does not know about; rebuild on the next search
+                        self.clear()
+
+        transaction.on_commit(apply)
+
+    def deleted(self, level, instance):
+        row = (LEVEL_NAMES.index(level), instance.pk)
+
+        def apply():
+            with self._lock:
+                if self.built:
+                    self._delete(*row)
+
+        transaction.on_commit(apply)
+
+    def memory(self):
+        """Approximate bytes held by the index."""
+        with self._lock:
+            size = sum(sys.getsizeof(part) for part in (self.ids, self.levels, self.parents, self.word_counts,
+                                                          self.names, self.postings, self.positions,
+                                                          self.leaf_ids, self.leaf_positions))
+            size += sum(sys.getsizeof(name) for name in self.names)
+            size += sum(sys.getsizeof(term) + sys.getsizeof(posting) for term, posting in self.postings.items())
+            return size
+
+
+search_index = SearchIndex()
@@ -2,7 +2,15 @@ from rest_framework import serializers
 from .models import Continent, Country, State, LocalGovernment
 
 
+# The serializers below define the representation of every location; the
+# responses are built from them by ``lean.py`` (and ``streaming.py`` for the
+# planet-earth document) without instantiating them. ``COLUMNS`` maps each
+# field to the ``values()`` column it reads, or to no column for a nested list.
+# Nested rows are ordered by id (i.e. creation time).
+
+
 class LocalGovernmentSerializer(serializers.ModelSerializer):
+    COLUMNS = {"name": ["name"]}
 
     class Meta:
         model = LocalGovernment
@@ -10,26 +18,37 @@ class LocalGovernmentSerializer(serializers.ModelSerializer):
 
 
 class StateSerializer(serializers.ModelSerializer):
-    
+    COLUMNS = {"name": ["name"], "capital": ["capital"], "local_governments": []}
+
     local_governments = LocalGovernmentSerializer(many=True, read_only=True)
 
     class Meta:
         model = State
         fields = ["name", "capital", "local_governments"]
 
-    
+
 class CountryOnlySerializer(serializers.ModelSerializer):
+    COLUMNS = {
+        "continent": ["continent__name"], "name": ["name"], "capital": ["capital"], "currency": ["currency"],
+        "language": ["language"], "states_count": ["states_count"],
+    }
+
     continent = serializers.SerializerMethodField()
 
     class Meta:
         model = Country
-        fields = ["continent", "name", "capital", "currency", "language"]
+        fields = ["continent", "name", "capital", "currency", "language", "states_count"]
 
     def get_continent(self, obj):
         return obj.continent.name
 
 
 class CountrySerializer(serializers.ModelSerializer):
+    COLUMNS = {
+        "continent": ["continent__name"], "name": ["name"], "capital": ["capital"], "currency": ["currency"],
+        "language": ["language"], "states": [],
+    }
+
     states = StateSerializer(many=True, read_only=True)
     continent = serializers.SerializerMethodField()
 
@@ -42,19 +61,64 @@ class CountrySerializer(serializers.ModelSerializer):
 
 
 class ContinentOnlySerializer(serializers.ModelSerializer):
-    countries_count = serializers.SerializerMethodField()
+    COLUMNS = {"name": ["name"], "countries_count": ["countries_count"]}
 
     class Meta:
         model = Continent
         fields = ["name", "countries_count"]
 
-    def get_countries_count(self, obj):
-        return obj.countries.count()  
-
 
 class ContinentSerializer(serializers.ModelSerializer):
+    COLUMNS = {"name": ["name"], "countries": []}
+
     countries = CountrySerializer(many=True, read_only=True)
 
     class Meta:
         model = Continent
         fields = ["name", "countries"]
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """Shape of the results of ``locations.search``, which builds them as plain dicts."""
+
+    name = serializers.CharField()
+    level = serializers.ChoiceField(choices=["continent", "country", "state", "local_government"])
+    path = serializers.ListField(child=serializers.CharField())
+
+
+class SearchResponseSerializer(serializers.Serializer):
+    query = serializers.CharField()
+    count = serializers.IntegerField()
+    results = SearchResultSerializer(many=True)
+
+
+class ResolveItemSerializer(serializers.Serializer):
+    country = serializers.CharField()
+    state = serializers.CharField(required=False)
+    local_government = serializers.CharField(required=False)
+
+
+class ResolveRequestSerializer(serializers.Serializer):
+    items = ResolveItemSerializer(many=True)
+
+
+class ResolvedPlaceSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class ResolveResultSerializer(serializers.Serializer):
+    """Shape of the results of ``locations.resolver``: the places found, then what was not."""
+
+    country = ResolvedPlaceSerializer(required=False)
+    state = ResolvedPlaceSerializer(required=False)
+    local_government = ResolvedPlaceSerializer(required=False)
+    not_found = serializers.ChoiceField(choices=["country", "state", "local_government"], required=False)
+    error = serializers.CharField(required=False)
+    suggestions = serializers.ListField(child=serializers.CharField(), required=False)
+
+
+class ResolveResponseSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    found = serializers.IntegerField()
+    results = ResolveResultSerializer(many=True)
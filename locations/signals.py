@@ -0,0 +1,83 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from .cache import invalidate_rows
+from .counters import COUNTERS, adjust
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+from .search import search_index
+
+LOCATION_MODELS = (Continent, Country, State, LocalGovernment)
+
+
+def bump_data_version(sender, **kwargs):
+    """Record that location data changed, so every derived document is rebuilt."""
+    DataVersion.bump()
+
+
+def remember_previous_row(sender, instance, **kwargs):
+    """Keep the parent and name key a row had before an update, in case the update moves or renames it."""
+    foreign_key = COUNTERS[sender][0]
+    if instance._state.adding:
+        instance._previous_row = None
+    else:
+        instance._previous_row = (sender.objects.filter(pk=instance.pk)
+                                  .values_list(foreign_key, "name_key").first())
+
+
+def current_row(sender, instance):
+    return getattr(instance, COUNTERS[sender][0]), instance.name_key
+
+
+def count_saved_child(sender, instance, created, **kwargs):
+    parent_id = getattr(instance, COUNTERS[sender][0])
+    previous = getattr(instance, "_previous_row", None)
+    previous_parent_id = previous[0] if previous else None
+    if created:
+        adjust(sender, parent_id, 1)
+    elif previous_parent_id != parent_id:
+        if previous_parent_id is not None:
+            adjust(sender, previous_parent_id, -1)
+        adjust(sender, parent_id, 1)
+
+
+def count_deleted_child(sender, instance, **kwargs):
+    adjust(sender, getattr(instance, COUNTERS[sender][0]), -1)
+
+
+def invalidate_saved_row(sender, instance, created, **kwargs):
+    """Make the cached responses showing this row (where it is now and where it was) stale."""
+    if sender is Continent:
+        invalidate_rows(sender, [], membership=True)
+        return
+    row = current_row(sender, instance)
+    previous = getattr(instance, "_previous_row", None)
+    changed = previous is not None and previous != row
+    invalidate_rows(sender, [row, previous] if changed else [row], membership=created or changed)
+
+
+def invalidate_deleted_row(sender, instance, **kwargs):
+    invalidate_rows(sender, [] if sender is Continent else [current_row(sender, instance)], membership=True)
+
+
+# model -> level name of the search index
+SEARCH_LEVELS = {Continent: "continent", Country: "country", State: "state", LocalGovernment: "local_government"}
+
+
+def index_saved_row(sender, instance, **kwargs):
+    search_index.saved(SEARCH_LEVELS[sender], instance)
+
+
+def unindex_deleted_row(sender, instance, **kwargs):
+    search_index.deleted(SEARCH_LEVELS[sender], instance)
+
+
+for model in LOCATION_MODELS:
+    post_save.connect(bump_data_version, sender=model)
+    post_delete.connect(bump_data_version, sender=model)
+    post_save.connect(invalidate_saved_row, sender=model)
+    post_delete.connect(invalidate_deleted_row, sender=model)
+    post_save.connect(index_saved_row, sender=model)
+    post_delete.connect(unindex_deleted_row, sender=model)
+
+for model in COUNTERS:
+    pre_save.connect(remember_previous_row, sender=model)
+    post_save.connect(count_saved_child, sender=model)
+    post_delete.connect(count_deleted_child, sender=model)
@@ -0,0 +1,99 @@
+"""Precomputed planet-earth document.
+
+The full continent -> country -> state -> LGA payload only changes when location
+data is written, so it is rendered once per data version and kept in memory as
+ready-to-send bytes, together with gzip and (when the ``brotli`` package is
+installed) brotli encoded copies.
+"""
+
+import gzip
+import threading
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .models import DataVersion
+from .streaming import planet_earth_chunks
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+class Snapshot:
+    __slots__ = ("version", "encodings")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.encodings = {"identity": body, "gzip": gzip.compress(body, mtime=0)}
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(body)
+
+    @property
+    def body(self):
+        return self.encodings["identity"]
+
+    def response(self, request):
+        """Return the stored bytes in the best encoding the client accepts."""
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""), self.encodings)
+        response = HttpResponse(self.encodings[encoding], content_type="application/json")
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+
+def negotiate_encoding(header, available):
+    accepted = set()
+    for part in header.split(","):
+        coding, *params = part.strip().split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def render_planet_earth():
+    # The streaming renderer produces the same bytes as the serializers without
+    # materializing every row as a model instance and a dict first.
+    return b"".join(planet_earth_chunks())
+
+
+class PlanetEarthSnapshot:
+    """Holds the rendered document for the data version it was built from.
+
+    Writes bump ``DataVersion`` through the model signals; the next read sees
+    the new version and rebuilds once, whichever process made the write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def get(self, version=None):
+        if version is None:
+            version = DataVersion.current()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._snapshot = Snapshot(version, render_planet_earth())
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+planet_earth_snapshot = PlanetEarthSnapshot()
@@ -0,0 +1,99 @@
+"""Incremental rendering of the planet-earth document.
+
+``planet_earth_chunks`` walks continents -> countries -> states -> LGAs as four
+ordered, chunked ``values_list`` iterators merged on their parent ids, and
+writes the JSON as it goes. Memory use is bounded by the chunk and buffer sizes
+instead of growing with the dataset, and the output is byte for byte what
+``JSONRenderer`` produces for ``ContinentSerializer`` (see the tests). The
+four queries read one snapshot of the database, so a write made meanwhile
+cannot leave a row whose parent the merge never reached; if rows are left
+over all the same, the merge raises instead of ending a partial document.
+"""
+
+import json
+
+from utils.db import consistent_reads
+from .models import Continent, Country, State, LocalGovernment
+
+# Same settings as rest_framework's JSONRenderer with its default
+# UNICODE_JSON/COMPACT_JSON, including its escaping of U+2028 and U+2029.
+ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
+def dumps(value):
+    return ENCODER.encode(value).replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+
+
+class IncompleteDocument(RuntimeError):
+    """Rows that the merge of the four queries could not place under a parent."""
+
+
+class _Peekable:
+    __slots__ = ("_iterator", "head")
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.head = next(self._iterator, None)
+
+    def pop(self):
+        row, self.head = self.head, next(self._iterator, None)
+        return row
+
+
+def planet_earth_chunks(chunk_size=2000, flush_every=4096):
+    """Yield the planet-earth JSON document as a sequence of ``bytes`` chunks.
+
+    ``chunk_size`` rows are fetched from the database at a time, and a chunk is
+    yielded after the state during which the buffer reached ``flush_every`` pieces.
+    """
+    with consistent_reads():
+        continents = list(Continent.objects.order_by("pk").values_list("pk", "name"))
+        countries = _Peekable(
+            Country.objects.order_by("continent_id", "pk")
+            .values_list("pk", "continent_id", "name", "capital", "currency", "language")
+            .iterator(chunk_size=chunk_size)
+        )
+        states = _Peekable(
+            State.objects.order_by("country__continent_id", "country_id", "pk")
+            .values_list("pk", "country_id", "name", "capital")
+            .iterator(chunk_size=chunk_size)
+        )
+        local_governments = _Peekable(
+            LocalGovernment.objects.order_by("state__country__continent_id", "state__country_id", "state_id", "pk")
+            .values_list("state_id", "name")
+            .iterator(chunk_size=chunk_size)
+        )
+
+        buffer = [f'{{"count":{len(continents)},"continents":[']
+        for continent_index, (continent_id, continent_name) in enumerate(continents):
+            continent_json = dumps(continent_name)
+            buffer.append(f'{"," if continent_index else ""}{{"name":{continent_json},"countries":[')
+            first_country = True
+            while countries.head is not None and countries.head[1] == continent_id:
+                country_id, _, name, capital, currency, language = countries.pop()
+                buffer.append(
+                    f'{"" if first_country else ","}{{"continent":{continent_json},"name":{dumps(name)},'
+                    f'"capital":{dumps(capital)},"currency":{dumps(currency)},"language":{dumps(language)},"states":['
+                )
+                first_country = False
+                first_state = True
+                while states.head is not None and states.head[1] == country_id:
+                    state_id, _, name, capital = states.pop()
+                    buffer.append(
+                        f'{"" if first_state else ","}{{"name":{dumps(name)},"capital":{dumps(capital)},"local_governments":['
+                    )
+                    first_state = False
+                    first_local_government = True
+                    while local_governments.head is not None and local_governments.head[0] == state_id:
+                        buffer.append(f'{"" if first_local_government else ","}{{"name":{dumps(local_governments.pop()[1])}}}')
+                        first_local_government = False
+                    buffer.append("]}")
+                    if len(buffer) >= flush_every:
+                        yield "".join(buffer).encode()
+                        buffer.clear()
+                buffer.append("]}")
+            buffer.append("]}")
+        if countries.head is not None or states.head is not None or local_governments.head is not None:
+            raise IncompleteDocument("rows are left over after the last continent")
+        buffer.append("]}")
+        yield "".join(buffer).encode()
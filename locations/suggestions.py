@@ -0,0 +1,165 @@
+"""Spelling suggestions for names that could not be found.
+
+Names are indexed per level and per parent (all continents, all countries, the
+states of one country, the LGAs of one state). Each scope keeps a trigram
+posting list, so a miss only scores the names that share a trigram with the
+query (or are short enough to be close without one) instead of every name in
+the scope. Candidates are scored and ranked as by ``difflib.get_close_matches``,
+but in scopes over ``FULL_SCAN_LIMIT`` names the filter is an approximation: a
+long name whose matching runs are all under three characters ("QabRcdSefV"
+for "XabYcdZefW", ratio 0.6) is not a candidate and is never suggested.
+Scopes are built on first use and dropped when the data version changes, and
+recent misses are remembered so a repeated typo costs a dict lookup.
+"""
+
+import heapq
+import threading
+from collections import OrderedDict, defaultdict
+from difflib import SequenceMatcher
+
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+
+# level -> (model, parent field); the parent field is None for top level scopes
+LEVELS = {
+    "continent": (Continent, None),
+    "country": (Country, None),
+    "state": (State, "country_id"),
+    "local_government": (LocalGovernment, "state_id"),
+}
+
+# Scopes at most this size are scored in full; the trigram filter only pays off
+# on larger ones.
+FULL_SCAN_LIMIT = 64
+
+# Names or queries shorter than this are matched by length as well as by trigram.
+SHORT_WORD = 5
+
+
+def trigrams(word):
+    padded = f"  {word.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    __slots__ = ("names", "postings", "lengths")
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self.postings = defaultdict(list)
+        self.lengths = defaultdict(list)
+        if len(self.names) > FULL_SCAN_LIMIT:
+            for position, name in enumerate(self.names):
+                self.lengths[len(name)].append(position)
+                for gram in trigrams(name):
+                    self.postings[gram].append(position)
+
+    def candidates(self, word, cutoff):
+        if not self.postings:
+            return self.names
+        positions = set()
+        for gram in trigrams(word):
+            positions.update(self.postings.get(gram, ()))
+        # Short strings can be close without sharing a trigram, so names are also
+        # taken from every length that still allows a ratio above the cutoff,
+        # limited to short names when the query itself is long.
+        size = len(word)
+        for length, members in self.lengths.items():
+            if size >= SHORT_WORD and length >= SHORT_WORD:
+                continue
+            if 2 * min(size, length) >= cutoff * (size + length):
+                positions.update(members)
+        return [self.names[position] for position in sorted(positions)]
+
+    def close_matches(self, word, n=3, cutoff=0.6):
+        """``difflib.get_close_matches`` over the trigram candidates; see the module docstring."""
+        result = []
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        for name in self.candidates(word, cutoff):
+            matcher.set_seq1(name)
+            if (matcher.real_quick_ratio() >= cutoff
+                    and matcher.quick_ratio() >= cutoff
+                    and matcher.ratio() >= cutoff):
+                result.append((matcher.ratio(), name))
+        return [name for _, name in heapq.nlargest(n, result)]
+
+
+class SuggestionIndex:
+    """Per-process cache of ``TrigramIndex`` scopes and of recent misses."""
+
+    def __init__(self, max_scopes=2048, max_negative=1024):
+        self.max_scopes = max_scopes
+        self.max_negative = max_negative
+        self._lock = threading.Lock()
+        self._version = None
+        self._scopes = OrderedDict()
+        self._negative = OrderedDict()
+
+    def suggest(self, level, word, parent=None, n=3, cutoff=0.6, version=None, names=None):
+        """Return up to ``n`` names of ``level`` under ``parent`` that resemble ``word``.
+
+        ``names`` is a function of ``(level, parent)`` returning the names of a
+        scope, for callers holding them, instead of querying them.
+        """
+        self._check_version(DataVersion.current() if version is None else version)
+
+        key = (level, parent, word, n, cutoff)
+        with self._lock:
+            if key in self._negative:
+                self._negative.move_to_end(key)
+                return []
+
+        suggestions = self._scope(level, parent, names).close_matches(word, n=n, cutoff=cutoff)
+        if not suggestions:
+            with self._lock:
+                self._negative[key] = True
+                if len(self._negative) > self.max_negative:
+                    self._negative.popitem(last=False)
+        return suggestions
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._scopes.clear()
+            self._negative.clear()
+
+    def _check_version(self, version):
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._scopes.clear()
+                    self._negative.clear()
+                    self._version = version
+
+    def _scope(self, level, parent, names=None):
+        key = (level, parent)
+        with self._lock:
+            index = self._scopes.get(key)
+            if index is not None:
+                self._scopes.move_to_end(key)
+                return index
+
+        if names is not None:
+            index = TrigramIndex(names(level, parent))
+        else:
+            model, parent_field = LEVELS[level]
+            queryset = model.objects.all()
+            if parent_field is not None:
+                queryset = queryset.filter(**{parent_field: parent})
+            index = TrigramIndex(queryset.values_list("name", flat=True))
+
+        with self._lock:
+            self._scopes[key] = index
+            if len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        return index
+
+
+suggestion_index = SuggestionIndex()
+
+
+def not_found_message(subject, suggestions):
+    """The error of a lookup that found nothing, with its "Did you mean" hint."""
+    if suggestions:
+        return f"{subject} isn't found. Did you mean '{suggestions[0]}'?"
+    return f"{subject} isn't found and no suggestions are available."
@@ -0,0 +1,138 @@
+"""Deterministic synthetic location data for load and scaling tests.
+
+``WorldGenerator`` produces a continent -> country -> state -> LGA hierarchy of
+any size as ``importer`` records, so it is written through the same batched
+bulk path as real data. Totals are exact and spread unevenly over the parents
+(log-normal shares, at least one child per parent when there are enough), names
+are built from syllables with a skewed length distribution and a few prefixes,
+suffixes and accents, and a share of the names are near duplicates of a sibling
+(a dropped, doubled, swapped or replaced letter) so that lookups with typos hit
+the fuzzy-suggestion path on realistic candidate sets. The same arguments and
+seed always give the same records.
+"""
+
+import random
+from itertools import accumulate
+
+from utils.text import normalize_name
+
+CONTINENT_NAMES = ["Africa", "Antarctica", "Asia", "Europe", "North America", "Oceania", "South America"]
+
+SYLLABLES = [
+    "a", "ba", "be", "bo", "da", "di", "do", "e", "el", "fa", "fu", "ga", "ge", "go", "ha", "i", "ja", "ka", "ke",
+    "ki", "ko", "la", "le", "li", "lo", "lu", "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "o", "on", "pa", "ra",
+    "re", "ri", "ro", "ru", "sa", "se", "shi", "so", "ta", "te", "ti", "to", "u", "ur", "va", "vi", "wa", "ye", "yo",
+    "za", "zo",
+]
+# syllables per word -> weight
+WORD_LENGTHS = {2: 33, 3: 37, 4: 20, 5: 8, 6: 2}
+LENGTHS = list(WORD_LENGTHS)
+CUMULATIVE_WEIGHTS = list(accumulate(WORD_LENGTHS.values()))
+PREFIXES = ["New ", "Port ", "San ", "Saint ", "Upper ", "Lower ", "Fort ", "Al "]
+SUFFIXES = [" North", " South", " East", " West", " Central", " Island", "ville", "burg", "stan", "land", "ia"]
+ACCENTS = {"a": "á", "e": "é", "i": "í", "o": "ô", "u": "ü"}
+CURRENCY_UNITS = ["Dollar", "Franc", "Peso", "Dinar", "Shilling", "Rupee", "Krona", "Lira", "Rand"]
+LANGUAGE_ENDINGS = ["ese", "ish", "ic", "an", "i"]
+VOWELS = "aeiou"
+
+
+def split(total, parts, rng, sigma=0.9):
+    """Spread ``total`` over ``parts`` parents with log-normal shares."""
+    if parts <= 0:
+        return []
+    minimum = 1 if total >= parts else 0
+    rest = total - minimum * parts
+    weights = [rng.lognormvariate(0, sigma) for _ in range(parts)]
+    scale = rest / sum(weights)
+    shares = [weight * scale for weight in weights]
+    counts = [minimum + int(share) for share in shares]
+    by_remainder = sorted(range(parts), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class WorldGenerator:
+    """Yield the records of a synthetic world; see the module docstring."""
+
+    def __init__(self, continents=7, countries=250, states=5000, local_governments=1_000_000, seed=0,
+                 near_duplicates=0.05):
+        self.continents = continents
+        self.countries = countries
+        self.states = states
+        self.local_governments = local_governments
+        self.seed = seed
+        self.near_duplicates = near_duplicates
+
+    @staticmethod
+    def word(rng):
+        length = rng.choices(LENGTHS, cum_weights=CUMULATIVE_WEIGHTS)[0]
+        return "".join(rng.choice(SYLLABLES) for _ in range(length)).capitalize()
+
+    def fresh_name(self, rng):
+        name = self.word(rng)
+        roll = rng.random()
+        if roll < 0.08:
+            name = rng.choice(PREFIXES) + name
+        elif roll < 0.2:
+            name += rng.choice(SUFFIXES)
+        elif roll < 0.28:
+            name = f"{name} {self.word(rng)}"
+        if rng.random() < 0.03:
+            position = rng.randrange(len(name))
+            name = name[:position] + ACCENTS.get(name[position], name[position]) + name[position + 1:]
+        return name
+
+    def near_duplicate(self, name, rng):
+        letters = [position for position, char in enumerate(name) if char.isalpha()]
+        position = rng.choice(letters[1:] or letters)
+        edit = rng.randrange(4)
+        if edit == 0 and len(letters) > 3:
+            return name[:position] + name[position + 1:]
+        if edit == 1:
+            return name[:position] + name[position] + name[position:]
+        if edit == 2 and position + 1 < len(name) and name[position + 1].isalpha():
+            return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+        replacement = rng.choice(VOWELS if name[position].lower() in VOWELS else "bdgklmnrstz")
+        return name[:position] + replacement + name[position + 1:]
+
+    def names(self, count, rng, taken=None):
+        """``count`` names whose keys are unique among themselves and ``taken``."""
+        taken = set() if taken is None else taken
+        names = []
+        while len(names) < count:
+            if names and rng.random() < self.near_duplicates:
+                name = self.near_duplicate(rng.choice(names), rng)
+            else:
+                name = self.fresh_name(rng)
+            key = normalize_name(name)
+            if key not in taken:
+                taken.add(key)
+                names.append(name)
+        return names
+
+    def records(self):
+        rng = random.Random(self.seed)
+
+        continents = CONTINENT_NAMES[:self.continents]
+        continents += self.names(self.continents - len(continents), rng, {normalize_name(name) for name in continents})
+        country_names = self.names(self.countries, rng)
+        countries_per_continent = split(self.countries, len(continents), rng)
+        states_per_country = split(self.states, self.countries, rng)
+        local_governments_per_state = split(self.local_governments, self.states, rng)
+
+        countries = iter(zip(country_names, states_per_country))
+        states = iter(local_governments_per_state)
+        for continent, country_count in zip(continents, countries_per_continent):
+            yield {"continent": continent}
+            for _ in range(country_count):
+                country, state_count = next(countries)
+                yield {
+                    "continent": continent, "country": country, "capital": self.fresh_name(rng),
+                    "currency": None if rng.random() < 0.02 else f"{self.word(rng)} {rng.choice(CURRENCY_UNITS)}",
+                    "language": self.word(rng) + rng.choice(LANGUAGE_ENDINGS),
+                }
+                for state in self.names(state_count, rng):
+                    yield {"country": country, "state": state, "state_capital": self.fresh_name(rng)}
+                    for local_government in self.names(next(states), rng):
+                        yield {"country": country, "state": state, "local_government": local_government}
@@ -1,3 +1,1871 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest import mock
+from difflib import get_close_matches
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from . import async_views, autocomplete as autocomplete_module, lean, views
+from .autocomplete import InvalidCompletion, Places, autocomplete, parse_completion
+from .cache import response_cache
+from .binary import InvalidBinary, read_binary
+from .counters import recount
+from .export import ENCODERS, Exporter
+from .fields import InvalidFields, nested_serializer, parse_fields
+from .geography import geography, geography_metrics
+from .importer import LEVELS, Importer, read_records
+from .lean import serialize, values_of
+from .models import Continent, Country, State, LocalGovernment, DataVersion
+from .pagination import encode_cursor
+from . import resolver as resolver_module, streaming
+from .resolver import InvalidItem, Resolver, parse_item
+from .scraper import Fetcher, HTTPCache, InvalidSources, ScrapeError, Source, WriteStats, load_sources, parse, scrape, write
+from .search import InvalidSearch, parse_search, search_index
+from .serializers import (ContinentSerializer, ContinentOnlySerializer, CountryOnlySerializer,
+                          CountrySerializer, StateSerializer, LocalGovernmentSerializer)
+from .snapshot import planet_earth_snapshot
+from .streaming import IncompleteDocument, planet_earth_chunks
+from .suggestions import TrigramIndex, suggestion_index
+from .synthetic import WorldGenerator
+from .urls import location_patterns, store_views
+from utils import metrics
+from utils.text import normalize_name
+
+
+def build_world(continents=2, countries=2, states=2, local_governments=2):
+    """Create a small but complete continent -> country -> state -> LGA tree."""
+    for c in range(continents):
+        continent = Continent.objects.create(name=f"Continent {c}")
+        for n in range(countries):
+            country = Country.objects.create(
+                name=f"Country {c}-{n}", capital=f"Capital {c}-{n}", language="English",
+                currency="Naira", continent=continent,
+            )
+            for s in range(states):
+                state = State.objects.create(name=f"State {c}-{n}-{s}", capital=f"Town {s}", country=country)
+                for lg in range(local_governments):
+                    LocalGovernment.objects.create(name=f"LGA {c}-{n}-{s}-{lg}", state=state)
+
+
+def serializer_data(serializer_class, queryset, fields=None):
+    """What the DRF serializers render, the reference of ``lean.py`` and ``streaming.py``."""
+
+    def prefetched(serializer_class, queryset):
+        if serializer_class not in lean.RELATIONS:
+            return queryset
+        relation, nested_class, _ = lean.RELATIONS[serializer_class]
+        nested = prefetched(nested_class, nested_class.Meta.model.objects.order_by("pk"))
+        return queryset.prefetch_related(Prefetch(relation, queryset=nested))
+
+    def restrict(serializer, fields):
+        for name in list(serializer.fields):
+            if name not in fields:
+                serializer.fields.pop(name)
+        for name, subtree in fields.items():
+            if subtree is not None:
+                restrict(nested_serializer(serializer.fields[name]), subtree)
+
+    serializer = serializer_class(prefetched(serializer_class, queryset), many=True)
+    if fields is not None:
+        restrict(serializer.child, fields)
+    return serializer.data
+
+
+# The tests of the view layer bypass the response cache, which ResponseCacheTests covers.
+uncached = override_settings(RESPONSE_CACHE=None)
+
+
+@uncached
+class QueryCountTests(TestCase):
+    """Every endpoint must run a fixed number of queries, whatever the data size."""
+
+    endpoints = [
+        # (url, expected number of queries); every request starts with the data
+        # version lookup used for the conditional GET validators; the planet-earth
+        # snapshot reads its tables in a savepoint of the test's transaction
+        (reverse("all-continents-countries-states-sub-divisions"), 7),
+        (reverse("list-of-available-continents"), 2),
+        (reverse("fetching-countries-by-continent", args=["Continent 0"]), 5),
+        (reverse("fetching-all-countries-available-and-searching-for-a-particular-country"), 2),
+        (reverse("fetching-all-countries-available-and-searching-for-a-particular-country") + "?country=Country 0-0", 4),
+        (reverse("fetch-all-states-in-a-country", args=["Country 0-0"]), 4),
+        (reverse("search-state-in-a-particular-country", args=["Country 0-0"]) + "?state=State 0-0-0", 4),
+        (reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"]), 4),
+    ]
+
+    def setUp(self):
+        planet_earth_snapshot.invalidate()
+
+    def assert_bounded(self):
+        for url, expected in self.endpoints:
+            with self.subTest(url=url), self.assertNumQueries(expected):
+                response = self.client.get(url, HTTP_ACCEPT="application/json")
+                self.assertEqual(response.status_code, 200)
+
+    def test_small_dataset(self):
+        build_world(continents=1, countries=1, states=1, local_governments=1)
+        self.assert_bounded()
+
+    def test_larger_dataset(self):
+        build_world(continents=3, countries=4, states=5, local_governments=6)
+        self.assert_bounded()
+
+    def test_planet_earth_payload(self):
+        build_world(continents=2, countries=2, states=2, local_governments=3)
+        response = self.client.get(reverse("all-continents-countries-states-sub-divisions"), HTTP_ACCEPT="application/json")
+        data = response.json()
+        self.assertEqual(data["count"], 2)
+        country = data["continents"][0]["countries"][0]
+        self.assertEqual(country["continent"], "Continent 0")
+        self.assertEqual(len(country["states"]), 2)
+        self.assertEqual(len(country["states"][0]["local_governments"]), 3)
+
+
+@uncached
+class PlanetEarthSnapshotTests(TestCase):
+    url = reverse("all-continents-countries-states-sub-divisions")
+
+    def setUp(self):
+        planet_earth_snapshot.invalidate()
+        build_world()
+
+    def test_matches_serializer_output(self):
+        response = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        continents = ContinentSerializer(Continent.objects.all(), many=True).data
+        self.assertEqual(response.json(), json.loads(json.dumps({"count": 2, "continents": continents})))
+
+    def test_served_from_memory_until_data_changes(self):
+        self.client.get(self.url, HTTP_ACCEPT="application/json")
+        with self.assertNumQueries(1):
+            self.client.get(self.url, HTTP_ACCEPT="application/json")
+
+        LocalGovernment.objects.create(name="Fresh LGA", state=State.objects.first())
+        response = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        self.assertIn(b"Fresh LGA", response.content)
+
+        LocalGovernment.objects.get(name="Fresh LGA").delete()
+        response = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        self.assertNotIn(b"Fresh LGA", response.content)
+
+    def test_precompressed_variant(self):
+        plain = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        compressed = self.client.get(self.url, HTTP_ACCEPT="application/json", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+        refused = self.client.get(self.url, HTTP_ACCEPT="application/json", HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertFalse(refused.has_header("Content-Encoding"))
+
+
+@uncached
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        build_world()
+
+    def test_unchanged_resources_return_304(self):
+        urls = [url for url, _ in QueryCountTests.endpoints]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_ACCEPT="application/json")
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response["ETag"].startswith('W/"'))
+                self.assertTrue(response.has_header("Last-Modified"))
+
+                with self.assertNumQueries(1):
+                    revalidated = self.client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated["ETag"], response["ETag"])
+
+                revalidated = self.client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+                self.assertEqual(revalidated.status_code, 304)
+
+    def test_write_changes_validators(self):
+        url = reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"])
+        etag = self.client.get(url)["ETag"]
+        LocalGovernment.objects.create(name="Fresh LGA", state=State.objects.get(name="State 0-0-0"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(STORAGES={"staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}})
+    def test_representations_have_distinct_etags(self):
+        url = reverse("list-of-available-continents")
+        as_json = self.client.get(url, HTTP_ACCEPT="application/json")
+        as_html = self.client.get(url, HTTP_ACCEPT="text/html")
+        self.assertNotEqual(as_json["ETag"], as_html["ETag"])
+        self.assertIn("Accept", as_json["Vary"])
+
+    def test_errors_are_not_tagged(self):
+        response = self.client.get(reverse("fetch-all-states-in-a-country", args=["Atlantis"]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+
+@uncached
+class SuggestionTests(TestCase):
+
+    def setUp(self):
+        suggestion_index.clear()
+        build_world()
+
+    def test_matches_difflib_ranking(self):
+        rng = random.Random(7)
+        syllables = ["ka", "no", "ri", "be", "lu", "ta", "ga", "mo", "sa", "ni", "de", "ko", "wa", "ye", "zu"]
+        names = list(dict.fromkeys(
+            "".join(rng.choice(syllables) for _ in range(rng.randint(2, 5))).title() for _ in range(3000)
+        ))
+        index = TrigramIndex(names)
+        for name in rng.sample(names, 200):
+            typo = list(name)
+            typo[rng.randrange(len(typo))] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+            typo = "".join(typo)
+            for n, cutoff in ((1, 0.8), (3, 0.6)):
+                self.assertEqual(index.close_matches(typo, n=n, cutoff=cutoff), get_close_matches(typo, names, n=n, cutoff=cutoff))
+
+    def test_names_without_a_common_trigram_are_not_candidates(self):
+        names = ["QabRcdSefV"] + [f"Name {i}" for i in range(100)]
+        self.assertEqual(get_close_matches("XabYcdZefW", names), ["QabRcdSefV"])
+        self.assertEqual(TrigramIndex(names).close_matches("XabYcdZefW"), [])
+        self.assertEqual(TrigramIndex(names[:10]).close_matches("XabYcdZefW"), ["QabRcdSefV"])
+
+    def test_did_you_mean_messages(self):
+        response = self.client.get(reverse("fetch-all-states-in-a-country", args=["Countri 0-0"]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "Country 'Countri 0-0' isn't found. Did you mean 'Country 0-0'?"})
+
+        response = self.client.get(reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "Stat 0-0-1"]))
+        self.assertEqual(response.json(), {
+            "error": "State 'Stat 0-0-1' in 'Country 0-0' isn't found. Did you mean 'State 0-0-1'?",
+            "suggestions": ["State 0-0-1", "State 0-0-0"],
+        })
+
+        response = self.client.get(reverse("fetching-countries-by-continent", args=["Zzzz"]))
+        self.assertEqual(response.json(), {"error": "Continent 'Zzzz' isn't found and no suggestions are available."})
+
+    def test_repeated_misses_do_not_rescan(self):
+        url = reverse("search-state-in-a-particular-country", args=["Country 0-0"]) + "?state=Nowhere"
+        self.client.get(url)
+        # data version + country lookup + state lookup; the scope is already indexed
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["suggestions"], [])
+
+    def test_index_refreshes_after_writes(self):
+        url = reverse("fetch-all-states-in-a-country", args=["Atlantiss"])
+        self.assertIn("no suggestions", self.client.get(url).json()["error"])
+        Country.objects.create(name="Atlantis", capital="Poseidonia", language="Greek", continent=Continent.objects.first())
+        self.assertIn("Did you mean 'Atlantis'?", self.client.get(url).json()["error"])
+
+
+class NameLookupTests(TestCase):
+
+    def setUp(self):
+        africa = Continent.objects.create(name="Africa")
+        ivory_coast = Country.objects.create(name="Côte d'Ivoire", capital="Yamoussoukro", language="French", continent=africa)
+        lagunes = State.objects.create(name="Lagunes", capital="Dabou", country=ivory_coast)
+        LocalGovernment.objects.create(name="Abidjan", state=lagunes)
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("  Côte   D'Ivoire "), "cote d'ivoire")
+        self.assertEqual(normalize_name("Straße"), "strasse")
+
+    def test_name_key_follows_name(self):
+        country = Country.objects.get(name="Côte d'Ivoire")
+        self.assertEqual(country.name_key, "cote d'ivoire")
+        country.name = "Ivory  Coast"
+        country.save(update_fields=["name"])
+        self.assertEqual(Country.objects.get(pk=country.pk).name_key, "ivory coast")
+
+    def test_lookups_ignore_case_accents_and_spacing(self):
+        urls = [
+            reverse("fetching-countries-by-continent", args=["AFRICA"]),
+            reverse("fetching-all-countries-available-and-searching-for-a-particular-country") + "?country=cote d'ivoire",
+            reverse("fetch-all-states-in-a-country", args=["COTE D'IVOIRE"]),
+            reverse("search-state-in-a-particular-country", args=["côte  d'ivoire"]) + "?state=lagunes",
+            reverse("get-all-local-governments-in-a-state", args=["Cote d'Ivoire", "LAGUNES"]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        build_world(continents=2, countries=2, states=3, local_governments=4)
+
+    def assert_counts_match(self):
+        for continent in Continent.objects.all():
+            self.assertEqual(continent.countries_count, continent.countries.count())
+        for country in Country.objects.all():
+            self.assertEqual(country.states_count, country.states.count())
+        for state in State.objects.all():
+            self.assertEqual(state.local_governments_count, state.local_governments.count())
+
+    def test_counts_follow_creates_moves_and_deletes(self):
+        self.assert_counts_match()
+        self.assertEqual(State.objects.get(name="State 0-0-0").local_governments_count, 4)
+
+        country = Country.objects.get(name="Country 0-0")
+        country.continent = Continent.objects.get(name="Continent 1")
+        country.save()
+        LocalGovernment.objects.filter(name="LGA 1-1-2-3").get().delete()
+        State.objects.get(name="State 1-0-0").delete()
+        Continent.objects.get(name="Continent 0").delete()
+        self.assert_counts_match()
+        self.assertEqual(Continent.objects.get(name="Continent 1").countries_count, 3)
+
+    def test_failed_save_leaves_counts_untouched(self):
+        state = State.objects.get(name="State 0-0-0")
+        with mock.patch("locations.signals.adjust", side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            LocalGovernment.objects.create(name="Half written", state=state)
+        self.assertFalse(LocalGovernment.objects.filter(name="Half written").exists())
+        self.assert_counts_match()
+
+    def test_recount_repairs_drift(self):
+        Country.objects.update(states_count=0)
+        recount(Country, Country.objects.filter(name="Country 0-0").values_list("pk", flat=True))
+        self.assertEqual(Country.objects.get(name="Country 0-0").states_count, 3)
+        self.assertEqual(Country.objects.get(name="Country 0-1").states_count, 0)
+        recount(Country)
+        self.assert_counts_match()
+
+    def test_list_endpoints_expose_counts(self):
+        continents = self.client.get(reverse("list-of-available-continents")).json()
+        self.assertEqual(continents["continents"][0]["countries_count"], 2)
+        countries = self.client.get(reverse("fetching-all-countries-available-and-searching-for-a-particular-country")).json()
+        self.assertEqual(countries["countries"][0]["states_count"], 3)
+        lgas = self.client.get(reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"])).json()
+        self.assertEqual(lgas["count"], 4)
+
+
+class KeysetPaginationTests(TestCase):
+    url = reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"])
+
+    def setUp(self):
+        build_world(continents=1, countries=2, states=1, local_governments=7)
+        # a name sorting between two existing ones, created last
+        LocalGovernment.objects.create(name="LGA 0-0-0-3a", state=State.objects.get(name="State 0-0-0"))
+
+    def walk(self, url, limit):
+        names, cursor = [], None
+        while True:
+            query = f"?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+            data = self.client.get(url + query).json()
+            names.extend(item["name"] for item in data[next(k for k in data if isinstance(data[k], list))])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                return names, data["count"]
+
+    def test_pages_cover_the_unpaginated_list(self):
+        full = self.client.get(self.url).json()
+        self.assertNotIn("next_cursor", full)
+        for limit in (1, 3, 8, 50):
+            names, count = self.walk(self.url, limit)
+            self.assertEqual(names, [lga["name"] for lga in full["local_governments"]])
+            self.assertEqual(count, 8)
+
+    def test_country_and_state_lists(self):
+        countries, count = self.walk(reverse("fetching-all-countries-available-and-searching-for-a-particular-country"), 1)
+        self.assertEqual((countries, count), (["Country 0-0", "Country 0-1"], 2))
+        states, _ = self.walk(reverse("fetch-all-states-in-a-country", args=["Country 0-1"]), 1)
+        self.assertEqual(states, ["State 0-1-0"])
+
+    def test_page_query_count_is_bounded(self):
+        state = State.objects.get(name="State 0-0-0")
+        last = LocalGovernment.objects.filter(state=state).order_by("name", "pk")[2]
+        # version, country, state and one seek for the page, plus the version again for the response cache
+        with self.assertNumQueries(4 + response_cache.options["CHECK_VERSION"]):
+            data = self.client.get(self.url + f"?limit=2&cursor={encode_cursor(last.name, last.pk)}").json()
+        self.assertEqual(len(data["local_governments"]), 2)
+
+    def test_invalid_parameters(self):
+        for query in ("?limit=0", "?limit=abc", "?limit=5000", "?limit=%C2%B2", "?cursor=not-a-cursor"):
+            with self.subTest(query=query):
+                response = self.client.get(self.url + query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+
+class StreamingRendererTests(TestCase):
+    url = reverse("all-continents-countries-states-sub-divisions")
+
+    def setUp(self):
+        build_world(continents=2, countries=3, states=2, local_governments=3)
+        # awkward values: no children, nulls, quotes, non-ASCII and line separators
+        empty = Continent.objects.create(name="Antarctica")
+        country = Country.objects.create(name='São "Tomé"', capital="São Tomé", language="Portuguese\u2028Forro",
+                                         currency=None, continent=empty)
+        State.objects.create(name="Água Grande", capital=None, country=country)
+        Country.objects.create(name="Nowhere", capital="-", language="-", continent=Continent.objects.get(name="Continent 1"))
+
+    def expected(self):
+        continents = serializer_data(ContinentSerializer, Continent.objects.order_by("pk"))
+        return JSONRenderer().render({"count": len(continents), "continents": continents})
+
+    def test_byte_compatible_with_serializers(self):
+        for flush_every in (1, 7, 4096):
+            with self.subTest(flush_every=flush_every):
+                chunks = list(planet_earth_chunks(chunk_size=5, flush_every=flush_every))
+                self.assertEqual(b"".join(chunks), self.expected())
+                if flush_every == 1:
+                    self.assertGreater(len(chunks), 1)
+
+    def test_query_count_is_fixed(self):
+        # one per table, in a savepoint of the test's transaction
+        with self.assertNumQueries(6):
+            b"".join(planet_earth_chunks(chunk_size=5))
+
+    def test_rows_left_over_raise(self):
+        peekable = streaming._Peekable
+        calls = []
+
+        def losing_a_state(rows):
+            rows = list(rows)
+            calls.append(rows)
+            # the states, without one, as a write between two unsnapshotted queries would leave them
+            return peekable(rows[1:] if len(calls) == 2 else rows)
+
+        with mock.patch.object(streaming, "_Peekable", losing_a_state), self.assertRaises(IncompleteDocument):
+            b"".join(planet_earth_chunks())
+
+    def test_streaming_mode(self):
+        with override_settings(PLANET_EARTH_MODE="stream"):
+            response = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), self.expected())
+
+        planet_earth_snapshot.invalidate()
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT="application/json").content, self.expected())
+
+
+class ImporterTests(TestCase):
+    csv_data = (
+        "continent,country,capital,currency,language,state,state_capital,local_government\n"
+        "Africa,Nigeria,Abuja,Naira,English,,,\n"
+        "Africa,Nigeria,,,,Lagos,Ikeja,\n"
+        "Africa,Nigeria,,,,Lagos,,Ikeja\n"
+        "Africa,Nigeria,,,,Lagos,,Surulere\n"
+        "Africa,Nigeria,,,,Oyo,,Surulere\n"
+        "Africa,Ghana,Accra,Cedi,English,,,\n"
+        "Europe,,,,,,,\n"
+    )
+
+    def write(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / name
+        path.write_text(content, encoding="utf-8")
+        return str(path)
+
+    def call(self, *args):
+        out = io.StringIO()
+        call_command("import_locations", *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import_is_idempotent(self):
+        path = self.write("world.csv", self.csv_data)
+        output = self.call(path)
+        self.assertIn("local government: 3 created, 0 updated, 0 unchanged", output)
+        self.assertEqual(Continent.objects.count(), 2)
+        nigeria = Country.objects.get(name_key="nigeria")
+        self.assertEqual((nigeria.capital, nigeria.states_count), ("Abuja", 2))
+        lagos = State.objects.get(name="Lagos")
+        self.assertEqual((lagos.capital, lagos.local_governments_count), ("Ikeja", 2))
+        self.assertEqual(Continent.objects.get(name="Africa").countries_count, 2)
+
+        output = self.call(path)
+        self.assertIn("local government: 0 created, 0 updated, 3 unchanged", output)
+        self.assertEqual(LocalGovernment.objects.count(), 3)
+
+    def test_updates_changed_attributes(self):
+        self.call(self.write("world.csv", self.csv_data))
+        path = self.write("update.ndjson", "\n".join([
+            json.dumps({"continent": "Africa", "country": "NIGERIA", "capital": "Lagos", "currency": "Naira"}),
+            json.dumps({"country": "Nigeria", "state": "Oyo", "state_capital": "Ibadan"}),
+            json.dumps({"continent": "Europe", "country": "Ghana"}),
+        ]))
+        output = self.call(path)
+        self.assertIn("country: 0 created, 2 updated, 0 unchanged", output)
+        self.assertEqual(Country.objects.get(name="Nigeria").capital, "Lagos")
+        self.assertEqual(State.objects.get(name="Oyo").capital, "Ibadan")
+        self.assertEqual(Continent.objects.get(name="Europe").countries_count, 1)
+        self.assertEqual(Continent.objects.get(name="Africa").countries_count, 1)
+
+    def test_planet_earth_document_round_trip(self):
+        build_world(continents=2, countries=2, states=2, local_governments=2)
+        document = self.client.get(reverse("all-continents-countries-states-sub-divisions"), HTTP_ACCEPT="application/json").content
+        Continent.objects.all().delete()
+        path = self.write("planet.json", document.decode())
+        self.call(path)
+        planet_earth_snapshot.invalidate()
+        self.assertEqual(
+            json.loads(self.client.get(reverse("all-continents-countries-states-sub-divisions"), HTTP_ACCEPT="application/json").content),
+            json.loads(document),
+        )
+
+    def test_dry_run_and_rejected_records(self):
+        path = self.write("bad.ndjson", "\n".join([
+            json.dumps({"continent": "Africa"}),
+            json.dumps({"country": "Atlantis"}),
+            json.dumps({"continent": ""}),
+        ]))
+        output = self.call(path, "--dry-run")
+        self.assertIn("continent: 1 created", output)
+        self.assertIn("Record 2: country 'Atlantis' does not exist", output)
+        self.assertIn("Record 3: 'continent' is empty", output)
+        self.assertFalse(Continent.objects.exists())
+
+    def test_records_keep_their_ids(self):
+        self.call(self.write("world.csv", self.csv_data))
+        africa = Continent.objects.get(name="Africa").pk
+        path = self.write("ids.ndjson", "\n".join([
+            json.dumps({"id": 7, "continent": "Africa"}),
+            json.dumps({"id": 11, "parent_id": africa, "continent": "Africa", "country": "Togo"}),
+            json.dumps({"id": "12", "parent_id": 11, "country": "Togo", "state": "Maritime"}),
+            json.dumps({"id": 13, "parent_id": 12, "country": "Togo", "state": "Maritime", "local_government": "Lomé"}),
+            json.dumps({"country": "Togo", "state": "Maritime", "local_government": "Golfe"}),
+            json.dumps({"id": "x", "continent": "Asia"}),
+            json.dumps({"id": 11, "continent": "Africa", "country": "Benin"}),
+            json.dumps({"id": 13, "country": "Togo", "state": "Maritime", "local_government": "Aného"}),
+        ]))
+        output = self.call(path)
+        self.assertIn("Record 6: 'id' is not an integer: 'x'", output)
+        self.assertIn("Record 7: id 11 is already used by another country", output)
+        self.assertIn("Local government 'Aného' of 'Maritime': id 13 is already used", output)
+        self.assertEqual(Continent.objects.get(name="Africa").pk, africa)
+        self.assertEqual([Country.objects.get(name="Togo").pk, State.objects.get(name="Maritime").pk,
+                          LocalGovernment.objects.get(name="Lomé").pk], [11, 12, 13])
+        self.assertNotIn(LocalGovernment.objects.get(name="Golfe").pk, (7, 11, 12, 13))
+
+    def test_adopts_rows_created_by_a_concurrent_import(self):
+        importer = Importer()
+        # written after the importer loaded the existing parents
+        africa = Continent.objects.create(name="Africa")
+        nigeria = Country.objects.create(name="Nigeria", capital="Abuja", language="English", continent=africa)
+        lagos = State.objects.create(name="Lagos", country=nigeria)
+        LocalGovernment.objects.create(name="Ikeja", state=lagos)
+
+        importer.run(read_records(self.write("world.csv", self.csv_data)))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual([model.objects.count() for model in (Continent, Country, State, LocalGovernment)], [2, 2, 2, 3])
+        self.assertEqual((importer.stats["country"].created, importer.stats["country"].unchanged), (1, 1))
+        self.assertEqual(sorted(lagos.local_governments.values_list("name", flat=True)), ["Ikeja", "Surulere"])
+        lagos.refresh_from_db()
+        self.assertEqual(lagos.local_governments_count, 2)
+        self.assertEqual(Country.objects.get(pk=nigeria.pk).states_count, 2)
+        self.assertEqual(Continent.objects.get(pk=africa.pk).countries_count, 2)
+
+    def test_dedupe_locations(self):
+        africa = Continent.objects.create(name="Africa")
+        nigeria = Country.objects.create(name="Nigeria", capital="Abuja", language="English", continent=africa)
+        lagos = State.objects.create(name="Lagos", country=nigeria)
+        LocalGovernment.objects.create(name="Ikeja", state=lagos)
+        # Duplicates as a database without the unique constraints holds them; here
+        # their stale name keys get them past the constraints.
+        twin = Country(name="NIGÉRIA", name_key="stale-1", capital="Abuja", language="English", continent=africa)
+        twin_lagos = State(name="lagos", name_key="stale-2", country=twin)
+        Country.objects.bulk_create([twin])
+        State.objects.bulk_create([twin_lagos])
+        LocalGovernment.objects.bulk_create([LocalGovernment(name="Ikeja ", name_key="stale-3", state=twin_lagos),
+                                             LocalGovernment(name="Surulere", name_key="surulere", state=twin_lagos)])
+
+        out = io.StringIO()
+        call_command("dedupe_locations", "--dry-run", stdout=out)
+        self.assertIn("Countries: 1 duplicates merged", out.getvalue())
+        self.assertIn("local governments: 1 duplicates merged", out.getvalue())
+        self.assertEqual(LocalGovernment.objects.count(), 3)
+
+        call_command("dedupe_locations", stdout=out)
+        self.assertEqual(list(Country.objects.values_list("pk", "name_key", "states_count")), [(nigeria.pk, "nigeria", 1)])
+        self.assertEqual(list(State.objects.values_list("pk", "local_governments_count")), [(lagos.pk, 2)])
+        self.assertEqual(sorted(LocalGovernment.objects.values_list("name_key", flat=True)), ["ikeja", "surulere"])
+        self.assertEqual(Continent.objects.get().countries_count, 1)
+
+    def test_batches_use_a_fixed_number_of_queries(self):
+        build_world(continents=1, countries=1, states=1, local_governments=0)
+        records = [{"country": "Country 0-0", "state": "State 0-0-0", "local_government": f"LGA {i}"} for i in range(100)]
+        importer = Importer(batch_size=1000)
+        # LGA keys, savepoint, insert, counters, version and savepoint release
+        with self.assertNumQueries(6):
+            importer.run(records)
+        self.assertEqual(State.objects.get().local_governments_count, 100)
+
+    def test_json_loader(self):
+        build_world(continents=1, countries=1, states=0, local_governments=0)
+        Country.objects.update(name="Nigeria", name_key="nigeria")
+        State.objects.create(name="Lagos", capital="Ikeja", country=Country.objects.get())
+        path = self.write("nigeria.json", json.dumps({"Lagos": ["Ikeja", "Surulere", "Ikeja"], "Kano": ["Dala"]}))
+        out = io.StringIO()
+        call_command("json_loader", path, stdout=out)
+        self.assertIn("State Kano does not exist", out.getvalue())
+        self.assertEqual(sorted(LocalGovernment.objects.values_list("name", flat=True)), ["Ikeja", "Surulere"])
+
+
+class WorldGeneratorTests(TestCase):
+    size = dict(continents=3, countries=12, states=40, local_governments=900)
+
+    def test_deterministic_with_exact_totals(self):
+        records = list(WorldGenerator(**self.size, seed=1).records())
+        self.assertEqual(records, list(WorldGenerator(**self.size, seed=1).records()))
+        self.assertNotEqual(records, list(WorldGenerator(**self.size, seed=2).records()))
+        deepest = [max((level for level in LEVELS if level in record), key=LEVELS.index) for record in records]
+        self.assertEqual({level: deepest.count(level) for level in set(deepest)},
+                         {"continent": 3, "country": 12, "state": 40, "local_government": 900})
+
+    def test_names_are_unique_per_parent_with_near_duplicates(self):
+        generator = WorldGenerator(near_duplicates=0.2)
+        names = generator.names(2000, random.Random(0))
+        self.assertEqual(len({normalize_name(name) for name in names}), 2000)
+        self.assertTrue(all(0 < len(name) <= 100 for name in names))
+        near = sum(bool(get_close_matches(name, names[:i], n=1, cutoff=0.85)) for i, name in enumerate(names))
+        self.assertGreater(near, 200)
+
+    def test_command_imports_the_world(self):
+        out = io.StringIO()
+        call_command("generate_world", *(f"--{key.replace('_', '-')}={value}" for key, value in self.size.items()),
+                     "--batch-size=250", stdout=out)
+        self.assertIn("local government: 900 created", out.getvalue())
+        self.assertEqual(
+            [model.objects.count() for model in (Continent, Country, State, LocalGovernment)], [3, 12, 40, 900]
+        )
+        self.assertEqual(sum(State.objects.values_list("local_governments_count", flat=True)), 900)
+        self.assertFalse(State.objects.filter(local_governments_count=0).exists())
+
+        call_command("generate_world", *(f"--{key.replace('_', '-')}={value}" for key, value in self.size.items()),
+                     stdout=out)
+        self.assertEqual(LocalGovernment.objects.count(), 900)
+
+
+@uncached
+class RendererProfileTests(TestCase):
+    url = reverse("list-of-available-continents")
+    browser = "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
+
+    def setUp(self):
+        build_world(continents=1, countries=1, states=1, local_governments=1)
+
+    def get_with_profile(self, profile):
+        # DRF binds the renderer classes when APIView is defined.
+        renderer_classes = [import_string(path) for path in settings.RENDERER_PROFILES[profile]]
+        with mock.patch.object(APIView, "renderer_classes", renderer_classes):
+            return self.client.get(self.url, HTTP_ACCEPT=self.browser)
+
+    @override_settings(STORAGES={"staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}})
+    def test_default_profile_serves_the_browsable_api(self):
+        self.assertEqual(self.get_with_profile("default")["Content-Type"], "text/html; charset=utf-8")
+
+    def test_production_profile_serves_json_only(self):
+        response = self.get_with_profile("production")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()["count"], 1)
+
+
+@uncached
+class SparseFieldsTests(TestCase):
+
+    def setUp(self):
+        build_world(continents=2, countries=2, states=2, local_governments=2)
+        planet_earth_snapshot.invalidate()
+
+    def get(self, url, status=200):
+        response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def test_parse_fields(self):
+        self.assertIsNone(parse_fields(" , "))
+        self.assertEqual(parse_fields("name, states.name,states.local_governments"),
+                         {"name": None, "states": {"name": None, "local_governments": None}})
+        # a whole field wins over its subfields, in any order
+        self.assertEqual(parse_fields("states,states.name"), {"states": None})
+        self.assertEqual(parse_fields("states.name,states"), {"states": None})
+        with self.assertRaises(InvalidFields):
+            parse_fields("states..name")
+
+    def test_output_is_restricted(self):
+        data = self.get(reverse("fetch-all-states-in-a-country", args=["Country 0-0"]) + "?fields=name")
+        self.assertEqual(data["states"], [{"name": "State 0-0-0"}, {"name": "State 0-0-1"}])
+
+        data = self.get(reverse("all-continents-countries-states-sub-divisions")
+                        + "?fields=countries.name,countries.states.local_governments.name")
+        self.assertEqual(data["continents"][0], {"countries": [
+            {"name": f"Country 0-{n}", "states": [
+                {"local_governments": [{"name": f"LGA 0-{n}-{s}-{lg}"} for lg in range(2)]} for s in range(2)
+            ]} for n in range(2)
+        ]})
+
+    def test_unknown_fields_are_rejected(self):
+        url = reverse("fetching-countries-by-continent", args=["Continent 0"])
+        for fields, message in (
+            ("nam", "Unknown field 'nam'. Available fields: continent, name, capital, currency, language, states"),
+            ("states.mayor", "Unknown field 'states.mayor'. Available fields: states.name, states.capital, "
+                             "states.local_governments"),
+            ("name.first", "Field 'name' has no nested fields"),
+        ):
+            with self.subTest(fields=fields):
+                self.assertEqual(self.get(f"{url}?fields={fields}", status=400), {"error": message})
+
+    def test_unselected_relations_and_columns_are_not_loaded(self):
+        states = reverse("fetch-all-states-in-a-country", args=["Country 0-0"])
+        countries = reverse("fetching-countries-by-continent", args=["Continent 0"])
+        for url, expected in ((states + "?fields=name", 3), (countries + "?fields=name,capital", 3),
+                              (countries + "?fields=name,states.name", 4)):
+            with self.subTest(url=url), self.assertNumQueries(expected):
+                self.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get(countries + "?fields=capital")
+        sql = queries[-1]["sql"]
+        self.assertIn('"capital"', sql)
+        self.assertNotIn('"currency"', sql)
+        self.assertNotIn('"locations_continent"', sql)
+
+
+class LeanSerializationTests(TestCase):
+    """``lean.serialize`` renders exactly what the DRF serializers render."""
+
+    def setUp(self):
+        build_world(continents=2, countries=2, states=2, local_governments=2)
+        empty = Continent.objects.create(name="Antarctica")
+        country = Country.objects.create(name='São "Tomé"', capital="São Tomé", language="Portuguese\u2028Forro",
+                                         currency=None, continent=empty)
+        State.objects.create(name="Água Grande", capital=None, country=country)
+
+    def assert_same(self, serializer_class, queryset, fields=None):
+        expected = serializer_data(serializer_class, queryset, fields)
+        rows = values_of(queryset, serializer_class, fields)
+        self.assertEqual(JSONRenderer().render(serialize(rows, serializer_class, fields)), JSONRenderer().render(expected))
+        self.assertEqual(async_to_sync(lean.aserialize)(list(rows), serializer_class, fields), serialize(rows, serializer_class, fields))
+
+    def test_matches_the_serializers(self):
+        cases = [
+            (ContinentSerializer, Continent.objects.order_by("pk")),
+            (ContinentOnlySerializer, Continent.objects.order_by("pk")),
+            (CountrySerializer, Country.objects.order_by("name")),
+            (CountryOnlySerializer, Country.objects.order_by("name")),
+            (StateSerializer, State.objects.order_by("name")),
+            (LocalGovernmentSerializer, LocalGovernment.objects.order_by("name")),
+        ]
+        for serializer_class, queryset in cases:
+            for fields in (None, {"name": None}):
+                with self.subTest(serializer=serializer_class.__name__, fields=fields):
+                    self.assert_same(serializer_class, queryset, fields)
+
+        self.assert_same(ContinentSerializer, Continent.objects.order_by("pk"),
+                         parse_fields("countries.continent,countries.states.local_governments"))
+        self.assert_same(CountrySerializer, Country.objects.order_by("name"), parse_fields("currency,states.capital"))
+
+    def test_one_query_per_level(self):
+        continents = Continent.objects.order_by("pk")
+        with self.assertNumQueries(4):
+            serialize(values_of(continents, ContinentSerializer), ContinentSerializer)
+        fields = parse_fields("name,countries.name")
+        with self.assertNumQueries(2):
+            serialize(values_of(continents, ContinentSerializer, fields), ContinentSerializer, fields)
+        with self.assertNumQueries(0):
+            self.assertEqual(serialize([], CountrySerializer), [])
+
+    def test_shapes_are_compiled_once(self):
+        fields = parse_fields("name,states.name")
+        self.assertIs(lean.shape_of(CountrySerializer, fields), lean.shape_of(CountrySerializer, parse_fields("states.name,name")))
+        self.assertEqual(lean.shape_of(CountrySerializer, fields).columns, ["name"])
+
+
+class AsyncURLConf:
+    urlpatterns = [path("api/v1/", include(location_patterns(async_views)))]
+
+
+@uncached
+class AsyncViewTests(TestCase):
+    """The async views answer every request exactly like the DRF views."""
+
+    def setUp(self):
+        build_world(continents=2, countries=3, states=2, local_governments=3)
+        country = Country.objects.create(name="Côte d'Ivoire", capital="Yamoussoukro", language="French",
+                                         currency=None, continent=Continent.objects.get(name="Continent 1"))
+        State.objects.create(name="Abidjan", capital=None, country=country)
+        planet_earth_snapshot.invalidate()
+        suggestion_index.clear()
+
+    def urls(self):
+        lgas = reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"])
+        states = reverse("fetch-all-states-in-a-country", args=["Country 0-1"])
+        countries = reverse("fetching-all-countries-available-and-searching-for-a-particular-country")
+        return [
+            reverse("all-continents-countries-states-sub-divisions"),
+            reverse("list-of-available-continents"),
+            reverse("fetching-countries-by-continent", args=["continent 1"]),
+            reverse("fetching-countries-by-continent", args=["Continant 1"]),
+            countries, countries + "?country=cote d'ivoire", countries + "?country=Contry 0-1",
+            countries + "?limit=2", countries + "?limit=0",
+            states, states + "?limit=1", reverse("fetch-all-states-in-a-country", args=["Countri 0-1"]),
+            reverse("search-state-in-a-particular-country", args=["Country 0-1"]) + "?state=state 0-1-1",
+            reverse("search-state-in-a-particular-country", args=["Country 0-1"]) + "?state=Stat 0-1-1",
+            reverse("search-state-in-a-particular-country", args=["Country 0-1"]),
+            lgas, lgas + "?limit=2", lgas + "?cursor=bad",
+            reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "Stat 0-0-0"]),
+            reverse("all-continents-countries-states-sub-divisions") + "?fields=name,countries.states.name",
+            reverse("list-of-available-continents") + "?fields=countries_count",
+            reverse("fetching-countries-by-continent", args=["continent 1"]) + "?fields=name,states.local_governments",
+            countries + "?fields=continent,capital&limit=2", countries + "?country=cote d'ivoire&fields=currency,states",
+            countries + "?fields=states", states + "?fields=capital&limit=1", states + "?fields=name.first",
+            reverse("search-state-in-a-particular-country", args=["Country 0-1"]) + "?state=state 0-1-1&fields=name",
+            lgas + "?fields=name&limit=2",
+        ]
+
+    async def test_responses_match_the_sync_views(self):
+        urls = self.urls()
+        expected = []
+        for url in urls:
+            response = await self.async_client.get(url, headers={"accept": "application/json"})
+            expected.append((response.status_code, response.content, response.get("ETag")))
+
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            for url, (status, content, etag) in zip(urls, expected):
+                with self.subTest(url=url):
+                    response = await self.async_client.get(url, headers={"accept": "application/json"})
+                    self.assertEqual((response.status_code, response.content), (status, content))
+                    self.assertEqual(response.get("ETag"), etag)
+                    if etag:
+                        revalidated = await self.async_client.get(url, headers={"accept": "application/json", "if-none-match": etag})
+                        self.assertEqual(revalidated.status_code, 304)
+
+    async def test_cursor_walk(self):
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            url = reverse("fetching-all-countries-available-and-searching-for-a-particular-country")
+            names, cursor = [], ""
+            while cursor is not None:
+                data = json.loads((await self.async_client.get(f"{url}?limit=4&cursor={cursor}")).content)
+                names.extend(country["name"] for country in data["countries"])
+                cursor = data["next_cursor"]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 7)
+
+    @override_settings(PLANET_EARTH_MODE="stream", ROOT_URLCONF=AsyncURLConf)
+    async def test_streamed_planet_earth(self):
+        response = await self.async_client.get(reverse("all-continents-countries-states-sub-divisions"))
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body, await sync_to_async(b"".join)(planet_earth_chunks()))
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        build_world(continents=2, countries=2, states=2, local_governments=2)
+        response_cache.clear()
+        response_cache.reset_stats()
+
+    def lgas(self, country="Country 0-0", state="State 0-0-0"):
+        return reverse("get-all-local-governments-in-a-state", args=[country, state])
+
+    def hit_queries(self):
+        # the data version, with a per-process backend
+        return 1 if response_cache.options["CHECK_VERSION"] else 0
+
+    def assertCached(self, url, cached=True):
+        with self.assertNumQueries(self.hit_queries()) if cached else nullcontext():
+            response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response["X-Cache"], "HIT" if cached else "MISS", url)
+        return response
+
+    def test_hits_skip_the_views(self):
+        first = self.assertCached(self.lgas(), cached=False)
+        second = self.assertCached(self.lgas())
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        with self.assertNumQueries(self.hit_queries()):
+            revalidated = self.client.get(self.lgas(), HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+        # another representation is another entry
+        self.assertEqual(self.client.get(self.lgas(), HTTP_ACCEPT="application/json; indent=2")["X-Cache"], "MISS")
+        self.assertEqual(response_cache.stats()["hits"], 2)
+
+    # every write bumps the data version, so a per-process backend misses them all
+    @override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, "CHECK_VERSION": False})
+    def test_writes_invalidate_only_their_scopes(self):
+        countries = reverse("fetching-all-countries-available-and-searching-for-a-particular-country")
+        urls = {
+            "lgas": self.lgas(),
+            "sibling lgas": self.lgas(state="State 0-0-1"),
+            "states": reverse("fetch-all-states-in-a-country", args=["Country 0-0"]),
+            "other states": reverse("fetch-all-states-in-a-country", args=["Country 0-1"]),
+            "continent": reverse("fetching-countries-by-continent", args=["Continent 0"]),
+            "other continent": reverse("fetching-countries-by-continent", args=["Continent 1"]),
+            "countries": countries,
+            "continents": reverse("list-of-available-continents"),
+            "planet": reverse("all-continents-countries-states-sub-divisions"),
+        }
+        for url in urls.values():
+            self.assertCached(url, cached=False)
+
+        LocalGovernment.objects.create(name="Fresh LGA", state=State.objects.get(name="State 0-0-0"))
+        for name in ("lgas", "states", "continent", "planet"):
+            self.assertCached(urls[name], cached=False)
+        for name in ("sibling lgas", "other states", "other continent", "countries", "continents"):
+            self.assertCached(urls[name])
+        self.assertIn("Fresh LGA", self.client.get(urls["lgas"]).content.decode())
+
+        state = State.objects.get(name="State 0-1-0")
+        state.capital = "Elsewhere"
+        state.save()
+        self.assertCached(urls["other states"], cached=False)
+        self.assertCached(urls["countries"])
+
+        State.objects.create(name="New State", country=Country.objects.get(name="Country 0-1"))
+        self.assertCached(urls["countries"], cached=False)
+        self.assertCached(urls["continents"])
+
+        Continent.objects.filter(name="Continent 1").first().save()
+        for url in urls.values():
+            self.assertCached(url, cached=False)
+
+    def test_not_found_responses_follow_the_names(self):
+        url = self.lgas(state="Atlantis")
+        self.assertEqual(self.assertCached(url, cached=False).status_code, 404)
+        self.assertEqual(self.assertCached(url).status_code, 404)
+        State.objects.create(name="Atlantis", country=Country.objects.get(name="Country 0-0"))
+        self.assertEqual(self.assertCached(url, cached=False).status_code, 200)
+
+        country = Country.objects.get(name="Country 0-1")
+        old, new = self.lgas("Country 0-1", "State 0-1-0"), self.lgas("Renamed", "State 0-1-0")
+        self.assertCached(old, cached=False)
+        self.assertEqual(self.assertCached(new, cached=False).status_code, 404)
+        country.name = "Renamed"
+        country.save()
+        self.assertEqual(self.assertCached(old, cached=False).status_code, 404)
+        self.assertEqual(self.assertCached(new, cached=False).status_code, 200)
+
+    def test_bulk_writes_invalidate_everything(self):
+        url = reverse("list-of-available-continents")
+        self.assertCached(url, cached=False)
+        Importer().run([{"continent": "Oceania"}])
+        self.assertIn("Oceania", self.assertCached(url, cached=False).content.decode())
+
+    def test_writes_of_other_processes(self):
+        url = reverse("list-of-available-continents")
+        self.assertCached(url, cached=False)
+        self.assertCached(url)
+        # all that a write made by another worker or a command leaves in this process
+        DataVersion.bump()
+        self.assertCached(url, cached=False)
+        self.assertCached(url)
+
+        # a shared backend sees their invalidations instead
+        with self.settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, "CHECK_VERSION": False}):
+            self.assertCached(url, cached=False)
+            DataVersion.bump()
+            self.assertCached(url)
+
+    @override_settings(RESPONSE_CACHE=None)
+    def test_disabled(self):
+        self.assertFalse(self.client.get(self.lgas()).has_header("X-Cache"))
+
+    async def test_async_views(self):
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            first = await self.async_client.get(self.lgas())
+            second = await self.async_client.get(self.lgas())
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(first.content, second.content)
+
+
+def server_timing(response):
+    return dict(entry.split(";", 1) for entry in response["Server-Timing"].split(", "))
+
+
+@uncached
+class ServerTimingTests(TestCase):
+    url = reverse("list-of-available-continents")
+
+    def setUp(self):
+        build_world(continents=2, countries=2, states=1, local_governments=1)
+        fresh = metrics.Registry()
+        fresh.collectors = metrics.registry.collectors
+        registry = mock.patch.object(metrics, "registry", fresh)
+        registry.start()
+        self.addCleanup(registry.stop)
+
+    def test_phases_and_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        phases = server_timing(response)
+        self.assertEqual(list(phases), ["db", "serialize", "render", "app", "total"])
+        self.assertTrue(phases["db"].endswith(f'desc="{len(queries)} queries"'))
+
+    def test_metrics_endpoint(self):
+        self.client.get(self.url, HTTP_ACCEPT="application/json")
+        self.client.get(reverse("fetching-countries-by-continent", args=["nowhere"]), HTTP_ACCEPT="application/json")
+        exported = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('http_requests_total{route="api/v1/continents",method="GET",status="200"} 1\n', exported)
+        self.assertIn('http_requests_total{route="api/v1/continents/<str:continent_name>/countries",method="GET",status="404"} 1\n',
+                      exported)
+        self.assertIn('http_request_phase_seconds_count{route="api/v1/continents",phase="serialize"} 1\n', exported)
+        self.assertIn("response_cache_hits_total ", exported)
+
+    def test_unsampled_requests_are_counted_only(self):
+        with override_settings(METRICS={**settings.METRICS, "SAMPLE_RATE": 0}):
+            response = self.client.get(self.url, HTTP_ACCEPT="application/json")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(metrics.registry.values["requests"], {"api/v1/continents\tGET\t200": 1})
+        self.assertEqual(metrics.registry.values["phases"], {})
+
+    def test_disabled(self):
+        with override_settings(METRICS=None):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+    async def test_async_views(self):
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            response = await self.async_client.get(self.url)
+        self.assertEqual(list(server_timing(response)), ["db", "serialize", "render", "app", "total"])
+
+
+def build_places():
+    """A few places sharing names and prefixes, two Lagos among them."""
+    africa = Continent.objects.create(name="Africa")
+    europe = Continent.objects.create(name="Europe")
+    nigeria = Country.objects.create(name="Nigeria", capital="Abuja", language="English", continent=africa)
+    Country.objects.create(name="Niger", capital="Niamey", language="French", continent=africa)
+    ivory_coast = Country.objects.create(name="Côte d'Ivoire", capital="Yamoussoukro", language="French",
+                                         continent=africa)
+    portugal = Country.objects.create(name="Portugal", capital="Lisbon", language="Portuguese", continent=europe)
+    lagos = State.objects.create(name="Lagos", country=nigeria)
+    faro = State.objects.create(name="Faro", country=portugal)
+    State.objects.create(name="Abidjan", country=ivory_coast)
+    for name in ("Lagos Island", "Ikeja", "Lagos Mainland"):
+        LocalGovernment.objects.create(name=name, state=lagos)
+    LocalGovernment.objects.create(name="Lagos", state=faro)
+
+
+@uncached
+class SearchTests(TestCase):
+    url = reverse("search-places")
+
+    def setUp(self):
+        build_places()
+        search_index.clear()
+
+    def names(self, query, **options):
+        return [(result["level"], result["name"]) for result in search_index.search(query, **options)]
+
+    def test_ranking_and_paths(self):
+        self.assertEqual(search_index.search("  LAGOS ")[:2], [
+            {"name": "Lagos", "level": "state", "path": ["Africa", "Nigeria", "Lagos"]},
+            {"name": "Lagos", "level": "local_government", "path": ["Europe", "Portugal", "Faro", "Lagos"]},
+        ])
+        self.assertEqual(self.names("lagos")[2:], [("local_government", "Lagos Island"),
+                                                   ("local_government", "Lagos Mainland")])
+        self.assertEqual(self.names("island lagos"), [("local_government", "Lagos Island")])
+        self.assertEqual(self.names("cote d ivoire"), [("country", "Côte d'Ivoire")])
+        self.assertEqual(self.names("lagos", limit=1), [("state", "Lagos")])
+        self.assertEqual(self.names("lagos atlantis"), [])
+
+    def test_filters(self):
+        self.assertEqual(self.names("lagos", levels=["state", "country"]), [("state", "Lagos")])
+        self.assertEqual(self.names("lagos", parent="portugal"), [("local_government", "Lagos")])
+        self.assertEqual(self.names("lagos", parent="Africa", levels=["local_government"]),
+                         [("local_government", "Lagos Island"), ("local_government", "Lagos Mainland")])
+        self.assertEqual(self.names("lagos", parent="Lagos Island"), [])
+
+    def test_parse_search(self):
+        self.assertEqual(parse_search({"q": " lagos ", "level": "state,local_government", "limit": "5"}),
+                         ("lagos", ["state", "local_government"], None, 5))
+        for params in ({}, {"q": " - "}, {"q": "lagos", "level": "city"}, {"q": "lagos", "limit": "0"},
+                       {"q": "lagos", "limit": "many"}):
+            with self.subTest(params=params), self.assertRaises(InvalidSearch):
+                parse_search(params)
+
+    def test_writes_in_this_process_are_applied_incrementally(self):
+        search_index.search("lagos")
+        with mock.patch.object(search_index, "_build", side_effect=AssertionError("rebuilt")):
+            with self.captureOnCommitCallbacks(execute=True):
+                ikeja = LocalGovernment.objects.get(name="Ikeja")
+                ikeja.name = "Lagos Ikeja"
+                ikeja.save()
+                LocalGovernment.objects.filter(name="Lagos Mainland").get().delete()
+                faro = State.objects.get(name="Faro")
+                faro.name = "Faro District"
+                faro.save()
+            self.assertEqual(self.names("lagos", parent="africa"), [
+                ("state", "Lagos"), ("local_government", "Lagos Ikeja"), ("local_government", "Lagos Island"),
+            ])
+            self.assertEqual(self.names("ikeja"), [("local_government", "Lagos Ikeja")])
+            self.assertEqual(search_index.search("lagos", parent="Faro District")[0]["path"],
+                             ["Europe", "Portugal", "Faro District", "Lagos"])
+
+    def test_writes_of_other_processes_are_caught_up(self):
+        search_index.search("lagos")
+        faro = State.objects.get(name="Faro")
+        with mock.patch.object(search_index, "_build", side_effect=AssertionError("rebuilt")):
+            # bulk inserts skip the signals, like writes made by another process
+            LocalGovernment.objects.bulk_create([LocalGovernment(name="Lagos Norte", name_key="lagos norte", state=faro)])
+            DataVersion.bump()
+            self.assertIn(("local_government", "Lagos Norte"), self.names("lagos"))
+
+            # a renamed LGA is found by its id, not under its new words
+            LocalGovernment.objects.filter(name="Ikeja").update(name="Alausa", name_key="alausa",
+                                                                  date_updated=timezone.now())
+            DataVersion.bump()
+            self.assertEqual(self.names("alausa"), [("local_government", "Alausa")])
+            self.assertEqual(self.names("ikeja"), [])
+
+        # rows deleted elsewhere only show in the counts; the index is rebuilt
+        LocalGovernment.objects.filter(name="Lagos Norte")._raw_delete(connection.alias)
+        DataVersion.bump()
+        with mock.patch.object(search_index, "_build", wraps=search_index._build) as build:
+            self.assertNotIn(("local_government", "Lagos Norte"), self.names("lagos"))
+        build.assert_called_once()
+
+    def test_view(self):
+        response = self.client.get(self.url, {"q": "lagos", "level": "local_government", "limit": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"query": "lagos", "count": 2, "results": [
+            {"name": "Lagos", "level": "local_government", "path": ["Europe", "Portugal", "Faro", "Lagos"]},
+            {"name": "Lagos Island", "level": "local_government", "path": ["Africa", "Nigeria", "Lagos", "Lagos Island"]},
+        ]})
+        self.assertEqual(self.client.get(self.url).json(), {"error": "q parameter is missing"})
+        self.assertEqual(self.client.get(self.url, {"q": "lagos", "level": "city"}).status_code, 400)
+
+    async def test_async_view(self):
+        params = {"q": "lagos", "parent": "nigeria"}
+        expected = await self.async_client.get(self.url, params, headers={"accept": "application/json"})
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            response = await self.async_client.get(self.url, params)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual((await self.async_client.get(self.url, {"q": ""})).status_code, 400)
+
+
+@uncached
+@mock.patch.object(autocomplete_module.Autocomplete, "background", False)
+class AutocompleteTests(TestCase):
+    url = reverse("autocomplete-places")
+
+    def setUp(self):
+        build_places()
+        autocomplete.clear()
+
+    def names(self, prefix, **options):
+        return [(result["level"], result["name"]) for result in autocomplete.complete(prefix, **options)]
+
+    def test_prefixes(self):
+        self.assertEqual(self.names("NIG"), [("country", "Niger"), ("country", "Nigeria")])
+        self.assertEqual(self.names("cô"), [("country", "Côte d'Ivoire")])
+        self.assertEqual(self.names("Lagos "), [
+            ("state", "Lagos"), ("local_government", "Lagos"),
+            ("local_government", "Lagos Island"), ("local_government", "Lagos Mainland"),
+        ])
+        self.assertEqual(autocomplete.complete("lagos i"), [
+            {"name": "Lagos Island", "level": "local_government", "path": ["Africa", "Nigeria", "Lagos", "Lagos Island"]},
+        ])
+        self.assertEqual(self.names("la", levels=["local_government"], limit=2),
+                         [("local_government", "Lagos"), ("local_government", "Lagos Island")])
+        self.assertEqual(self.names("lagos x"), [])
+
+    def test_scopes(self):
+        self.assertEqual(self.names("", country="nigeria"), [
+            ("state", "Lagos"), ("local_government", "Ikeja"),
+            ("local_government", "Lagos Island"), ("local_government", "Lagos Mainland"),
+        ])
+        self.assertEqual(self.names("la", country="Portugal", state="FARO"), [("local_government", "Lagos")])
+        with self.assertRaises(autocomplete_module.UnknownParent):
+            autocomplete.complete("la", country="Nigeria", state="Faro")
+
+    def test_busy_prefixes_match_ranking_on_request(self):
+        version = DataVersion.current()
+        with mock.patch.object(autocomplete_module, "BUSY", 0):
+            precomputed = Places(version)
+        ranked = Places(version)
+        self.assertTrue(precomputed.tables["local_government", None].busy)
+        self.assertFalse(ranked.tables["local_government", None].busy)
+        keys = [ranked.keys[position] for position in range(len(ranked.keys))]
+        for prefix in {key[:size] for key in keys for size in range(len(key) + 1)}:
+            for country, state in ((None, None), ("nigeria", None), ("portugal", "faro")):
+                self.assertEqual(precomputed.complete(prefix, country=country, state=state),
+                                 ranked.complete(prefix, country=country, state=state))
+
+    def test_data_changes(self):
+        autocomplete.complete("ik")
+        LocalGovernment.objects.create(name="Ikorodu", state=State.objects.get(name="Lagos"))
+        self.assertEqual(self.names("ik"), [("local_government", "Ikeja"), ("local_government", "Ikorodu")])
+
+    def test_background_rebuild(self):
+        stale = autocomplete.places(DataVersion.current())
+        LocalGovernment.objects.create(name="Ikorodu", state=State.objects.get(name="Lagos"))
+        version = DataVersion.current()
+        with mock.patch.object(autocomplete_module.Autocomplete, "background", True), \
+                mock.patch.object(autocomplete_module, "Places") as places:
+            self.assertIs(autocomplete.places(version), stale)
+            autocomplete._building.join()
+            places.assert_called_once_with(version)
+            self.assertIs(autocomplete.places(version), places.return_value)
+
+    def test_stale_snapshot_keeps_its_validators(self):
+        response = self.client.get(self.url, {"q": "Zz"})
+        etag = response["ETag"]
+        self.assertEqual(response.json()["results"], [])
+        LocalGovernment.objects.create(name="Zzyzx", state=State.objects.get(name="Lagos"))
+
+        self.addCleanup(setattr, autocomplete, "_building", None)
+        # the rebuild never finishes, so the previous snapshot answers
+        with mock.patch.object(autocomplete_module.Autocomplete, "background", True), \
+                mock.patch.object(autocomplete, "_rebuild"):
+            response = self.client.get(self.url, {"q": "Zz"})
+            self.assertEqual((response.json()["results"], response["ETag"]), ([], etag))
+            with override_settings(ROOT_URLCONF=AsyncURLConf):
+                response = async_to_sync(self.async_client.get)(self.url, {"q": "Zz"})
+            self.assertEqual((response.json()["results"], response["ETag"]), ([], etag))
+
+        response = self.client.get(self.url, {"q": "Zz"}, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["name"], "Zzyzx")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_parse_completion(self):
+        self.assertEqual(parse_completion({"q": "la", "country": " Nigeria "}),
+                         ("la", ["state", "local_government"], "Nigeria", None, 10))
+        for params in ({"q": "la", "state": "Lagos"}, {"q": "la", "country": "Nigeria", "level": "country"},
+                       {"q": "la", "limit": "50"}):
+            with self.subTest(params=params), self.assertRaises(InvalidCompletion):
+                parse_completion(params)
+
+    def test_view(self):
+        response = self.client.get(self.url, {"q": "ik", "country": "Nigeria", "state": "Lagos"})
+        self.assertEqual(response.json(), {"query": "ik", "count": 1, "results": [
+            {"name": "Ikeja", "level": "local_government", "path": ["Africa", "Nigeria", "Lagos", "Ikeja"]},
+        ]})
+        response = self.client.get(self.url, {"q": "ik", "country": "Nigerai"})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["suggestions"][0], "Nigeria")
+        response = self.client.get(self.url, {"q": "ik", "country": "Nigeria", "state": "Lagso"})
+        self.assertEqual(response.json()["suggestions"], ["Lagos"])
+
+    async def test_async_view(self):
+        cases = [{"q": "la"}, {"q": "", "country": "nigeria"}, {"q": "i", "country": "Nigeria", "state": "Lagso"},
+                 {"q": "i", "limit": "0"}]
+        expected = [await self.async_client.get(self.url, params, headers={"accept": "application/json"})
+                    for params in cases]
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            for params, sync_response in zip(cases, expected):
+                with self.subTest(params=params):
+                    response = await self.async_client.get(self.url, params)
+                    self.assertEqual((response.status_code, response.content),
+                                     (sync_response.status_code, sync_response.content))
+
+
+@uncached
+class ResolveTests(TestCase):
+    url = reverse("resolve-places")
+
+    def setUp(self):
+        build_places()
+        suggestion_index.clear()
+
+    def place(self, model, name):
+        place = model.objects.get(name=name) if model is not LocalGovernment else model.objects.get(
+            name=name, state__name="Lagos")
+        return {"id": place.pk, "name": place.name}
+
+    def test_resolve(self):
+        nigeria, lagos = self.place(Country, "Nigeria"), self.place(State, "Lagos")
+        items = [
+            {"country": "NIGERIA", "state": " lagos", "local_government": "ikeja"},
+            ["cote d'ivoire"],
+            {"country": "Nigerai"},
+            {"country": "Nigeria", "state": "Lagso"},
+            ["Nigeria", "Lagos", "Ikejaa"],
+            {"country": "Portugal", "state": "Faro", "local_government": "Lagos"},
+            {"state": "Lagos"},
+            "Nigeria",
+        ]
+        resolver = Resolver()
+        # one query per level, then one per scope suggestions are looked for in
+        with self.assertNumQueries(3 + 3):
+            results = resolver.resolve(items)
+        self.assertEqual(results[0], {"country": nigeria, "state": lagos, "local_government": self.place(LocalGovernment, "Ikeja")})
+        self.assertEqual(results[1], {"country": self.place(Country, "Côte d'Ivoire")})
+        self.assertEqual(results[2], {"not_found": "country", "error": "Country 'Nigerai' isn't found. Did you mean 'Nigeria'?",
+                                      "suggestions": ["Nigeria", "Niger"]})
+        self.assertEqual(results[3], {"country": nigeria, "not_found": "state", "suggestions": ["Lagos"],
+                                      "error": "State 'Lagso' in 'Nigeria' isn't found. Did you mean 'Lagos'?"})
+        self.assertEqual(results[4]["state"], lagos)
+        self.assertEqual(results[4]["suggestions"], ["Ikeja"])
+        self.assertEqual(results[4]["error"], "Local government 'Ikejaa' in 'Lagos' isn't found. Did you mean 'Ikeja'?")
+        self.assertEqual(results[5]["local_government"]["name"], "Lagos")
+        self.assertEqual(results[6], {"error": "country is missing"})
+        self.assertEqual(results[7]["error"], "An item is an object with country, state and local_government names")
+
+    def test_queries_per_batch(self):
+        items = [["Nigeria", "Lagos", "Ikeja"], ["Portugal", "Faro", "Lagos"]] * 5
+        resolver = Resolver()
+        with mock.patch.object(resolver_module, "BATCH_SIZE", 4), self.assertNumQueries(3 * 3):
+            results = resolver.resolve(items)
+        self.assertEqual([result["local_government"]["name"] for result in results], ["Ikeja", "Lagos"] * 5)
+
+    def test_parse_item(self):
+        self.assertEqual(parse_item({"country": "Nigeria", "state": " ", "local_government": None}),
+                         ("Nigeria", None, None))
+        for item in ({"country": "Nigeria", "local_government": "Ikeja"}, ["a", "b", "c", "d"], [],
+                     {"country": 1}, {"country": ""}):
+            with self.subTest(item=item), self.assertRaises(InvalidItem):
+                parse_item(item)
+
+    def test_view(self):
+        response = self.client.post(self.url, {"items": [["nigeria", "lagos"], ["Nigeria", "Lagso"]]},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["count"], data["found"]), (2, 1))
+        self.assertEqual(data["results"][0]["state"], self.place(State, "Lagos"))
+        self.assertEqual(self.client.post(self.url, [["Nigeria"]], content_type="application/json").json()["found"], 1)
+        for body in ('{"items": 1}', "{", f'[{", ".join(["[]"] * (resolver_module.MAX_ITEMS + 1))}]'):
+            with self.subTest(body=body[:20]):
+                response = self.client.post(self.url, body, content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+    def test_ndjson(self):
+        lines = ['{"country": "Nigeria", "state": "Lagos", "local_government": "Lagos Island"}', "",
+                 '["Portugal", "Faro", "Lagos"]', "not json", '["Nigerai"]'] * 3
+        with mock.patch.object(resolver_module, "BATCH_SIZE", 2):
+            response = self.client.post(self.url, "\n".join(lines), content_type="application/x-ndjson")
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 6)
+        results = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[0]["local_government"]["name"], "Lagos Island")
+        self.assertEqual(results[1]["country"]["name"], "Portugal")
+        self.assertEqual([results[2], results[6]], [{"error": "Line 4 is not valid JSON"},
+                                                   {"error": "Line 9 is not valid JSON"}])
+        self.assertEqual(results[3]["not_found"], "country")
+
+    async def test_async_view(self):
+        cases = [
+            ("application/json", json.dumps({"items": [["Nigeria", "Lagos", "Ikeja"], ["Portugal", "Fero"], ["x"]]})),
+            ("application/json", json.dumps([{"state": "Lagos"}])),
+            ("application/json", "{"),
+            ("application/x-ndjson", '["Nigeria", "Lagos"]\n\n{"country": "Niger"}\n[1]\n'),
+        ]
+
+        async def post(content_type, body):
+            response = await self.async_client.post(self.url, body, content_type=content_type)
+            if not response.streaming:
+                return response.status_code, response.content
+            if response.is_async:
+                return response.status_code, b"".join([chunk async for chunk in response.streaming_content])
+            return response.status_code, await sync_to_async(b"".join)(response.streaming_content)
+
+        expected = [await post(*case) for case in cases]
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            for case, sync_response in zip(cases, expected):
+                with self.subTest(case=case):
+                    self.assertEqual(await post(*case), sync_response)
+
+
+class FixtureServer:
+    """Local HTTP server for the scraper tests.
+
+    ``pages`` maps a path to its body and response headers, and ``failures`` a
+    path to the number of 503s it answers before its page. Conditional requests
+    are answered with 304 when the ETag, or without one the Last-Modified, matches.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.failures = {}
+        self.requests = []
+        self.connections = set()
+        self.delay = 0
+        self.active = self.peak = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with lock:
+                    server.requests.append((self.path, self.headers))
+                    server.connections.add(self.client_address)
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    time.sleep(server.delay)
+                    self.respond()
+                finally:
+                    with lock:
+                        server.active -= 1
+
+            def respond(self):
+                if server.failures.get(self.path):
+                    server.failures[self.path] -= 1
+                    return self.send(503)
+                if self.path not in server.pages:
+                    return self.send(404)
+                body, headers = server.pages[self.path]
+                if "ETag" in headers:
+                    unchanged = self.headers.get("If-None-Match") == headers["ETag"]
+                else:
+                    unchanged = self.headers.get("If-Modified-Since") == headers.get("Last-Modified", object())
+                self.send(304, b"", headers) if unchanged else self.send(200, body.encode(), headers)
+
+            def send(self, status, body=b"", headers=()):
+                self.send_response(status)
+                for name, value in dict(headers).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, args=(0.01,), daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def headers_of(self, path):
+        return [headers for requested, headers in self.requests if requested == path]
+
+
+def html_table(rows, width, attributes=""):
+    cells = "".join(f"<tr>{''.join(f'<td>{cell}</td>' for cell in row + [''] * (width - len(row)))}</tr>" for row in rows)
+    return f"<html><body><table{attributes}><tr><th>header</th></tr>{cells}</table></body></html>"
+
+
+def country_page(*countries):
+    return html_table([["", "", name, capital, language] for name, capital, language in countries], 5)
+
+
+def state_page(*states):
+    return html_table([[name] + [""] * 8 + [capital] for name, capital in states], 10, ' class="st"')
+
+
+class ScraperTests(TestCase):
+
+    def setUp(self):
+        self.server = FixtureServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def fetcher(self, **options):
+        options = {"cache": HTTPCache(self.directory / "cache"), "workers": 4, "retries": 2, "backoff": 0, **options}
+        fetcher = Fetcher(**options)
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+    def source(self, path, parent="South America"):
+        return Source("countries", self.server.url + path, parent, {}, {"country": 2, "capital": 3, "language": 4})
+
+    def scrape(self, sources, **options):
+        return sorted(scrape(sources, self.fetcher(**options)), key=lambda result: result.source.url)
+
+    def test_parse(self):
+        page = html_table([
+            ["", "", "Peru[1]", "Lima", "Spanish*, Quechua"],
+            ["", "", "Chile", "", "Spanish"],
+            ["too", "short"],
+        ], 5)
+        records, skipped = parse(page, self.source("/"))
+        self.assertEqual(records, [{"continent": "South America", "country": "Peru", "capital": "Lima",
+                                    "language": "Spanish, Quechua"}])
+        self.assertEqual(skipped, 2)
+        source = Source("states", "", "Venezuela", {"class": "st"}, {"state": 0, "state_capital": 9})
+        page = html_table([["Other"]], 10) + state_page(("Zulia", "Maracaibo"), ("Amazonas", ""))
+        self.assertEqual(parse(page, source), ([{"country": "Venezuela", "state": "Zulia", "state_capital": "Maracaibo"},
+                                                {"country": "Venezuela", "state": "Amazonas"}], 0))
+
+    def test_fetches_concurrently_on_pooled_connections(self):
+        for number in range(12):
+            self.server.pages[f"/{number}"] = (country_page((f"Country {number}", "Capital", "Spanish")), {})
+        self.server.delay = 0.05
+        results = self.scrape([self.source(f"/{number}") for number in range(12)] + [self.source("/0", "Europe")])
+        self.assertEqual(len(results), 13)
+        self.assertEqual({result.records[0]["country"] for result in results}, {f"Country {n}" for n in range(12)})
+        self.assertEqual(len(self.server.requests), 12)
+        self.assertTrue(1 < self.server.peak <= 4)
+        # one kept-alive connection per worker
+        self.assertLessEqual(len(self.server.connections), 4)
+
+    def test_cache_revalidation(self):
+        pages = self.server.pages
+        pages["/etag"] = (country_page(("Peru", "Lima", "Spanish")), {"ETag": '"v1"'})
+        pages["/modified"] = (country_page(("Chile", "Santiago", "Spanish")),
+                              {"Last-Modified": "Wed, 01 May 2024 10:00:00 GMT"})
+        pages["/plain"] = (country_page(("Bolivia", "Sucre", "Spanish")), {})
+        sources = [self.source(path) for path in ("/etag", "/modified", "/plain")]
+        first = self.scrape(sources)
+        self.assertEqual([result.cached for result in first], [False, False, False])
+
+        second = self.scrape(sources)
+        self.assertEqual([result.cached for result in second], [True, True, False])
+        self.assertEqual([result.records for result in second], [result.records for result in first])
+        self.assertEqual(self.server.headers_of("/etag")[-1]["If-None-Match"], '"v1"')
+        self.assertEqual(self.server.headers_of("/modified")[-1]["If-Modified-Since"], "Wed, 01 May 2024 10:00:00 GMT")
+        self.assertIsNone(self.server.headers_of("/plain")[-1]["If-None-Match"])
+
+        pages["/etag"] = (country_page(("Peru", "Lima", "Spanish, Quechua")), {"ETag": '"v2"'})
+        third = self.scrape(sources[:1])
+        self.assertFalse(third[0].cached)
+        self.assertEqual(third[0].records[0]["language"], "Spanish, Quechua")
+        self.assertTrue(self.scrape(sources[:1])[0].cached)
+        self.assertFalse(self.scrape(sources[:1], cache=None)[0].cached)
+
+    def test_retries_and_failures(self):
+        self.server.pages["/flaky"] = (country_page(("Peru", "Lima", "Spanish")), {})
+        self.server.pages["/down"] = self.server.pages["/flaky"]
+        self.server.failures = {"/flaky": 2, "/down": 5}
+        down, flaky, missing = self.scrape([self.source("/flaky"), self.source("/down"), self.source("/missing")])
+        self.assertIsNone(flaky.error)
+        self.assertEqual(len(self.server.headers_of("/flaky")), 3)
+        self.assertEqual(down.error, "status code 503")
+        self.assertEqual(len(self.server.headers_of("/down")), 3)
+        self.assertEqual(missing.error, "status code 404")
+        self.assertEqual(len(self.server.headers_of("/missing")), 1)
+        unreachable = Source("countries", "http://127.0.0.1:1/", "South America", {}, flaky.source.columns)
+        self.assertTrue(self.scrape([unreachable], retries=0)[0].error.startswith("request failed"))
+
+    def test_load_sources(self):
+        path = self.directory / "sources.json"
+        path.write_text(json.dumps({"states": [{"url": "http://x", "country": "Peru", "columns": {"state": 1}}]}))
+        self.assertEqual(load_sources(path, "states"),
+                         [Source("states", "http://x", "Peru", {}, {"state": 1, "state_capital": 9})])
+        self.assertEqual(load_sources(path, "countries"), [])
+        for content in ("{", json.dumps({"states": [{"url": "http://x"}]}),
+                        json.dumps({"states": [{"url": "http://x", "country": "Peru", "columns": {"capital": 1}}]})):
+            path.write_text(content)
+            with self.subTest(content=content), self.assertRaises(InvalidSources):
+                load_sources(path, "states")
+        with self.assertRaises(InvalidSources):
+            load_sources(self.directory / "missing.json", "states")
+
+    def test_commands(self):
+        america = Continent.objects.create(name="South America")
+        self.server.pages["/countries"] = (country_page(("Venezuela", "Caracas", "Spanish"), ("Peru", "Lima", "Spanish")),
+                                           {"ETag": '"countries"'})
+        self.server.pages["/states"] = (state_page(("Zulia", "Maracaibo"), ("Amazonas", "Puerto Ayacucho")), {})
+        config = self.directory / "sources.json"
+        config.write_text(json.dumps({
+            "countries": [{"url": self.server.url + "/countries", "continent": "south america"}],
+            "states": [{"url": self.server.url + "/states", "country": "Venezuela", "table": {"class": "st"}},
+                       {"url": self.server.url + "/gone", "country": "Peru"}],
+        }))
+        options = {"config": str(config), "cache_dir": str(self.directory / "cache"), "stdout": io.StringIO()}
+        call_command("scrape_countries", **options)
+        self.assertEqual(set(america.countries.values_list("name", "capital")), {("Venezuela", "Caracas"), ("Peru", "Lima")})
+        output = io.StringIO()
+        call_command("scrape_countries", **{**options, "stdout": output})
+        self.assertIn("1 pages scraped", output.getvalue())
+        self.assertIn("0 downloaded, 1 not modified, 0 failed; countries: 0 inserted, 0 updated, 2 unchanged",
+                      output.getvalue())
+
+        output = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "1 of 2 pages failed"):
+            call_command("scrape_states", **{**options, "stdout": output})
+        self.assertIn("states: 2 inserted, 0 updated, 0 unchanged", output.getvalue())
+        self.assertEqual(set(State.objects.values_list("name", "capital")),
+                         {("Zulia", "Maracaibo"), ("Amazonas", "Puerto Ayacucho")})
+        call_command("scrape_states", "--only", "venezuela", **options)
+        with self.assertRaisesMessage(CommandError, "No states pages to scrape"):
+            call_command("scrape_states", "--only", "Chile", **options)
+
+
+class ScrapeWriteTests(TestCase):
+
+    def setUp(self):
+        build_places()
+        self.nigeria = Country.objects.get(name="Nigeria")
+        self.portugal = Country.objects.get(name="Portugal")
+        State.objects.filter(name="Lagos").update(capital="Ikeja")
+        # a state of another country with the same name as one scraped for Nigeria
+        State.objects.create(name="Oyo", capital="Elsewhere", country=self.portugal)
+
+    def states(self, *records, country="Nigeria"):
+        source = Source("states", "", country, {}, {})
+        return write(source, [{"country": country, **record} for record in records])
+
+    def test_states_are_matched_within_their_country(self):
+        version = DataVersion.current()
+        stats = self.states({"state": "LAGOS", "state_capital": "Ikeja"}, {"state": "Oyo", "state_capital": "Ibadan"},
+                            {"state": "Kano", "state_capital": "Kano"}, {"state": "Kano", "state_capital": "Kano City"})
+        self.assertEqual(stats, WriteStats(inserted=2, updated=1, unchanged=0))
+        self.assertEqual(set(self.nigeria.states.values_list("name", "capital")),
+                         {("LAGOS", "Ikeja"), ("Oyo", "Ibadan"), ("Kano", "Kano City")})
+        self.assertEqual(State.objects.get(country=self.portugal, name="Oyo").capital, "Elsewhere")
+        self.assertEqual(Country.objects.get(pk=self.nigeria.pk).states_count, 3)
+        self.assertEqual(Country.objects.get(pk=self.portugal.pk).states_count, 2)
+        self.assertGreater(DataVersion.current().number, version.number)
+
+    def test_unchanged_page_writes_nothing(self):
+        version = DataVersion.current()
+        # the country, then its rows named by the page
+        with self.assertNumQueries(2):
+            stats = self.states({"state": "Lagos", "state_capital": "Ikeja"}, country="nigeria")
+        self.assertEqual(stats, WriteStats(inserted=0, updated=0, unchanged=1))
+        self.assertEqual(DataVersion.current(), version)
+
+    def test_countries_move_between_continents(self):
+        africa, europe = Continent.objects.get(name="Africa"), Continent.objects.get(name="Europe")
+        source = Source("countries", "", "Europe", {}, {})
+        stats = write(source, [
+            {"continent": "Europe", "country": "Portugal", "capital": "Lisbon", "language": "Portuguese"},
+            {"continent": "Europe", "country": "Niger", "capital": "Niamey", "language": "French"},
+            {"continent": "Europe", "country": "Spain", "capital": "Madrid", "language": "Spanish"},
+        ])
+        self.assertEqual(stats, WriteStats(inserted=1, updated=1, unchanged=1))
+        self.assertEqual(Country.objects.get(name="Niger").continent, europe)
+        self.assertEqual(Continent.objects.get(pk=africa.pk).countries_count, 2)
+        self.assertEqual(Continent.objects.get(pk=europe.pk).countries_count, 3)
+
+    def test_unknown_parent(self):
+        with self.assertRaisesMessage(ScrapeError, "country 'Atlantis' does not exist"):
+            self.states({"state": "Lagos"}, country="Atlantis")
+
+
+def places_snapshot():
+    """Every row with its attributes, parents and counters, without ids."""
+    return {
+        "continents": set(Continent.objects.values_list("name", "countries_count")),
+        "countries": set(Country.objects.values_list("continent__name", "name", "capital", "currency", "language",
+                                                     "states_count")),
+        "states": set(State.objects.values_list("country__name", "name", "capital", "local_governments_count")),
+        "local_governments": set(LocalGovernment.objects.values_list("state__country__name", "state__name", "name")),
+    }
+
+
+@uncached
+class ExportTests(TestCase):
+
+    def setUp(self):
+        build_places()
+        Country.objects.filter(name="Nigeria").update(currency="Naira")
+        State.objects.filter(name="Lagos").update(capital="Ikeja")
+        # a name the CSV and JSON writers have to quote or escape
+        State.objects.create(name='Oyo,\u2028"Pace Setter"', country=Country.objects.get(name="Niger"))
+        recount(Country)
+
+    def export(self, format, **options):
+        return b"".join(Exporter(format, **options).chunks())
+
+    def test_round_trip(self):
+        expected = places_snapshot()
+        ids = [sorted(model.objects.values_list("pk", flat=True)) for model in (Continent, Country, State, LocalGovernment)]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for format, encoder in ENCODERS.items():
+            with self.subTest(format=format):
+                path = Path(directory.name) / f"locations.{encoder.extension}"
+                output = io.StringIO()
+                call_command("export_locations", str(path), stdout=output)
+                self.assertIn("14 records", output.getvalue())
+                self.assertIn("records/s", output.getvalue())
+
+                Continent.objects.all().delete()
+                output = io.StringIO()
+                call_command("import_locations", str(path), stdout=output)
+                self.assertIn("14 records processed", output.getvalue())
+                self.assertIn("0 rejected", output.getvalue())
+                self.assertEqual(places_snapshot(), expected)
+                self.assertEqual([sorted(model.objects.values_list("pk", flat=True))
+                                  for model in (Continent, Country, State, LocalGovernment)], ids)
+
+    def test_streams_in_chunks(self):
+        expected = self.export("ndjson")
+        exporter = Exporter("ndjson", chunk_size=2, flush_every=5)
+        # one query per table however many chunks are fetched, in a savepoint of the test's transaction
+        with self.assertNumQueries(6):
+            chunks = list(exporter.chunks())
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b"".join(chunks), expected)
+        self.assertEqual((exporter.records, exporter.bytes), (14, len(expected)))
+        faro = State.objects.get(name="Faro")
+        self.assertEqual(json.loads(expected.splitlines()[-1]), {
+            "id": faro.local_governments.get().pk, "parent_id": faro.pk,
+            "country": "Portugal", "state": "Faro", "local_government": "Lagos",
+        })
+        self.assertLess(len(self.export("binary")), len(self.export("csv")))
+
+    def test_reads_in_one_transaction(self):
+        chunks = Exporter("ndjson", flush_every=1).chunks()
+        depth = len(connection.savepoint_ids)
+        next(chunks)
+        self.assertEqual(len(connection.savepoint_ids), depth + 1)
+        self.assertEqual(len(list(chunks)), 13)
+        self.assertEqual(len(connection.savepoint_ids), depth)
+        chunks = Exporter("ndjson", flush_every=1).chunks()
+        next(chunks)
+        # a client going away closes the stream
+        chunks.close()
+        self.assertEqual(len(connection.savepoint_ids), depth)
+
+    def test_binary_errors(self):
+        data = self.export("binary")
+        for content in (b"GEOX", data[:-3], data[:5] + bytes([9]) + data[6:]):
+            with self.subTest(content=content[:8]), self.assertRaises(InvalidBinary):
+                list(read_binary(io.BytesIO(content)))
+        # one byte at a time, to cross the end of the buffer in every field
+        with mock.patch("locations.binary.READ_SIZE", 1):
+            self.assertEqual(len(list(read_binary(io.BytesIO(data)))), 14)
+
+    def test_view(self):
+        for format, encoder in ENCODERS.items():
+            with self.subTest(format=format):
+                response = self.client.get(reverse("export-places", args=[format]), HTTP_ACCEPT=encoder.content_type)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], encoder.content_type)
+                self.assertEqual(response["Content-Disposition"],
+                                 f'attachment; filename="locations.{encoder.extension}"')
+                self.assertIn("ETag", response)
+                self.assertEqual(b"".join(response.streaming_content), self.export(format))
+        response = self.client.get(reverse("export-places", args=["xml"]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "Unknown export format 'xml', expected ndjson, csv, binary"})
+
+    async def test_async_view(self):
+        expected = await sync_to_async(self.export)("csv")
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            response = await self.async_client.get(reverse("export-places", args=["csv"]))
+            self.assertEqual(response["Content-Type"], "text/csv")
+            self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), expected)
+            response = await self.async_client.get(reverse("export-places", args=["xml"]))
+            self.assertEqual(response.status_code, 404)
+
+
+class StoreURLConf:
+    urlpatterns = [path("api/v1/", include(location_patterns(store_views(views))))]
+
+
+@uncached
+@override_settings(GEOGRAPHY_STORE={"CHECK_INTERVAL": 0})
+class GeographyStoreTests(TestCase):
+    """The views of the in-memory store answer like the DRF views, without querying."""
+
+    urls = AsyncViewTests.urls
+
+    def setUp(self):
+        build_world(continents=2, countries=3, states=2, local_governments=3)
+        country = Country.objects.create(name="Côte d'Ivoire", capital="Yamoussoukro", language="French",
+                                         currency=None, continent=Continent.objects.get(name="Continent 1"))
+        State.objects.create(name="Abidjan", capital=None, country=country)
+        planet_earth_snapshot.invalidate()
+        suggestion_index.clear()
+        geography.clear()
+        self.addCleanup(geography.clear)
+        inline = mock.patch.object(geography, "background", False)
+        inline.start()
+        self.addCleanup(inline.stop)
+
+    def test_responses_match_the_drf_views(self):
+        urls = self.urls()
+        lgas = reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"])
+        urls += [lgas + "?limit=2&cursor=" + encode_cursor("LGA 0-0-0-0", 0), lgas + "?fields=name"]
+        expected = []
+        for url in urls:
+            response = self.client.get(url, headers={"accept": "application/json"})
+            expected.append((response.status_code, response.content, response.get("ETag")))
+
+        with override_settings(ROOT_URLCONF=StoreURLConf):
+            for url, (status, content, etag) in zip(urls, expected):
+                with self.subTest(url=url):
+                    response = self.client.get(url, headers={"accept": "application/json"})
+                    self.assertEqual((response.status_code, response.content), (status, content))
+                    self.assertEqual(response.get("ETag"), etag)
+
+    @override_settings(ROOT_URLCONF=StoreURLConf)
+    def test_cursor_walk(self):
+        url = reverse("get-all-local-governments-in-a-state", args=["Country 0-0", "State 0-0-0"])
+        names, cursor = [], ""
+        while cursor is not None:
+            data = self.client.get(f"{url}?limit=1&cursor={cursor}").json()
+            names.extend(lga["name"] for lga in data["local_governments"])
+            cursor = data["next_cursor"]
+        self.assertEqual(names, ["LGA 0-0-0-0", "LGA 0-0-0-1", "LGA 0-0-0-2"])
+
+    @override_settings(ROOT_URLCONF=StoreURLConf, GEOGRAPHY_STORE={"CHECK_INTERVAL": 60})
+    def test_no_queries_between_version_checks(self):
+        urls = self.urls()
+        with self.assertNumQueries(13):
+            # the version and one query per table for the world, then for the planet-earth
+            # snapshot, each in a savepoint
+            self.client.get(urls[0])
+        for url in urls:
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.client.get(url, headers={"accept": "application/json"})
+
+    @override_settings(ROOT_URLCONF=StoreURLConf)
+    def test_reloads_after_a_write(self):
+        url = reverse("fetch-all-states-in-a-country", args=["Country 0-1"])
+        self.assertEqual(self.client.get(url).json()["count"], 2)
+        loads = geography.loads
+        State.objects.create(name="State 0-1-2", country=Country.objects.get(name="Country 0-1"))
+        recount(Country)
+        data = self.client.get(url).json()
+        self.assertEqual((data["count"], data["states"][-1]["name"]), (3, "State 0-1-2"))
+        self.assertEqual(geography.loads, loads + 1)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        self.assertEqual(geography.loads, loads + 1)
+
+    @override_settings(ROOT_URLCONF=StoreURLConf, GEOGRAPHY_STORE={"CHECK_INTERVAL": 60},
+                       RESPONSE_CACHE=settings.RESPONSE_CACHE)
+    def test_stale_world_responses_are_not_cached(self):
+        response_cache.clear()
+        url = reverse("fetch-all-states-in-a-country", args=["Country 0-1"])
+
+        def get():
+            response = self.client.get(url)
+            return response["X-Cache"], response.json()["count"]
+
+        self.assertEqual(get(), ("MISS", 2))
+        self.assertEqual(get(), ("HIT", 2))
+        State.objects.create(name="State 0-1-2", country=Country.objects.get(name="Country 0-1"))
+        recount(Country)
+        # the world is not checked again for a minute
+        self.assertEqual(get(), ("MISS", 2))
+        self.assertEqual(get(), ("MISS", 2))
+        geography.clear()
+        self.assertEqual(get(), ("MISS", 3))
+        self.assertEqual(get(), ("HIT", 3))
+
+    def test_footprint(self):
+        self.assertEqual(geography_metrics(), [])
+        world = geography.world()
+        self.assertEqual(world.counts(), {"continents": 2, "countries": 7, "states": 13, "local_governments": 36})
+        self.assertEqual(set(world.footprint),
+                         {"continents", "countries", "states", "local_governments", "indexes", "total"})
+        self.assertEqual(world.footprint["total"], sum(world.footprint.values()) - world.footprint["total"])
+        lines = geography_metrics()
+        self.assertIn('geography_store_rows{level="local_governments"} 36', lines)
+        self.assertIn(f"geography_store_version {world.version.number}", lines)
+
+        output = io.StringIO()
+        call_command("geography_store", stdout=output)
+        self.assertIn("7 countries, 13 states, 36 local governments", output.getvalue())
@@ -1,14 +1,33 @@
+from types import SimpleNamespace
+
+from django.conf import settings
 from django.urls import path
-from .views import (PlanetEarthListView, ContinentListView, CountryListAndSearchView, CountryListByContinentView, 
-                    StateListByCountryView, StateDetailByCountryView, LocalGovernmentListByStateView)
-
-
-urlpatterns = [
-    path('planet-earth', PlanetEarthListView.as_view(), name='all-continents-countries-states-sub-divisions'),
-    path('continents', ContinentListView.as_view(), name='list-of-available-continents'),
-    path('continents/<str:continent_name>/countries', CountryListByContinentView.as_view(), name='fetching-countries-by-continent'),
-    path('countries', CountryListAndSearchView.as_view(), name='fetching-all-countries-available-and-searching-for-a-particular-country'),
-    path('countries/<str:country_name>/states', StateListByCountryView.as_view(), name='fetch-all-states-in-a-country'),
-    path('countries/<str:country_name>', StateDetailByCountryView.as_view(), name='search-state-in-a-particular-country'),
-    path('countries/<str:country_name>/states/<str:state_name>/local-governments', LocalGovernmentListByStateView.as_view(), name='get-all-local-governments-in-a-state'),
-]
\ No newline at end of file
+from . import async_views, memory_views, views
+
+
+def location_patterns(views):
+    return [
+        path('planet-earth', views.PlanetEarthListView.as_view(), name='all-continents-countries-states-sub-divisions'),
+        path('continents', views.ContinentListView.as_view(), name='list-of-available-continents'),
+        path('continents/<str:continent_name>/countries', views.CountryListByContinentView.as_view(), name='fetching-countries-by-continent'),
+        path('countries', views.CountryListAndSearchView.as_view(), name='fetching-all-countries-available-and-searching-for-a-particular-country'),
+        path('countries/<str:country_name>/states', views.StateListByCountryView.as_view(), name='fetch-all-states-in-a-country'),
+        path('countries/<str:country_name>', views.StateDetailByCountryView.as_view(), name='search-state-in-a-particular-country'),
+        path('countries/<str:country_name>/states/<str:state_name>/local-governments', views.LocalGovernmentListByStateView.as_view(), name='get-all-local-governments-in-a-state'),
+        path('search', views.SearchView.as_view(), name='search-places'),
+        path('autocomplete', views.AutocompleteView.as_view(), name='autocomplete-places'),
+        path('resolve', views.ResolveView.as_view(), name='resolve-places'),
+        path('export/<str:export_format>', views.ExportView.as_view(), name='export-places'),
+    ]
+
+
+def store_views(views):
+    """``views`` with its read endpoints answered by ``memory_views`` instead."""
+    return SimpleNamespace(**{
+        name: getattr(memory_views if name in memory_views.VIEWS else views, name)
+        for name in dir(views) if name.endswith("View")
+    })
+
+
+base_views = async_views if settings.ASYNC_VIEWS else views
+urlpatterns = location_patterns(store_views(base_views) if settings.GEOGRAPHY_STORE else base_views)
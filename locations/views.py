@@ -1,10 +1,57 @@
+from django.conf import settings
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample
 from rest_framework import generics
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from .models import Continent, Country, State, LocalGovernment
+from utils.text import normalize_name
+from .models import Continent, Country, State, LocalGovernment, DataVersion
 from .serializers import (ContinentSerializer, ContinentOnlySerializer, CountryOnlySerializer,
-                          CountrySerializer, StateSerializer, LocalGovernmentSerializer)
-from difflib import get_close_matches
+                          CountrySerializer, StateSerializer, LocalGovernmentSerializer, SearchResponseSerializer,
+                          ResolveRequestSerializer, ResolveResponseSerializer)
+from .autocomplete import InvalidCompletion, UnknownParent, autocomplete, parse_completion
+from .conditional import ConditionalGetMixin
+from .export import ENCODERS, Exporter, UnknownFormat
+from .fields import InvalidFields, check_fields, parse_fields
+from .lean import serialize, values_of
+from .pagination import InvalidPage, KeysetPaginator
+from .resolver import MAX_ITEMS, Resolver, resolve_lines, summary
+from .search import InvalidSearch, parse_search, search_index
+from .snapshot import planet_earth_snapshot
+from .streaming import planet_earth_chunks
+from .suggestions import not_found_message, suggestion_index
+
+
+def not_found_response(subject, suggestions, include_suggestions=True):
+    """Build the 404 body shared by every lookup, with its "Did you mean" hint."""
+    response_data = {"error": not_found_message(subject, suggestions)}
+    if include_suggestions:
+        response_data["suggestions"] = suggestions
+    return Response(response_data, status=404)
+
+
+def requested_fields(request, serializer_class):
+    """The ``?fields=`` tree checked against ``serializer_class``; ``None`` keeps every field.
+
+    Raises ``InvalidFields`` for an unknown or malformed field.
+    """
+    fields = parse_fields(request.GET.get('fields'))
+    if fields is not None:
+        check_fields(serializer_class(), fields)
+    return fields
+
+
+FIELDS_PARAMETER = OpenApiParameter(
+    name='fields', required=False, type=str,
+    description='Comma separated fields to return, with dotted paths into nested ones, e.g. name,capital,states.name',
+)
+
+PAGINATION_PARAMETERS = [
+    OpenApiParameter(name='limit', description='Opt-in page size; the response then carries a next_cursor', required=False, type=int),
+    OpenApiParameter(name='cursor', description='The next_cursor value of the previous page', required=False, type=str),
+]
 
 
 @extend_schema(
@@ -12,18 +59,28 @@ from difflib import get_close_matches
     responses={
         200: ContinentSerializer(many=True),
     },
+    parameters=[FIELDS_PARAMETER],
     )
-class PlanetEarthListView(generics.ListAPIView):
-    queryset = Continent.objects.all()
+class PlanetEarthListView(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = ContinentSerializer
 
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = requested_fields(request, self.get_serializer_class())
+        except InvalidFields as error:
+            return Response({"error": str(error)}, status=400)
+
+        if request.accepted_renderer.format == "json" and fields is None:
+            if settings.PLANET_EARTH_MODE == "stream":
+                return StreamingHttpResponse(planet_earth_chunks(), content_type="application/json")
+            return planet_earth_snapshot.get(self.data_version).response(request)
+
+        continents = serialize(
+            values_of(Continent.objects.order_by("pk"), ContinentSerializer, fields), ContinentSerializer, fields
+        )
         response_data = {
-            "count": queryset.count(),
-            "continents": serializer.data
+            "count": len(continents),
+            "continents": continents
         }
         return Response(response_data)
 
@@ -33,17 +90,23 @@ class PlanetEarthListView(generics.ListAPIView):
     responses={
         200: ContinentOnlySerializer(many=True),
     },
+    parameters=[FIELDS_PARAMETER],
     )
-class ContinentListView(generics.ListAPIView):
-    queryset = Continent.objects.all()
+class ContinentListView(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = ContinentOnlySerializer
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+    def get(self, request, *args, **kwargs):
+        try:
+            fields = requested_fields(request, self.get_serializer_class())
+        except InvalidFields as error:
+            return Response({"error": str(error)}, status=400)
+
+        continents = serialize(
+            values_of(Continent.objects.all(), ContinentOnlySerializer, fields), ContinentOnlySerializer, fields
+        )
         response_data = {
-            "count": queryset.count(),
-            "continents": serializer.data
+            "count": len(continents),
+            "continents": continents
         }
         return Response(response_data)
 
@@ -59,6 +122,7 @@ class ContinentListView(generics.ListAPIView):
             }
         )
     },
+    parameters=[FIELDS_PARAMETER],
     examples=[
         OpenApiExample(
             "Success",
@@ -97,28 +161,29 @@ class ContinentListView(generics.ListAPIView):
         )
     ]
 )
-class CountryListByContinentView(generics.GenericAPIView):
+class CountryListByContinentView(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = CountrySerializer
 
     def get(self, request, continent_name, *args, **kwargs):
+        try:
+            fields = requested_fields(request, self.get_serializer_class())
+        except InvalidFields as error:
+            return Response({"error": str(error)}, status=400)
+
         continent_name = continent_name.strip()
-        continent = Continent.objects.filter(name__exact=continent_name).first()
+        continent = Continent.objects.filter(name_key=normalize_name(continent_name)).first()
 
         if not continent:
-            all_continent_names = Continent.objects.values_list('name', flat=True)
-            suggestions = get_close_matches(continent_name, all_continent_names, n=1, cutoff=0.8)
-            if suggestions:
-                suggestion_message = f"Continent '{continent_name}' isn't found. Did you mean '{suggestions[0]}'?"
-            else:
-                suggestion_message = f"Continent '{continent_name}' isn't found and no suggestions are available."
-            return Response({"error": suggestion_message}, status=404)
+            suggestions = suggestion_index.suggest(
+                "continent", continent_name, n=1, cutoff=0.8, version=self.data_version
+            )
+            return not_found_response(f"Continent '{continent_name}'", suggestions, include_suggestions=False)
         
-        countries = Country.objects.filter(continent=continent).order_by('name')
-        serializer = self.get_serializer(countries, many=True)
+        countries = values_of(Country.objects.filter(continent=continent), CountrySerializer, fields).order_by('name')
         response_data = {
             "continent": continent.name,
-            "count": countries.count(),
-            "countries": serializer.data
+            "count": continent.countries_count,
+            "countries": serialize(countries, CountrySerializer, fields)
         }
         return Response(response_data)
 
@@ -147,7 +212,9 @@ class CountryListByContinentView(generics.GenericAPIView):
         )
     },
     parameters=[
-         OpenApiParameter(name='country', description='Name of the country to search for', required=False, type=str)
+         OpenApiParameter(name='country', description='Name of the country to search for', required=False, type=str),
+         *PAGINATION_PARAMETERS,
+         FIELDS_PARAMETER,
     ],
     examples=[
         OpenApiExample(
@@ -179,7 +246,7 @@ class CountryListByContinentView(generics.GenericAPIView):
         )
     ]
 )
-class CountryListAndSearchView(generics.GenericAPIView):
+class CountryListAndSearchView(ConditionalGetMixin, generics.GenericAPIView):
 
     def get_serializer_class(self):
         if self.request.GET.get('country'):
@@ -188,32 +255,45 @@ class CountryListAndSearchView(generics.GenericAPIView):
 
     def get(self, request, *args, **kwargs):
         country_name = request.GET.get('country', '').strip()
+        try:
+            fields = requested_fields(request, self.get_serializer_class())
+        except InvalidFields as error:
+            return Response({"error": str(error)}, status=400)
 
         if country_name:
-            country = Country.objects.filter(name__exact=country_name).first()
+            country = values_of(
+                Country.objects.filter(name_key=normalize_name(country_name)), CountrySerializer, fields
+            ).first()
 
             if not country:
-                all_country_names = Country.objects.values_list('name', flat=True)
-                suggestions = get_close_matches(country_name, all_country_names, n=1, cutoff=0.8)
-                if suggestions:
-                    suggestion_message = f"Country '{country_name}' isn't found. Did you mean '{suggestions[0]}'?"
-                else:
-                    suggestion_message = f"Country '{country_name}' isn't found and no suggestions are available."
-                return Response({"error": suggestion_message}, status=404)
-
-            serializer = self.get_serializer(country)
+                suggestions = suggestion_index.suggest(
+                    "country", country_name, n=1, cutoff=0.8, version=self.data_version
+                )
+                return not_found_response(f"Country '{country_name}'", suggestions, include_suggestions=False)
+
             response_data = {
                 "count": 1,
-                "country": serializer.data
+                "country": serialize([country], CountrySerializer, fields)[0]
             }
             return Response(response_data)
         else:
-            countries = Country.objects.all().order_by('name')
-            serializer = self.get_serializer(countries, many=True)
+            try:
+                paginator = KeysetPaginator.from_request(request)
+            except InvalidPage as error:
+                return Response({"error": str(error)}, status=400)
+
+            countries = values_of(Country.objects.all(), CountryOnlySerializer, fields, "name").order_by('name')
+            if paginator:
+                countries = paginator.paginate(countries)
+            countries = serialize(countries, CountryOnlySerializer, fields)
             response_data = {
-                "count": countries.count(),
-                "countries": serializer.data
+                "count": len(countries),
+                "countries": countries
             }
+            if paginator:
+                # The page holds only part of the list; the total comes from the continent counters.
+                response_data["count"] = Continent.objects.aggregate(total=Sum("countries_count"))["total"] or 0
+                response_data["next_cursor"] = paginator.next_cursor
             return Response(response_data)
 
 
@@ -252,31 +332,36 @@ class CountryListAndSearchView(generics.GenericAPIView):
                 "states": []
             }
         )
-    ]
+    ],
+    parameters=[*PAGINATION_PARAMETERS, FIELDS_PARAMETER],
 )
-class StateListByCountryView(generics.GenericAPIView):
+class StateListByCountryView(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = StateSerializer
 
     def get(self, request, country_name, *args, **kwargs):
+        try:
+            paginator = KeysetPaginator.from_request(request)
+            fields = requested_fields(request, self.get_serializer_class())
+        except (InvalidPage, InvalidFields) as error:
+            return Response({"error": str(error)}, status=400)
+
         country_name = country_name.strip()
-        country = Country.objects.filter(name__exact=country_name).first()
+        country = Country.objects.filter(name_key=normalize_name(country_name)).first()
 
         if not country:
-            all_country_names = Country.objects.values_list('name', flat=True)
-            suggestions = get_close_matches(country_name, all_country_names)
-            if suggestions:
-                suggestion_message = f"Country '{country_name}' isn't found. Did you mean '{suggestions[0]}'?"
-            else:
-                suggestion_message = f"Country '{country_name}' isn't found and no suggestions are available."
-            return Response({"error": suggestion_message}, status=404)
-
-        states = State.objects.filter(country=country).order_by('name')
-        serializer = self.get_serializer(states, many=True)
+            suggestions = suggestion_index.suggest("country", country_name, version=self.data_version)
+            return not_found_response(f"Country '{country_name}'", suggestions, include_suggestions=False)
+
+        states = values_of(State.objects.filter(country=country), StateSerializer, fields, "name").order_by('name')
+        if paginator:
+            states = paginator.paginate(states)
         response_data = {
-            "count": states.count(),
+            "count": country.states_count,
             "country": country.name,
-            "states": serializer.data
+            "states": serialize(states, StateSerializer, fields)
         }
+        if paginator:
+            response_data["next_cursor"] = paginator.next_cursor
         return Response(response_data)
     
 
@@ -316,7 +401,8 @@ class StateListByCountryView(generics.GenericAPIView):
         )
     },
     parameters=[
-        OpenApiParameter(name='state', description='Name of the state to search', required=True, type=str)
+        OpenApiParameter(name='state', description='Name of the state to search', required=True, type=str),
+        FIELDS_PARAMETER,
      ],
     examples=[
         OpenApiExample(
@@ -333,7 +419,7 @@ class StateListByCountryView(generics.GenericAPIView):
         )
     ]
 )
-class StateDetailByCountryView(generics.GenericAPIView):
+class StateDetailByCountryView(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = StateSerializer
 
     def get(self, request, country_name, *args, **kwargs):
@@ -343,39 +429,31 @@ class StateDetailByCountryView(generics.GenericAPIView):
         if not state_name:
             return Response({"error": "State parameter is missing"}, status=400)
 
-        country = Country.objects.filter(name__exact=country_name).first()
+        try:
+            fields = requested_fields(request, self.get_serializer_class())
+        except InvalidFields as error:
+            return Response({"error": str(error)}, status=400)
+
+        country = Country.objects.filter(name_key=normalize_name(country_name)).first()
 
         if not country:
-            all_country_names = Country.objects.values_list('name', flat=True)
-            suggestions = get_close_matches(country_name, all_country_names)
-            if suggestions:
-                suggestion_message = f"Country '{country_name}' isn't found. Did you mean '{suggestions[0]}'?"
-            else:
-                suggestion_message = f"Country '{country_name}' isn't found and no suggestions are available."
-            return Response({
-                "error": suggestion_message,
-                "suggestions": suggestions if suggestions else []
-            }, status=404)
-
-        state = State.objects.filter(name__iexact=state_name, country=country).first()
+            suggestions = suggestion_index.suggest("country", country_name, version=self.data_version)
+            return not_found_response(f"Country '{country_name}'", suggestions)
+
+        state = values_of(
+            State.objects.filter(name_key=normalize_name(state_name), country=country), StateSerializer, fields
+        ).first()
 
         if not state:
-            all_state_names = State.objects.filter(country=country).values_list('name', flat=True)
-            suggestions = get_close_matches(state_name, all_state_names)
-            if suggestions:
-                suggestion_message = f"State '{state_name}' in '{country_name}' isn't found. Did you mean '{suggestions[0]}'?"
-            else:
-                suggestion_message = f"State '{state_name}' in '{country_name}' isn't found and no suggestions are available."
-            return Response({
-                "error": suggestion_message,
-                "suggestions": suggestions if suggestions else []
-            }, status=404)
-
-        serializer = self.get_serializer(state)
+            suggestions = suggestion_index.suggest(
+                "state", state_name, parent=country.pk, version=self.data_version
+            )
+            return not_found_response(f"State '{state_name}' in '{country_name}'", suggestions)
+
         return Response({
             "count": 1,
             "country": country.name,
-            "state": serializer.data
+            "state": serialize([state], StateSerializer, fields)[0]
         })
 
 
@@ -423,50 +501,246 @@ class StateDetailByCountryView(generics.GenericAPIView):
                 ]
             }
         )
-    ]
+    ],
+    parameters=[*PAGINATION_PARAMETERS, FIELDS_PARAMETER],
 )
-class LocalGovernmentListByStateView(generics.GenericAPIView):
+class LocalGovernmentListByStateView(ConditionalGetMixin, generics.GenericAPIView):
     serializer_class = LocalGovernmentSerializer
 
     def get(self, request, country_name, state_name, *args, **kwargs):
+        try:
+            paginator = KeysetPaginator.from_request(request)
+            fields = requested_fields(request, self.get_serializer_class())
+        except (InvalidPage, InvalidFields) as error:
+            return Response({"error": str(error)}, status=400)
+
         country_name = country_name.strip()
         state_name = state_name.strip()
 
-        country = Country.objects.filter(name__exact=country_name).first()
+        country = Country.objects.filter(name_key=normalize_name(country_name)).first()
         
         if not country:
-            all_country_names = Country.objects.values_list('name', flat=True)
-            suggestions = get_close_matches(country_name, all_country_names)
-            
-            if suggestions:
-                suggestion_message = f"Country '{country_name}' isn't found. Did you mean '{suggestions[0]}'?"
-            else:
-                suggestion_message = f"Country '{country_name}' isn't found and no suggestions are available."
-        
-            return Response({
-                "error": suggestion_message,
-                "suggestions": suggestions if suggestions else []
-            }, status=404)
+            suggestions = suggestion_index.suggest("country", country_name, version=self.data_version)
+            return not_found_response(f"Country '{country_name}'", suggestions)
 
-        state = State.objects.filter(name__exact=state_name, country=country).first()
+        state = State.objects.filter(name_key=normalize_name(state_name), country=country).first()
         if not state:
-            all_state_names = State.objects.filter(country=country).values_list('name', flat=True)
-            suggestions = get_close_matches(state_name, all_state_names)
-            if suggestions:
-                suggestion_message = f"State '{state_name}' in '{country_name}' isn't found. Did you mean '{suggestions[0]}'?"
-            else:
-                suggestion_message = f"State '{state_name}' in '{country_name}' isn't found and no suggestions are available."
-            return Response({
-                "error": suggestion_message,
-                "suggestions": suggestions if suggestions else []
-            }, status=404)
-
-        local_governments = LocalGovernment.objects.filter(state=state).order_by('name')
-        serializer = self.get_serializer(local_governments, many=True)
-        
-        return Response({
-            "count": local_governments.count(),
+            suggestions = suggestion_index.suggest(
+                "state", state_name, parent=country.pk, version=self.data_version
+            )
+            return not_found_response(f"State '{state_name}' in '{country_name}'", suggestions)
+
+        local_governments = values_of(
+            LocalGovernment.objects.filter(state=state), LocalGovernmentSerializer, fields, "name"
+        ).order_by('name')
+        if paginator:
+            local_governments = paginator.paginate(local_governments)
+
+        response_data = {
+            "count": state.local_governments_count,
             "country": country.name,
             "state": state.name,
-            "local_governments": serializer.data
-        })
\ No newline at end of file
+            "local_governments": serialize(local_governments, LocalGovernmentSerializer, fields)
+        }
+        if paginator:
+            response_data["next_cursor"] = paginator.next_cursor
+        return Response(response_data)
+
+
+@extend_schema(
+    description="Search places of every level by name in one request. Results are ranked (exact names first, then "
+                "continents, countries, states and local governments) and carry the path of names from their continent.",
+    responses={
+        200: SearchResponseSerializer,
+    },
+    examples=[
+        OpenApiExample(
+            "Success",
+            value={
+                "query": "lagos",
+                "count": 2,
+                "results": [
+                    {"name": "Lagos", "level": "state", "path": ["Africa", "Nigeria", "Lagos"]},
+                    {"name": "Lagos Island", "level": "local_government", "path": ["Africa", "Nigeria", "Lagos", "Lagos Island"]},
+                ]
+            },
+            response_only=True,
+        ),
+    ],
+    parameters=[
+        OpenApiParameter(name='q', description='Words of the name to search for', required=True, type=str),
+        OpenApiParameter(name='level', description='Comma separated levels to return: continent, country, state, local_government', required=False, type=str),
+        OpenApiParameter(name='parent', description='Name of a continent, country or state the results must be in', required=False, type=str),
+        OpenApiParameter(name='limit', description='Maximum number of results (1 to 100, default 20)', required=False, type=int),
+    ],
+)
+class SearchView(ConditionalGetMixin, generics.GenericAPIView):
+    serializer_class = SearchResponseSerializer
+
+    def get(self, request, *args, **kwargs):
+        try:
+            query, levels, parent, limit = parse_search(request.GET)
+        except InvalidSearch as error:
+            return Response({"error": str(error)}, status=400)
+
+        results = search_index.search(query, levels=levels, parent=parent, limit=limit, version=self.data_version)
+        return Response({"query": query, "count": len(results), "results": results})
+
+
+@extend_schema(
+    description="Complete the name being typed: the countries, states and local governments whose name starts with "
+                "q, shortest first, each with the path of names leading to it. Give country (and state) to complete "
+                "only the places in it. Case and accents are ignored, as in the other lookups.",
+    responses={
+        200: SearchResponseSerializer,
+    },
+    examples=[
+        OpenApiExample(
+            "Success",
+            value={
+                "query": "ik",
+                "count": 2,
+                "results": [
+                    {"name": "Ikeja", "level": "local_government", "path": ["Africa", "Nigeria", "Lagos", "Ikeja"]},
+                    {"name": "Ikorodu", "level": "local_government", "path": ["Africa", "Nigeria", "Lagos", "Ikorodu"]},
+                ]
+            },
+            response_only=True,
+        ),
+    ],
+    parameters=[
+        OpenApiParameter(name='q', description='The beginning of the name', required=True, type=str),
+        OpenApiParameter(name='country', description='Complete only the states and local governments of this country', required=False, type=str),
+        OpenApiParameter(name='state', description='Complete only the local governments of this state of the country', required=False, type=str),
+        OpenApiParameter(name='level', description='Comma separated levels to complete: country, state, local_government', required=False, type=str),
+        OpenApiParameter(name='limit', description='Maximum number of completions (1 to 20, default 10)', required=False, type=int),
+    ],
+)
+class AutocompleteView(ConditionalGetMixin, generics.GenericAPIView):
+    serializer_class = SearchResponseSerializer
+    lagging = True
+
+    def current_version(self):
+        # The previous snapshot answers while a new one is built.
+        self.places = autocomplete.places(DataVersion.current())
+        return self.places.version
+
+    def get(self, request, *args, **kwargs):
+        try:
+            prefix, levels, country, state, limit = parse_completion(request.GET)
+        except InvalidCompletion as error:
+            return Response({"error": str(error)}, status=400)
+
+        try:
+            results = self.places.complete(prefix, levels, country, state, limit)
+        except UnknownParent as error:
+            if error.level == "country":
+                suggestions = suggestion_index.suggest("country", error.name, version=self.data_version)
+                return not_found_response(f"Country '{error.name}'", suggestions)
+            suggestions = suggestion_index.suggest(
+                "state", error.name, parent=error.parent_id, version=self.data_version
+            )
+            return not_found_response(f"State '{error.name}' in '{country}'", suggestions)
+        return Response({"query": prefix, "count": len(results), "results": results})
+
+
+NDJSON = "application/x-ndjson"
+
+
+def batch_items(data):
+    """The items of a JSON resolve body, ``{"items": [...]}`` or the bare list; ``None`` if it is neither."""
+    items = data.get("items") if isinstance(data, dict) else data
+    return items if isinstance(items, list) else None
+
+
+@extend_schema(
+    description="Resolve many (country, state, local government) names at once, e.g. to validate addresses. Each "
+                "item gets the canonical names and ids of the places it names or, from the first one that does not "
+                "exist, an error with suggestions. Up to 10000 items per JSON body; send larger batches as NDJSON "
+                "(Content-Type: application/x-ndjson, one item per line) to get NDJSON results streamed back, one "
+                "line per item.",
+    request=ResolveRequestSerializer,
+    responses={
+        200: ResolveResponseSerializer,
+    },
+    examples=[
+        OpenApiExample(
+            "Request",
+            value={"items": [
+                {"country": "nigeria", "state": "lagos", "local_government": "ikeja"},
+                {"country": "Nigeria", "state": "Lagoss"},
+            ]},
+            request_only=True,
+        ),
+        OpenApiExample(
+            "Success",
+            value={
+                "count": 2,
+                "found": 1,
+                "results": [
+                    {"country": {"id": 7165254012731392, "name": "Nigeria"},
+                     "state": {"id": 7165254012735488, "name": "Lagos"},
+                     "local_government": {"id": 7165254012739584, "name": "Ikeja"}},
+                    {"country": {"id": 7165254012731392, "name": "Nigeria"}, "not_found": "state",
+                     "error": "State 'Lagoss' in 'Nigeria' isn't found. Did you mean 'Lagos'?", "suggestions": ["Lagos"]},
+                ]
+            },
+            response_only=True,
+        ),
+    ],
+)
+class ResolveView(generics.GenericAPIView):
+    serializer_class = ResolveRequestSerializer
+    parser_classes = [JSONParser]
+
+    def post(self, request, *args, **kwargs):
+        resolver = Resolver()
+        if request.content_type.split(";")[0].strip().lower() == NDJSON:
+            # Read and answered a batch at a time while the response streams.
+            lines = request.stream or ()
+            return StreamingHttpResponse(resolve_lines(lines, resolver), content_type=NDJSON)
+
+        try:
+            items = batch_items(request.data)
+        except ParseError as error:
+            return Response({"error": str(error.detail)}, status=400)
+        if items is None:
+            return Response({"error": "Expected a list of items, or an object with one under 'items'"}, status=400)
+        if len(items) > MAX_ITEMS:
+            return Response({"error": f"At most {MAX_ITEMS} items per request; send larger batches as NDJSON"},
+                            status=400)
+        return Response(summary(resolver.resolve(items)))
+
+
+def export_response(exporter, chunks):
+    response = StreamingHttpResponse(chunks, content_type=exporter.content_type)
+    response["Content-Disposition"] = f'attachment; filename="{exporter.filename}"'
+    return response
+
+
+@extend_schema(
+    description="Download every continent, country, state and local government as flat records, parents first, to "
+                "load into another deployment with the import_locations command. export_format is ndjson (one record per "
+                "line), csv (with a header row) or binary (the compact format of locations/binary.py). The file is "
+                "streamed as it is read from the database.",
+    responses={
+        (200, "application/x-ndjson"): bytes,
+        (200, "text/csv"): bytes,
+        (200, "application/octet-stream"): bytes,
+    },
+    parameters=[
+        OpenApiParameter(name='export_format', location=OpenApiParameter.PATH, enum=list(ENCODERS), type=str),
+    ],
+)
+class ExportView(ConditionalGetMixin, generics.GenericAPIView):
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is not rendered by DRF, so any Accept header is fine.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, export_format, *args, **kwargs):
+        try:
+            exporter = Exporter(export_format)
+        except UnknownFormat as error:
+            return Response({"error": str(error)}, status=404)
+        return export_response(exporter, exporter.chunks())
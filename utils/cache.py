@@ -0,0 +1,29 @@
+"""Cache configuration helpers"""
+
+from urllib.parse import urlsplit
+
+BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+    "rediss": "django.core.cache.backends.redis.RedisCache",
+}
+
+
+def cache_from_url(url, max_entries=None):
+    """Return a ``CACHES`` entry for ``locmem://[name]``, ``file:///path`` or
+    ``redis://host:port/db`` (any Redis protocol compatible server)."""
+    parts = urlsplit(url)
+    if parts.scheme not in BACKENDS:
+        raise ValueError(f"Unsupported cache URL '{url}', expected locmem://, file:// or redis://")
+    config = {"BACKEND": BACKENDS[parts.scheme]}
+    if parts.scheme == "locmem":
+        config["LOCATION"] = parts.netloc
+    elif parts.scheme == "file":
+        config["LOCATION"] = parts.path
+    else:
+        config["LOCATION"] = url
+    if max_entries is not None and parts.scheme in ("locmem", "file"):
+        # Local memory evicts the least recently used entries once full.
+        config["OPTIONS"] = {"MAX_ENTRIES": max_entries}
+    return config
@@ -0,0 +1,22 @@
+"""Database helpers shared by the readers of several tables"""
+
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+@contextmanager
+def consistent_reads():
+    """A transaction whose queries all see the same snapshot of the database.
+
+    SQLite and MySQL (InnoDB) give one to any transaction; PostgreSQL only at
+    the repeatable read level, as under READ COMMITTED every query sees the
+    writes committed before it. Inside an outer transaction the level can no
+    longer be set, and the snapshot is the outer one's.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
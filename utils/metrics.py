@@ -0,0 +1,282 @@
+"""Request instrumentation: per-phase timings and Prometheus metrics.
+
+A sampled request gets a ``RequestTiming`` in a context variable for its
+duration. Database time and query count are recorded by an execute wrapper
+installed on every connection (the context variable follows the request into
+the ``sync_to_async`` threads of async views), and code marks its other phases
+with ``phase("serialize")`` or ``phase("render")``. ``ServerTimingMiddleware``
+(``utils/middleware.py``) sends the phases as a ``Server-Timing`` header and
+adds them to per-route histograms.
+
+The histograms are kept per process. With ``settings.METRICS["DIR"]`` set,
+each process also writes its totals to ``<DIR>/metrics-<pid>.json`` at most
+every ``FLUSH_INTERVAL`` seconds, and ``/metrics`` adds up the files of every
+process sharing the directory, so any worker answers for all of them. Files of
+workers that exited are kept, which keeps the counters monotonic; empty the
+directory when the service is (re)started.
+"""
+
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PHASES = ("db", "serialize", "render", "app", "total")
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    __slots__ = ("started", "phases", "queries", "_render_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+        self._render_started = None
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def finish(self):
+        """Close the timing: ``total`` and ``app``, the time outside the other phases."""
+        total = time.perf_counter() - self.started
+        self.phases["app"] = max(total - sum(self.phases.values()), 0.0)
+        self.phases["total"] = total
+        return self
+
+    def server_timing(self):
+        entries = []
+        for name in PHASES:
+            if name in self.phases:
+                entry = f"{name};dur={self.phases[name] * 1000:.3f}"
+                if name == "db":
+                    entry += f';desc="{self.queries} queries"'
+                entries.append(entry)
+        return ", ".join(entries)
+
+    def start_render(self, response):
+        # DRF responses are rendered by the handler after the middleware saw them.
+        self._render_started = time.perf_counter()
+        response.add_post_render_callback(self._end_render)
+
+    def _end_render(self, response):
+        self.add("render", time.perf_counter() - self._render_started)
+
+
+def options():
+    return settings.METRICS
+
+
+def start_request():
+    """Return the timing of a new request, ``None`` when it is not sampled."""
+    rate = options()["SAMPLE_RATE"]
+    if rate < 1 and random.random() >= rate:
+        return None
+    timing = RequestTiming()
+    _current.set(timing)
+    return timing
+
+
+def end_request():
+    _current.set(None)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the ``name`` phase of the current request."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add("db", time.perf_counter() - started)
+        timing.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder, dispatch_uid="utils.metrics.record_query")
+
+
+class Registry:
+    """Counters and histograms of this process, merged with the other workers' on export."""
+
+    def __init__(self):
+        self.collectors = []
+        self.reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        # "requests" -> {labels: count}; histogram name -> {labels: [bucket counts..., sum, count]}
+        self.values = {"requests": {}, "phases": {}, "queries": {}}
+        self._flushed = time.monotonic()
+
+    def observe(self, route, method, status, timing):
+        if self.record(route, method, status, timing):
+            self.flush()
+
+    def record(self, route, method, status, timing):
+        """``observe`` without the flush; return whether one is due, which the caller then makes."""
+        with self._lock:
+            requests = self.values["requests"]
+            key = f"{route}\t{method}\t{status}"
+            requests[key] = requests.get(key, 0) + 1
+            if timing is not None:
+                for name, seconds in timing.phases.items():
+                    self._observe("phases", f"{route}\t{name}", DURATION_BUCKETS, seconds)
+                self._observe("queries", route, QUERY_BUCKETS, timing.queries)
+            now = time.monotonic()
+            if not options()["DIR"] or now - self._flushed < options()["FLUSH_INTERVAL"]:
+                return False
+            # Claimed under the lock, so the requests finishing meanwhile do not flush too.
+            self._flushed = now
+            return True
+
+    def _observe(self, name, key, buckets, value):
+        series = self.values[name].get(key)
+        if series is None:
+            # a count per bucket and for +Inf, then the sum and the count
+            series = self.values[name][key] = [0] * (len(buckets) + 3)
+        series[bisect_left(buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.values))
+
+    def _path(self):
+        return Path(options()["DIR"]) / f"metrics-{os.getpid()}.json"
+
+    def flush(self):
+        """Write this process's values for the other workers; I/O errors are logged, not raised."""
+        path = self._path()
+        temporary = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}-", suffix=".tmp")
+            with os.fdopen(descriptor, "w") as file:
+                file.write(json.dumps(self._snapshot()))
+            os.replace(temporary, path)
+        except OSError:
+            logger.exception("Writing the metrics to %s failed", path)
+            if temporary is not None:
+                Path(temporary).unlink(missing_ok=True)
+        self._flushed = time.monotonic()
+
+    def merged(self):
+        """This process's values added to those the other processes flushed."""
+        values = self._snapshot()
+        if not options()["DIR"]:
+            return values
+        own = self._path().name
+        for path in Path(options()["DIR"]).glob("metrics-*.json"):
+            if path.name == own:
+                continue
+            try:
+                other = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, series in other.items():
+                target = values.setdefault(name, {})
+                for key, value in series.items():
+                    if isinstance(value, list):
+                        current = target.setdefault(key, [0] * len(value))
+                        target[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = target.get(key, 0) + value
+        return values
+
+    def export(self):
+        """The merged metrics in the Prometheus text exposition format."""
+        values = self.merged()
+        lines = [
+            "# HELP http_requests_total Requests handled, sampled or not.",
+            "# TYPE http_requests_total counter",
+        ]
+        for key, count in sorted(values["requests"].items()):
+            route, method, status = key.split("\t")
+            lines.append(f"http_requests_total{_labels(route=route, method=method, status=status)} {count}")
+        lines += [
+            "# HELP http_request_phase_seconds Time spent per request phase (db, serialize, render, app, total), sampled requests.",
+            "# TYPE http_request_phase_seconds histogram",
+        ]
+        for key, series in sorted(values["phases"].items()):
+            route, name = key.split("\t")
+            lines += _histogram("http_request_phase_seconds", {"route": route, "phase": name}, DURATION_BUCKETS, series)
+        lines += [
+            "# HELP http_request_queries Database queries per request, sampled requests.",
+            "# TYPE http_request_queries histogram",
+        ]
+        for route, series in sorted(values["queries"].items()):
+            lines += _histogram("http_request_queries", {"route": route}, QUERY_BUCKETS, series)
+        for collector in self.collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram(name, labels, buckets, series):
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*buckets, "+Inf"), series):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels)} {series[-2]}")
+    lines.append(f"{name}_count{_labels(**labels)} {series[-1]}")
+    return lines
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    if not options():
+        raise Http404
+    return HttpResponse(registry.export(), content_type="text/plain; version=0.0.4; charset=utf-8")
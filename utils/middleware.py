@@ -0,0 +1,119 @@
+"""Middleware shared by the project"""
+
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise's middleware, usable in an async middleware chain.
+
+    The upstream class is sync only, so under ASGI Django would run the rest of
+    the chain (and the async views) through a thread for every request. Static
+    file lookups are dict reads; only serving a file goes to a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class ServerTimingMiddleware:
+    """Time the phases of each sampled request (see ``utils/metrics.py``).
+
+    The phases are sent as a ``Server-Timing`` header (unless
+    ``METRICS["SERVER_TIMING"]`` is off) and every request is counted in the
+    per-route metrics served on ``/metrics``. Placed before the response cache
+    so cache hits are measured too. Not loaded when ``settings.METRICS`` is
+    ``None``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request()
+        if self.finish(request, response, timing):
+            metrics.registry.flush()
+        return response
+
+    async def __acall__(self, request):
+        timing = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request()
+        if self.finish(request, response, timing):
+            # a file write, kept off the event loop
+            await sync_to_async(metrics.registry.flush, thread_sensitive=False)()
+        return response
+
+    def process_template_response(self, request, response):
+        timing = metrics.current()
+        if timing is not None:
+            timing.start_render(response)
+        return response
+
+    def finish(self, request, response, timing):
+        """Add the header and count the request; return whether the metrics are due a flush."""
+        if timing is not None:
+            timing.finish()
+            if settings.METRICS["SERVER_TIMING"]:
+                response["Server-Timing"] = timing.server_timing()
+        try:
+            return metrics.registry.record(route_of(request), request.method, response.status_code, timing)
+        except Exception:
+            # The response is fine; losing its metrics must not turn it into an error.
+            logger.exception("Recording the metrics of %s failed", request.path)
+            return False
+
+
+def route_of(request):
+    """The URL pattern that matched ``request``, the label of its metrics."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        # Responses served before URL resolution, e.g. from the response cache.
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "unmatched"
+    return match.route
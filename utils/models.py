@@ -1,12 +1,12 @@
 from django.db import models
-from .snowflake import Snowflake
+from .snowflake import generate_id
 
 class BaseModel(models.Model):
     """Base model with id attribute for all models requiring a snowflake id"""
 
     id = models.BigIntegerField(
         primary_key=True,
-        default=Snowflake(2, 2).generate_id,
+        default=generate_id,
         editable=False,
     )
     date_created = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,36 @@
+"""Response renderers shared by the project"""
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` encoding with ``orjson`` when it is installed.
+
+    The output is the compact, non-ASCII-escaped JSON of ``JSONRenderer``
+    (U+2028 and U+2029 escaped included). Dates, times, dataclasses and the
+    values ``orjson`` cannot encode natively, such as lazy strings and
+    decimals, are handed to the ``encoder_class`` of ``JSONRenderer``, and
+    indented output, the non-default ``UNICODE_JSON`` and ``COMPACT_JSON``
+    settings and non-string dict keys go through ``JSONRenderer`` itself. The
+    one difference left is that NaN and the infinities are encoded as
+    ``null``, where ``JSONRenderer`` refuses them.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2\x80" in ret:
+            ret = ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
+        return ret
@@ -1,7 +1,34 @@
-"""Snowflake ID generator for Django models"""
+"""Snowflake ID generator for Django models
 
+An ID is 41 bits of milliseconds since ``twepoch``, 5 bits of datacenter, 5 bits
+of worker and a 12 bit sequence. Two generators only produce the same ID if they
+share the datacenter and worker IDs, so every process needs its own pair:
+
+* ``SNOWFLAKE_DATACENTER_ID`` and ``SNOWFLAKE_WORKER_ID`` pin them explicitly
+  (only do this for a single process per value, e.g. one container per worker);
+* otherwise the process leases a free slot by locking a file in
+  ``SNOWFLAKE_LEASE_DIR`` (a directory under the system temp dir by default).
+  With only ``SNOWFLAKE_DATACENTER_ID`` set, the slot is the worker ID inside
+  that datacenter; with neither, the slot covers both IDs (1024 slots). The
+  lock is released by the OS when the process exits;
+* where file locks are unavailable, the slot falls back to the PID.
+
+The module level ``generate_id``/``generate_ids`` use a per-process generator
+created on first use and re-created in forked children (gunicorn workers,
+multiprocessing loaders), so a child never reuses its parent's ID space.
+"""
+
+import os
+import tempfile
+import threading
 import time
 
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
 class Snowflake:
     """Snowflake ID generator for Django models"""
 
@@ -10,8 +37,9 @@ class Snowflake:
         self.datacenter_id = datacenter_id
         self.sequence = 0
         self.timestamp = -1
+        self.lock = threading.Lock()
 
-        self.twepoch = 1288834974657 
+        self.twepoch = 1288834974657
         self.datacenter_bits = 5
         self.worker_bits = 5
         self.sequence_bits = 12
@@ -27,36 +55,135 @@ class Snowflake:
         self.sequence_mask = -1 ^ (-1 << self.sequence_bits)
 
         if (
-            self.worker_id > self.max_worker_id
-            or self.datacenter_id > self.max_datacenter_id
+            not 0 <= self.worker_id <= self.max_worker_id
+            or not 0 <= self.datacenter_id <= self.max_datacenter_id
         ):
-            raise ValueError("Worker ID or Datacenter ID is greater than max")
+            raise ValueError("Worker ID or Datacenter ID is out of range")
+
+        self.node = (self.datacenter_id << self.datacenter_id_shift) | (self.worker_id << self.worker_id_shift)
 
     def generate_id(self):
-        now = int(time.time() * 1000)
+        return self.generate_ids(1)[0]
 
-        if now < self.timestamp:
-            raise ValueError("Clock moved backwards")
+    def generate_ids(self, count):
+        """Return ``count`` increasing IDs, reserving whole runs of sequence
+        numbers per millisecond instead of taking the lock for every ID."""
+        ids = []
+        with self.lock:
+            while len(ids) < count:
+                now = self.current_millis()
+                if now < self.timestamp:
+                    raise ValueError("Clock moved backwards")
 
-        if now == self.timestamp:
-            self.sequence = (self.sequence + 1) & self.sequence_mask
-            if self.sequence == 0:
-                now = self.wait_next_millis(now)
-        else:
-            self.sequence = 0
+                if now == self.timestamp:
+                    start = self.sequence + 1
+                    if start > self.sequence_mask:
+                        self.wait_next_millis()
+                        continue
+                else:
+                    start = 0
 
-        self.timestamp = now
+                end = min(start + count - len(ids), self.sequence_mask + 1)
+                base = ((now - self.twepoch) << self.timestamp_shift) | self.node
+                # The sequence is in the low bits, so a run of it is a range of IDs.
+                ids.extend(range(base + start, base + end))
+                self.timestamp = now
+                self.sequence = end - 1
+        return ids
 
-        snowflake_id = (
-            ((now - self.twepoch) << self.timestamp_shift)
-            | (self.datacenter_id << self.datacenter_id_shift)
-            | (self.worker_id << self.worker_id_shift)
-            | self.sequence
-        )
+    @staticmethod
+    def current_millis():
+        return time.time_ns() // 1_000_000
+
+    def wait_next_millis(self):
+        # Sleep for the rest of the millisecond instead of spinning on the clock.
+        remaining = (self.timestamp + 1) * 1_000_000 - time.time_ns()
+        if remaining > 0:
+            time.sleep(remaining / 1e9)
+        while self.current_millis() <= self.timestamp:
+            time.sleep(0)
+
+
+_lease_file = None
+
+
+def _lease_slot(slots):
+    """Lock the first free of ``slots`` lease files, starting from the PID's, and
+    return its number; ``None`` when file locks cannot be used."""
+    global _lease_file
+    if fcntl is None:
+        return None
+    directory = os.environ.get("SNOWFLAKE_LEASE_DIR") or os.path.join(tempfile.gettempdir(), "snowflake-leases")
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        return None
+
+    first = os.getpid() % slots
+    for offset in range(slots):
+        slot = (first + offset) % slots
+        try:
+            file = open(os.path.join(directory, f"{slots}-{slot}.lock"), "a")
+        except OSError:
+            return None
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            continue
+        _lease_file = file
+        return slot
+    return None
+
+
+def process_node():
+    """Return the ``(worker_id, datacenter_id)`` pair of the current process."""
+    worker = os.environ.get("SNOWFLAKE_WORKER_ID")
+    datacenter = os.environ.get("SNOWFLAKE_DATACENTER_ID")
+    if worker is not None:
+        return int(worker), int(datacenter or 0)
+
+    slots = 32 if datacenter is not None else 1024
+    slot = _lease_slot(slots)
+    if slot is None:
+        slot = os.getpid() % slots
+    if datacenter is not None:
+        return slot, int(datacenter)
+    return slot & 31, slot >> 5
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def default_generator():
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = Snowflake(*process_node())
+    return _generator
+
+
+def generate_id():
+    return default_generator().generate_id()
+
+
+def generate_ids(count):
+    """Return ``count`` IDs at once, for bulk inserts."""
+    return default_generator().generate_ids(count)
+
+
+def _reset_after_fork():
+    # The child inherits the parent's generator (and lease), whose IDs the
+    # parent keeps issuing; drop them so the child leases its own slot.
+    global _generator, _generator_lock, _lease_file
+    if _lease_file is not None:
+        _lease_file.close()
+        _lease_file = None
+    _generator = None
+    _generator_lock = threading.Lock()
 
-        return snowflake_id
 
-    def wait_next_millis(self, current_time):
-        while current_time <= self.timestamp:
-            current_time = int(time.time() * 1000)
-        return current_time
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
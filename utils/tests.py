@@ -0,0 +1,211 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from . import metrics, renderers, snowflake
+from .cache import cache_from_url
+from .snowflake import Snowflake
+
+
+def node_of(snowflake_id):
+    return (snowflake_id >> 12) & 0x3FF
+
+
+def generate_in_child(count):
+    return snowflake.generate_ids(count // 2) + [snowflake.generate_id() for _ in range(count // 2)]
+
+
+class SnowflakeTests(SimpleTestCase):
+
+    def test_batches_are_unique_and_increasing(self):
+        generator = Snowflake(1, 1)
+        # more than one millisecond's worth of sequence numbers
+        ids = generator.generate_ids(10000) + [generator.generate_id() for _ in range(100)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual({node_of(i) for i in ids}, {(1 << 5) | 1})
+
+    def test_threads_share_a_generator_safely(self):
+        generator = Snowflake(3, 0)
+        results = [[] for _ in range(8)]
+
+        def work(result):
+            for _ in range(2000):
+                result.append(generator.generate_id())
+            result.extend(generator.generate_ids(2000))
+
+        threads = [threading.Thread(target=work, args=(result,)) for result in results]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [i for result in results for i in result]
+        self.assertEqual(len(set(ids)), 8 * 4000)
+
+    def test_rejects_out_of_range_ids(self):
+        for worker, datacenter in ((32, 0), (0, 32), (-1, 0)):
+            with self.subTest(worker=worker, datacenter=datacenter), self.assertRaises(ValueError):
+                Snowflake(worker, datacenter)
+
+    def test_pinned_node(self):
+        with mock.patch.dict(os.environ, {"SNOWFLAKE_WORKER_ID": "7", "SNOWFLAKE_DATACENTER_ID": "3"}):
+            self.assertEqual(snowflake.process_node(), (7, 3))
+
+    @unittest.skipUnless(hasattr(os, "register_at_fork"), "needs fork")
+    def test_no_collisions_across_processes(self):
+        with tempfile.TemporaryDirectory() as lease_dir:
+            environ = {"SNOWFLAKE_LEASE_DIR": lease_dir}
+            with mock.patch.dict(os.environ, environ):
+                os.environ.pop("SNOWFLAKE_WORKER_ID", None)
+                os.environ.pop("SNOWFLAKE_DATACENTER_ID", None)
+                with mock.patch.object(snowflake, "_generator", None):
+                    parent = snowflake.generate_ids(5000)
+                    # forked children start from the parent's state
+                    with ProcessPoolExecutor(4, mp_context=multiprocessing.get_context("fork")) as pool:
+                        children = list(pool.map(generate_in_child, [20000] * 8))
+
+        ids = parent + [i for child in children for i in child]
+        self.assertEqual(len(set(ids)), len(ids))
+        nodes = {node_of(i) for i in parent}
+        for child in children:
+            nodes_of_child = {node_of(i) for i in child}
+            self.assertEqual(len(nodes_of_child), 1)
+            self.assertNotIn(node_of(parent[0]), nodes_of_child)
+        self.assertGreaterEqual(len({node_of(child[0]) for child in children} | nodes), 2)
+
+
+class CacheURLTests(SimpleTestCase):
+
+    def test_backends(self):
+        self.assertEqual(cache_from_url("locmem://responses", max_entries=10), {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "responses",
+            "OPTIONS": {"MAX_ENTRIES": 10},
+        })
+        self.assertEqual(cache_from_url("file:///var/tmp/cache")["LOCATION"], "/var/tmp/cache")
+        self.assertEqual(cache_from_url("redis://cache:6379/1", max_entries=10), {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache:6379/1",
+        })
+        with self.assertRaises(ValueError):
+            cache_from_url("memcached://cache")
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    data = {
+        "count": 2,
+        "continents": [
+            {"name": 'São "Tomé"', "capital": None, "language": "Portuguese\u2028Forro\u2029", "states": []},
+            {"name": "Ålesund\\\n\t</script>", "countries_count": 2 ** 53, "nested": [[], {}]},
+        ],
+    }
+
+    def test_same_bytes_as_the_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+
+    def test_falls_back_to_the_json_renderer(self):
+        for data in ({"price": Decimal("1.50")}, {"error": gettext_lazy("Not found.")}, {"big": 2 ** 70},
+                     {"updated": datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc), "day": date(2024, 5, 1)},
+                     {"at": time(9, 5, 0, 250000)}, {1: "one", None: "none"}):
+            with self.subTest(data=data):
+                self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = "application/json; indent=2"
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data, indented),
+                         JSONRenderer().render(self.data, indented))
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b"")
+
+
+def timing(**phases):
+    result = metrics.RequestTiming()
+    result.phases = phases
+    result.queries = phases.pop("queries", 0)
+    return result
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def test_histograms(self):
+        registry = metrics.Registry()
+        registry.observe("api/v1/continents", "GET", 200, timing(db=0.002, total=0.004, queries=2))
+        registry.observe("api/v1/continents", "GET", 200, timing(db=0.02, total=20, queries=2))
+        registry.observe("api/v1/continents", "GET", 304, None)
+        exported = registry.export()
+        self.assertIn('http_requests_total{route="api/v1/continents",method="GET",status="200"} 2\n', exported)
+        self.assertIn('http_requests_total{route="api/v1/continents",method="GET",status="304"} 1\n', exported)
+        self.assertIn('http_request_phase_seconds_bucket{route="api/v1/continents",phase="db",le="0.0025"} 1\n', exported)
+        self.assertIn('http_request_phase_seconds_bucket{route="api/v1/continents",phase="db",le="0.025"} 2\n', exported)
+        self.assertIn('http_request_phase_seconds_bucket{route="api/v1/continents",phase="total",le="10.0"} 1\n', exported)
+        self.assertIn('http_request_phase_seconds_bucket{route="api/v1/continents",phase="total",le="+Inf"} 2\n', exported)
+        self.assertIn('http_request_phase_seconds_count{route="api/v1/continents",phase="db"} 2\n', exported)
+        self.assertIn('http_request_queries_bucket{route="api/v1/continents",le="1"} 0\n', exported)
+        self.assertIn('http_request_queries_bucket{route="api/v1/continents",le="2"} 2\n', exported)
+        self.assertIn('http_request_queries_sum{route="api/v1/continents"} 4\n', exported)
+
+    def test_label_escaping(self):
+        self.assertEqual(metrics._labels(route='a"b\\c\nd'), '{route="a\\"b\\\\c\\nd"}')
+
+    def test_workers_are_merged_through_the_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            options = {"SERVER_TIMING": True, "SAMPLE_RATE": 1.0, "DIR": directory, "FLUSH_INTERVAL": 60}
+            with override_settings(METRICS=options):
+                worker = metrics.Registry()
+                worker.observe("api/v1/countries", "GET", 200, timing(total=0.01, queries=1))
+                worker.observe("api/v1/countries", "GET", 200, timing(total=0.01, queries=1))
+                # another process's file
+                worker.flush()
+                os.rename(worker._path(), os.path.join(directory, "metrics-1.json"))
+
+                registry = metrics.Registry()
+                registry.observe("api/v1/countries", "GET", 200, timing(total=0.01, queries=1))
+                exported = registry.export()
+        self.assertIn('http_requests_total{route="api/v1/countries",method="GET",status="200"} 3\n', exported)
+        self.assertIn('http_request_queries_count{route="api/v1/countries"} 3\n', exported)
+
+    def test_concurrent_flushes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            options = {"SERVER_TIMING": True, "SAMPLE_RATE": 1.0, "DIR": directory, "FLUSH_INTERVAL": 0}
+            with override_settings(METRICS=options):
+                registry = metrics.Registry()
+                errors = []
+
+                def observe():
+                    try:
+                        for _ in range(300):
+                            registry.observe("api/v1/countries", "GET", 200, timing(total=0.01, queries=1))
+                    except Exception as error:
+                        errors.append(error)
+
+                threads = [threading.Thread(target=observe) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                registry.flush()
+                self.assertEqual(errors, [])
+                self.assertEqual(os.listdir(directory), [registry._path().name])
+                with open(registry._path()) as file:
+                    self.assertEqual(json.load(file)["requests"], {"api/v1/countries\tGET\t200": 2400})
+
+    def test_flush_errors_are_logged(self):
+        with tempfile.NamedTemporaryFile() as file:
+            # a directory that cannot be created
+            options = {"SERVER_TIMING": True, "SAMPLE_RATE": 1.0, "DIR": os.path.join(file.name, "metrics"),
+                       "FLUSH_INTERVAL": 0}
+            with override_settings(METRICS=options), self.assertLogs("utils.metrics", "ERROR"):
+                metrics.Registry().observe("api/v1/countries", "GET", 200, None)
+
+    def test_server_timing_header(self):
+        header = timing(db=0.0015, render=0.0005, total=0.003, queries=2).server_timing()
+        self.assertEqual(header, 'db;dur=1.500;desc="2 queries", render;dur=0.500, total;dur=3.000')
@@ -0,0 +1,14 @@
+"""Text helpers shared by the models"""
+
+import re
+import unicodedata
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_name(value):
+    """Return the lookup key for a name: accents stripped, case folded and
+    whitespace collapsed, so "  Côte  d'Ivoire" and "cote d'ivoire" match."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return WHITESPACE.sub(" ", stripped).strip().casefold()